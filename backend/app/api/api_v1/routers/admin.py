@@ -42,7 +42,7 @@ from app.core.validation.cclw.law_policy.process_csv import (
     extract_documents,
     validated_input,
 )
-from app.db.crud.document import start_import
+from app.db.crud.document import notify_postfix_changes, start_import
 from app.db.crud.password_reset import (
     create_password_reset_token,
     invalidate_existing_password_reset_tokens,
@@ -453,6 +453,7 @@ async def update_document(
 
     db.commit()
     db.refresh(existing_doc)
+    notify_postfix_changes(db, {existing_doc.import_id: existing_doc.postfix})
     _LOGGER.info(
         "Call to update_document complete",
         extra={
@@ -4,61 +4,121 @@ All endpoints should perform document searches using the SearchRequestBody as
 its input. The individual endpoints will return different responses tailored
 for the type of document search being performed.
 """
+import dataclasses
 import json
 import logging
-from typing import Mapping, Sequence
+from typing import Any, AsyncIterator, Iterator, Mapping, Sequence, Union
 
-from fastapi import APIRouter, Request, BackgroundTasks, Depends
-from sqlalchemy.orm import Session
+import orjson
+from fastapi import APIRouter, Request, BackgroundTasks, Depends, HTTPException, status
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
 from app.api.api_v1.schemas.search import (
+    SearchEvent,
     SearchRequestBody,
     SearchResults,
     SearchResultsResponse,
     SearchResultResponse,
 )
-from app.core.jit_query_wrapper import jit_query_wrapper
-from app.core.lookups import get_countries_for_region, get_country_by_slug
+from app.core.config import (
+    DOCUMENT_POSTFIX_LISTEN,
+    GEOGRAPHY_INDEX_REFRESH_INTERVAL_S,
+    OPENSEARCH_ASYNC_SEARCH,
+    OPENSEARCH_CURSOR_CACHE_SIZE,
+    OPENSEARCH_CURSOR_TTL_S,
+    OPENSEARCH_DESCRIPTION_INDEX_PATH,
+    OPENSEARCH_JIT_ADAPTIVE,
+    OPENSEARCH_JIT_TARGET_LATENCY_MS,
+    OPENSEARCH_PRECOMPUTED_RESULTS_PATH,
+    OPENSEARCH_RESULT_CACHE_SIZE,
+    OPENSEARCH_RESULT_CACHE_TTL_S,
+    OPENSEARCH_RESULT_SET_STORE_SIZE,
+    OPENSEARCH_RESULT_SET_TTL_S,
+    OPENSEARCH_SEARCHES_MAX_LATENCY_BUDGET_MS,
+)
+from app.core.description_index import DescriptionEmbeddingIndex
+from app.core.jit_query_wrapper import (
+    async_jit_query_wrapper,
+    async_progressive_jit_query,
+    jit_query_wrapper,
+    progressive_jit_query,
+)
+from app.core.jit_sizing import AdaptiveJitSizer
+from app.core.lookups import GeographyIndex
 from app.core.search import (
+    FACET_FIELDS,
+    AsyncOpenSearchConnection,
     FilterField,
     OpenSearchConnection,
     OpenSearchConfig,
     OpenSearchQueryConfig,
 )
-from app.db.crud.document import get_postfix_map
-from app.db.session import get_db
+from app.core.search_cache import PrecomputedResults, TTLCache
+from app.db.crud.document import get_cached_postfix_map, listen_for_postfix_changes
+from app.db.session import DbOpener, engine, get_db_opener
 
 _LOGGER = logging.getLogger(__name__)
 
 # Use configured environment for router
 _OPENSEARCH_CONFIG = OpenSearchConfig()
-_OPENSEARCH_CONNECTION = OpenSearchConnection(opensearch_config=_OPENSEARCH_CONFIG)
+_OPENSEARCH_CONNECTION_TYPE = (
+    AsyncOpenSearchConnection if OPENSEARCH_ASYNC_SEARCH else OpenSearchConnection
+)
+_OPENSEARCH_CONNECTION = _OPENSEARCH_CONNECTION_TYPE(
+    opensearch_config=_OPENSEARCH_CONFIG,
+    result_cache=(
+        TTLCache(OPENSEARCH_RESULT_CACHE_SIZE, OPENSEARCH_RESULT_CACHE_TTL_S)
+        if OPENSEARCH_RESULT_CACHE_SIZE > 0
+        else None
+    ),
+    cursor_store=(
+        TTLCache(OPENSEARCH_CURSOR_CACHE_SIZE, OPENSEARCH_CURSOR_TTL_S)
+        if OPENSEARCH_CURSOR_CACHE_SIZE > 0
+        else None
+    ),
+    description_index=(
+        DescriptionEmbeddingIndex.load(OPENSEARCH_DESCRIPTION_INDEX_PATH)
+        if OPENSEARCH_DESCRIPTION_INDEX_PATH
+        else None
+    ),
+    precomputed_results=(
+        PrecomputedResults.load(OPENSEARCH_PRECOMPUTED_RESULTS_PATH)
+        if OPENSEARCH_PRECOMPUTED_RESULTS_PATH
+        else None
+    ),
+    result_set_store=(
+        TTLCache(OPENSEARCH_RESULT_SET_STORE_SIZE, OPENSEARCH_RESULT_SET_TTL_S)
+        if OPENSEARCH_RESULT_SET_STORE_SIZE > 0
+        else None
+    ),
+)
 _OPENSEARCH_INDEX_CONFIG = OpenSearchQueryConfig()
+_GEOGRAPHY_INDEX = GeographyIndex(GEOGRAPHY_INDEX_REFRESH_INTERVAL_S)
+_JIT_SIZER = (
+    AdaptiveJitSizer(OPENSEARCH_JIT_TARGET_LATENCY_MS)
+    if OPENSEARCH_JIT_ADAPTIVE
+    else None
+)
 
 search_router = APIRouter()
 
 
-@search_router.post("/searches", response_model=SearchResultsResponse)
 def search_documents(
     request: Request,
     search_body: SearchRequestBody,
     background_tasks: BackgroundTasks,
-    db=Depends(get_db),
+    open_db: DbOpener = Depends(get_db_opener),
 ):
     """Search for documents matching the search criteria."""
 
-    _LOGGER.info(
-        f"Search request (jit={search_body.jit_query})",
-        extra={
-            "props": {
-                "search_request": json.loads(search_body.json()),
-            }
-        },
-    )
+    _log_search_request(search_body)
+    _validate_facets(search_body)
 
     if search_body.keyword_filters is not None:
         search_body.keyword_filters = process_search_keyword_filters(
-            db,
+            open_db,
             search_body.keyword_filters,
         )
 
@@ -66,17 +126,243 @@ def search_documents(
         _OPENSEARCH_CONNECTION,
         background_tasks=background_tasks,
         search_request_body=search_body,
-        opensearch_internal_config=_OPENSEARCH_INDEX_CONFIG,
+        opensearch_internal_config=_query_config(
+            search_body, OPENSEARCH_SEARCHES_MAX_LATENCY_BUDGET_MS
+        ),
+        preference="default_search_preference",
+        jit_sizer=_JIT_SIZER,
+    )
+
+    return search_results_response(open_db, results)
+
+
+async def search_documents_async(
+    request: Request,
+    search_body: SearchRequestBody,
+    background_tasks: BackgroundTasks,
+    open_db: DbOpener = Depends(get_db_opener),
+):
+    """Search for documents matching the search criteria.
+
+    OpenSearch queries are awaited, so in-flight searches do not hold a worker
+    thread. Database access is still synchronous, so is run in the threadpool.
+    """
+
+    _log_search_request(search_body)
+    _validate_facets(search_body)
+
+    if search_body.keyword_filters is not None:
+        search_body.keyword_filters = await run_in_threadpool(
+            process_search_keyword_filters,
+            open_db,
+            search_body.keyword_filters,
+        )
+
+    results: SearchResults = await async_jit_query_wrapper(
+        _OPENSEARCH_CONNECTION,
+        background_tasks=background_tasks,
+        search_request_body=search_body,
+        opensearch_internal_config=_query_config(
+            search_body, OPENSEARCH_SEARCHES_MAX_LATENCY_BUDGET_MS
+        ),
+        preference="default_search_preference",
+        jit_sizer=_JIT_SIZER,
+    )
+
+    return await run_in_threadpool(search_results_response, open_db, results)
+
+
+search_router.add_api_route(
+    "/searches",
+    search_documents_async if OPENSEARCH_ASYNC_SEARCH else search_documents,
+    methods=["POST"],
+    response_model=SearchResultsResponse,
+)
+
+
+def stream_search_documents(
+    request: Request,
+    search_body: SearchRequestBody,
+    open_db: DbOpener = Depends(get_db_opener),
+):
+    """Search for documents, streaming progressively better results.
+
+    Results are streamed as server-sent events. A `results` event with the results
+    of a JIT search is sent as soon as they are available, followed by a `refined`
+    event with the results of the full search to replace them. Searches not served
+    by a JIT search only send a `results` event.
+    """
+
+    _log_search_request(search_body)
+    _validate_facets(search_body)
+
+    if search_body.keyword_filters is not None:
+        search_body.keyword_filters = process_search_keyword_filters(
+            open_db,
+            search_body.keyword_filters,
+        )
+
+    events = progressive_jit_query(
+        _OPENSEARCH_CONNECTION,
+        search_request_body=search_body,
+        opensearch_internal_config=_query_config(
+            search_body, OPENSEARCH_SEARCHES_MAX_LATENCY_BUDGET_MS
+        ),
+        preference="default_search_preference",
+        jit_sizer=_JIT_SIZER,
+    )
+    # Make the first search before responding, so that its errors are reported
+    first_event = next(events)
+
+    def stream() -> Iterator[str]:
+        event, results = first_event
+        yield _server_sent_event(event, search_results_json(open_db, results))
+        try:
+            for event, results in events:
+                yield _server_sent_event(event, search_results_json(open_db, results))
+        except Exception:
+            # The client keeps the results it has already been sent
+            _LOGGER.exception("Could not refine streamed search results")
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+async def stream_search_documents_async(
+    request: Request,
+    search_body: SearchRequestBody,
+    open_db: DbOpener = Depends(get_db_opener),
+):
+    """Search for documents, streaming progressively better results.
+
+    See `stream_search_documents`.
+    """
+
+    _log_search_request(search_body)
+    _validate_facets(search_body)
+
+    if search_body.keyword_filters is not None:
+        search_body.keyword_filters = await run_in_threadpool(
+            process_search_keyword_filters,
+            open_db,
+            search_body.keyword_filters,
+        )
+
+    events = async_progressive_jit_query(
+        _OPENSEARCH_CONNECTION,
+        search_request_body=search_body,
+        opensearch_internal_config=_query_config(
+            search_body, OPENSEARCH_SEARCHES_MAX_LATENCY_BUDGET_MS
+        ),
         preference="default_search_preference",
+        jit_sizer=_JIT_SIZER,
     )
+    # Make the first search before responding, so that its errors are reported
+    first_event = await events.__anext__()
+
+    async def stream() -> AsyncIterator[str]:
+        event, results = first_event
+        yield _server_sent_event(
+            event, await run_in_threadpool(search_results_json, open_db, results)
+        )
+        try:
+            async for event, results in events:
+                yield _server_sent_event(
+                    event,
+                    await run_in_threadpool(search_results_json, open_db, results),
+                )
+        except Exception:
+            # The client keeps the results it has already been sent
+            _LOGGER.exception("Could not refine streamed search results")
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+search_router.add_api_route(
+    "/searches/stream",
+    stream_search_documents_async
+    if OPENSEARCH_ASYNC_SEARCH
+    else stream_search_documents,
+    methods=["POST"],
+    response_class=StreamingResponse,
+)
+
+
+@search_router.on_event("startup")
+def open_opensearch_connection() -> None:
+    _OPENSEARCH_CONNECTION.connect()
+
+
+@search_router.on_event("startup")
+def listen_for_document_postfix_changes() -> None:
+    if DOCUMENT_POSTFIX_LISTEN:
+        listen_for_postfix_changes(engine)
+
+
+@search_router.on_event("shutdown")
+async def close_opensearch_connection() -> None:
+    if isinstance(_OPENSEARCH_CONNECTION, AsyncOpenSearchConnection):
+        await _OPENSEARCH_CONNECTION.close()
+    else:
+        _OPENSEARCH_CONNECTION.close()
+
+
+def _log_search_request(search_body: SearchRequestBody) -> None:
+    _LOGGER.info(
+        f"Search request (jit={search_body.jit_query})",
+        extra={
+            "props": {
+                "search_request": json.loads(search_body.json()),
+            }
+        },
+    )
+
+
+def _server_sent_event(event: SearchEvent, data: str) -> str:
+    return f"event: {event.value}\ndata: {data}\n\n"
+
+
+def _query_config(
+    search_body: SearchRequestBody, max_latency_budget_ms: int
+) -> OpenSearchQueryConfig:
+    """Get the query config for a request, limited to its endpoint's latency budget."""
+
+    budgets = [
+        budget
+        for budget in (search_body.latency_budget_ms, max_latency_budget_ms)
+        if budget
+    ]
+    if not budgets:
+        return _OPENSEARCH_INDEX_CONFIG
+    return dataclasses.replace(_OPENSEARCH_INDEX_CONFIG, timeout_ms=min(budgets))
+
+
+def _validate_facets(search_body: SearchRequestBody) -> None:
+    unsupported = [f.value for f in search_body.facets or [] if f not in FACET_FIELDS]
+    if unsupported:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Facets are not supported for: {', '.join(unsupported)}",
+        )
+
+
+def create_search_results_response(
+    open_db: DbOpener, results: SearchResults
+) -> SearchResultsResponse:
+    """Augment the search results with db data to form the response.
+
+    Postfixes are served from memory, so the database is only queried for documents
+    missing from the postfixes last loaded.
+    """
 
-    # Now augment the search results with db data to form the response
     doc_ids = [doc.document_id for doc in results.documents]
-    postfix_map = get_postfix_map(db, doc_ids)
+    postfix_map = get_cached_postfix_map(open_db, doc_ids)
 
-    response: SearchResultsResponse = SearchResultsResponse(
+    return SearchResultsResponse(
         hits=results.hits,
         query_time_ms=results.query_time_ms,
+        cursor=results.cursor,
+        partial=results.partial,
+        facets=results.facets,
         documents=[
             SearchResultResponse(
                 **doc.dict(), document_postfix=postfix_map[doc.document_id]
@@ -85,28 +371,86 @@ def search_documents(
         ],
     )
 
-    return response
+
+def search_results_json(open_db: DbOpener, results: SearchResults) -> str:
+    """Get the JSON of the response to a search, as `create_search_results_response`.
+
+    With fast response parsing, the results are trusted and encoded as they are,
+    rather than building & validating the response models.
+    """
+
+    if not _OPENSEARCH_CONFIG.fast_response_parsing:
+        return create_search_results_response(open_db, results).json()
+
+    doc_ids = [doc.document_id for doc in results.documents]
+    return encode_search_results(results, get_cached_postfix_map(open_db, doc_ids))
+
+
+def encode_search_results(
+    results: SearchResults, postfix_map: Mapping[str, str]
+) -> str:
+    """Encode trusted search results as the JSON of a search response."""
+
+    return orjson.dumps(
+        {
+            "hits": results.hits,
+            "query_time_ms": results.query_time_ms,
+            "cursor": results.cursor,
+            "partial": results.partial,
+            "facets": (
+                None
+                if results.facets is None
+                else {field.value: counts for field, counts in results.facets.items()}
+            ),
+            "documents": [
+                {**doc.__dict__, "document_postfix": postfix_map[doc.document_id]}
+                for doc in results.documents
+            ],
+        },
+        default=_model_fields,
+    ).decode("utf-8")
+
+
+def _model_fields(value: Any) -> Mapping[str, Any]:
+    if isinstance(value, BaseModel):
+        return value.__dict__
+    raise TypeError(f"Cannot encode {type(value).__name__} as JSON")
+
+
+def search_results_response(
+    open_db: DbOpener, results: SearchResults
+) -> Union[SearchResultsResponse, Response]:
+    """Get the response to a search.
+
+    With fast response parsing, the response is encoded by `search_results_json`,
+    so that it is not validated (again) as the route's response model.
+    """
+
+    if _OPENSEARCH_CONFIG.fast_response_parsing:
+        return Response(
+            search_results_json(open_db, results), media_type="application/json"
+        )
+    return create_search_results_response(open_db, results)
 
 
 def process_search_keyword_filters(
-    db: Session,
+    open_db: DbOpener,
     request_filters: Mapping[FilterField, Sequence[str]],
 ) -> Mapping[FilterField, Sequence[str]]:
     filter_map = {}
+    geographies = _GEOGRAPHY_INDEX.get(open_db)
 
     for field, values in request_filters.items():
         if field == FilterField.REGION:
             field = FilterField.COUNTRY
             filter_values = []
             for geo_slug in values:
-                filter_values.extend(
-                    [g.value for g in get_countries_for_region(db, geo_slug)]
-                )
+                filter_values.extend(geographies.country_values_for_region(geo_slug))
         elif field == FilterField.COUNTRY:
             filter_values = [
-                country.value
+                country_value
                 for geo_slug in values
-                if (country := get_country_by_slug(db, geo_slug)) is not None
+                if (country_value := geographies.country_value(geo_slug)) is not None
             ]
         else:
             filter_values = values
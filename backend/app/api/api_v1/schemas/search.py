@@ -1,7 +1,7 @@
 from enum import Enum
 from typing import Mapping, Optional, Sequence
 
-from pydantic import BaseModel, conlist
+from pydantic import BaseModel, conint, conlist
 
 
 Coord = tuple[float, float]
@@ -28,6 +28,15 @@ class JitQuery(str, Enum):
     DISABLED = "disabled"
 
 
+class SearchEvent(str, Enum):
+    """Events streamed by the progressive search API endpoint."""
+
+    # The first results of a search, e.g. from a JIT search
+    RESULTS = "results"
+    # More accurate results of the same search, replacing the previous results
+    REFINED = "refined"
+
+
 class FilterField(str, Enum):
     """Filter field for use building OpenSearch query body."""
 
@@ -73,8 +82,15 @@ class SearchRequestBody(BaseModel):
     jit_query: Optional[JitQuery] = JitQuery.ENABLED
     include_results: IncludedResultsList = None
 
+    # Fields to count the matching documents by value of, e.g. per country
+    facets: Optional[Sequence[FilterField]] = None
+
     limit: int = 10  # TODO: decide on default
     offset: int = 0
+    # Opaque cursor returned by a previous search, used to fetch further pages
+    cursor: Optional[str] = None
+    # Time to spend searching, after which partial results are returned
+    latency_budget_ms: Optional[conint(gt=0)] = None  # type: ignore
 
 
 class SearchResponseDocumentPassage(BaseModel):
@@ -143,6 +159,11 @@ class SearchResults(BaseModel):
 
     hits: int
     query_time_ms: int
+    cursor: Optional[str] = None
+    # Whether results are missing, e.g. because the latency budget was exceeded
+    partial: bool = False
+    # Requested facets, as counts of matching documents by field value
+    facets: Optional[Mapping[FilterField, Mapping[str, int]]] = None
 
     documents: list[SearchResult]
 
@@ -152,6 +173,11 @@ class SearchResultsResponse(BaseModel):
 
     hits: int
     query_time_ms: int
+    cursor: Optional[str] = None
+    # Whether results are missing, e.g. because the latency budget was exceeded
+    partial: bool = False
+    # Requested facets, as counts of matching documents by field value
+    facets: Optional[Mapping[FilterField, Mapping[str, int]]] = None
 
     documents: Sequence[SearchResultResponse]
 
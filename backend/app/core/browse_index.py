@@ -0,0 +1,255 @@
+"""A columnar in-memory snapshot of the `_core` index, for answering browse requests.
+
+Keyword fields are dictionary-encoded, dates are stored as day ordinals, and the
+documents are presorted by each sort field. A browse request is then answered by
+combining boolean masks for its filters and slicing the precomputed order, without
+querying OpenSearch. Only the parts of the query DSL used by browse requests are
+supported; `BrowseIndex.search` returns None for anything else, to be left to
+OpenSearch.
+"""
+import threading
+from datetime import datetime
+from typing import Any, Iterable, Mapping, Optional, Sequence
+
+import numpy as np
+
+_DATE_FORMAT = "%d/%m/%Y"
+_MISSING_DATE = -1
+# OpenSearch only counts hits accurately up to this many by default
+_TRACK_TOTAL_HITS = 10000
+_SUPPORTED_REQUEST_KEYS = {"query", "sort", "from", "size", "_source", "aggs"}
+
+
+def _date_ordinal(date: Any) -> int:
+    try:
+        return datetime.strptime(date, _DATE_FORMAT).toordinal()
+    except (TypeError, ValueError):
+        return _MISSING_DATE
+
+
+class _KeywordColumn:
+    """A dictionary-encoded keyword field, which may have several values per row.
+
+    Each (row, value) pair is stored as the row and the dictionary code of the value.
+    """
+
+    def __init__(self, row_values: Sequence[Any]):
+        codes_by_value: dict[str, int] = {}
+        rows = []
+        codes = []
+        for row, values in enumerate(row_values):
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            for value in values:
+                code = codes_by_value.setdefault(value, len(codes_by_value))
+                rows.append(row)
+                codes.append(code)
+
+        self.values = list(codes_by_value)
+        self._codes_by_value = codes_by_value
+        self._n_rows = len(row_values)
+        self._rows = np.array(rows, dtype=np.int64)
+        self._codes = np.array(codes, dtype=np.int64)
+
+    def mask(self, values: Sequence[str]) -> np.ndarray:
+        """Get a mask of the rows with any of the given values."""
+
+        wanted = [self._codes_by_value[v] for v in values if v in self._codes_by_value]
+        mask = np.zeros(self._n_rows, dtype=bool)
+        mask[self._rows[np.isin(self._codes, wanted)]] = True
+        return mask
+
+    def counts(self, mask: np.ndarray) -> np.ndarray:
+        """Count the masked rows with each value, by dictionary code."""
+
+        return np.bincount(self._codes[mask[self._rows]], minlength=len(self.values))
+
+
+class _SortOrder:
+    """Rows presorted by a field, with rows missing the field kept last."""
+
+    def __init__(self, keys: Sequence[Any], missing: np.ndarray):
+        present_rows = [row for row in range(len(keys)) if not missing[row]]
+        self._ascending = np.array(
+            sorted(present_rows, key=keys.__getitem__), dtype=np.int64
+        )
+        self._missing = np.flatnonzero(missing)
+
+    def rows(self, mask: np.ndarray, descending: bool) -> np.ndarray:
+        """Get the masked rows in order."""
+
+        present = self._ascending[mask[self._ascending]]
+        if descending:
+            present = present[::-1]
+        return np.concatenate([present, self._missing[mask[self._missing]]])
+
+
+class BrowseIndex:
+    """A snapshot of the documents in an index, answering browse requests."""
+
+    def __init__(
+        self,
+        sources: Sequence[Mapping[str, Any]],
+        keyword_fields: Iterable[str],
+        date_field: str,
+        title_field: str,
+        generation: str = "",
+    ):
+        """Create a snapshot of documents.
+
+        :param sources: the source of each document
+        :param keyword_fields: the keyword fields which can be filtered & counted
+        :param date_field: the date field, which can be filtered by range & sorted
+        :param title_field: the title field, which can be sorted
+        :param generation: the index generation the documents were read at
+        """
+
+        self.generation = generation
+        self._sources = sources
+        self._date_field = date_field
+        self._keyword_columns = {
+            field: _KeywordColumn([source.get(field) for source in sources])
+            for field in keyword_fields
+        }
+        self._dates = np.array(
+            [_date_ordinal(source.get(date_field)) for source in sources],
+            dtype=np.int32,
+        )
+        titles = [source.get(title_field) for source in sources]
+        self._sort_orders = {
+            date_field: _SortOrder(self._dates, self._dates == _MISSING_DATE),
+            title_field: _SortOrder(
+                titles, np.array([title is None for title in titles], dtype=bool)
+            ),
+        }
+        self._exists: dict[str, np.ndarray] = {}
+        self._exists_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Get the number of documents in the snapshot."""
+        return len(self._sources)
+
+    def _exists_mask(self, field: str) -> np.ndarray:
+        with self._exists_lock:
+            mask = self._exists.get(field)
+            if mask is None:
+                mask = np.array(
+                    [
+                        source.get(field) not in (None, "", [])
+                        for source in self._sources
+                    ],
+                    dtype=bool,
+                )
+                self._exists[field] = mask
+            return mask
+
+    def _date_range_mask(self, conditions: Mapping[str, Any]) -> Optional[np.ndarray]:
+        mask = self._dates != _MISSING_DATE
+        for operator, date in conditions.items():
+            ordinal = _date_ordinal(date)
+            if ordinal == _MISSING_DATE:
+                return None
+            if operator == "gte":
+                mask &= self._dates >= ordinal
+            elif operator == "gt":
+                mask &= self._dates > ordinal
+            elif operator == "lte":
+                mask &= self._dates <= ordinal
+            elif operator == "lt":
+                mask &= self._dates < ordinal
+            else:
+                return None
+        return mask
+
+    def _clause_mask(self, clause: Mapping[str, Any]) -> Optional[np.ndarray]:
+        if len(clause) != 1:
+            return None
+        ((clause_type, args),) = clause.items()
+        if clause_type == "exists" and set(args) == {"field"}:
+            return self._exists_mask(args["field"])
+        if clause_type == "terms" and len(args) == 1:
+            ((field, values),) = args.items()
+            column = self._keyword_columns.get(field)
+            return None if column is None else column.mask(values)
+        if clause_type == "range" and set(args) == {self._date_field}:
+            return self._date_range_mask(args[self._date_field])
+        return None
+
+    def _facet(self, terms: Mapping[str, Any], mask: np.ndarray) -> Optional[dict]:
+        column = self._keyword_columns.get(terms.get("field", ""))
+        if column is None or set(terms) - {"field", "size"}:
+            return None
+        counts = column.counts(mask)
+        codes = sorted(
+            np.flatnonzero(counts), key=lambda c: (-counts[c], column.values[c])
+        )
+        return {
+            "buckets": [
+                {"key": column.values[code], "doc_count": int(counts[code])}
+                for code in codes[: terms.get("size", 10)]
+            ]
+        }
+
+    def search(self, request_body: Mapping[str, Any]) -> Optional[dict[str, Any]]:
+        """Answer a browse request as OpenSearch would.
+
+        :param request_body: an OpenSearch request body for a browse request
+        :return: the response OpenSearch would give, or None if the request is not
+            supported by the snapshot
+        """
+
+        if set(request_body) - _SUPPORTED_REQUEST_KEYS:
+            return None
+
+        mask = np.ones(len(self), dtype=bool)
+        query = request_body.get("query", {"bool": {}})
+        if set(query) != {"bool"} or set(query["bool"]) - {"must", "filter"}:
+            return None
+        for clauses in query["bool"].values():
+            for clause in clauses:
+                clause_mask = self._clause_mask(clause)
+                if clause_mask is None:
+                    return None
+                mask &= clause_mask
+
+        sort = request_body.get("sort", {})
+        if len(sort) != 1:
+            return None
+        ((sort_field, sort_args),) = sort.items()
+        sort_order = self._sort_orders.get(sort_field)
+        if sort_order is None:
+            return None
+        rows = sort_order.rows(mask, descending=sort_args.get("order") == "desc")
+
+        aggregations = {}
+        for name, aggregation in request_body.get("aggs", {}).items():
+            facet = (
+                self._facet(aggregation["terms"], mask)
+                if set(aggregation) == {"terms"}
+                else None
+            )
+            if facet is None:
+                return None
+            aggregations[name] = facet
+
+        start = request_body.get("from", 0)
+        size = request_body.get("size", 10)
+        total = len(rows)
+        response: dict[str, Any] = {
+            "took": 0,
+            "hits": {
+                "total": {
+                    "value": min(total, _TRACK_TOTAL_HITS),
+                    "relation": "eq" if total <= _TRACK_TOTAL_HITS else "gte",
+                },
+                "hits": [
+                    {"_source": self._sources[row]}
+                    for row in rows[start : start + size]
+                ],
+            },
+        }
+        if aggregations:
+            response["aggregations"] = aggregations
+        return response
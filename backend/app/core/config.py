@@ -9,6 +9,7 @@ if not SQLALCHEMY_DATABASE_URI:
 API_V1_STR = "/api/v1"
 
 # OpenSearch Config
+# A comma-separated list of node URLs
 OPENSEARCH_URL = os.environ["OPENSEARCH_URL"]
 OPENSEARCH_USERNAME = os.environ["OPENSEARCH_USER"]
 OPENSEARCH_PASSWORD = os.environ["OPENSEARCH_PASSWORD"]
@@ -21,6 +22,53 @@ OPENSEARCH_VERIFY_CERTS: bool = (
 OPENSEARCH_SSL_WARNINGS: bool = (
     os.getenv("OPENSEARCH_SSL_WARNINGS", "False").lower() == "true"
 )
+# Number of connections kept open to each node
+OPENSEARCH_CONNECTION_POOL_MAXSIZE: int = int(
+    os.getenv("OPENSEARCH_CONNECTION_POOL_MAXSIZE", "10")
+)
+OPENSEARCH_HTTP_KEEP_ALIVE: bool = (
+    os.getenv("OPENSEARCH_HTTP_KEEP_ALIVE", "True").lower() == "true"
+)
+# Gzip request bodies and ask OpenSearch for gzipped responses
+OPENSEARCH_HTTP_COMPRESS: bool = (
+    os.getenv("OPENSEARCH_HTTP_COMPRESS", "True").lower() == "true"
+)
+# Discover cluster nodes from the configured nodes. Not supported when OpenSearch is
+# behind a load balancer (e.g. a managed domain).
+OPENSEARCH_SNIFF_ON_START: bool = (
+    os.getenv("OPENSEARCH_SNIFF_ON_START", "False").lower() == "true"
+)
+OPENSEARCH_SNIFF_ON_CONNECTION_FAIL: bool = (
+    os.getenv("OPENSEARCH_SNIFF_ON_CONNECTION_FAIL", "False").lower() == "true"
+)
+# Seconds between sniffs while running, or 0 to only sniff as configured above
+OPENSEARCH_SNIFFER_TIMEOUT_S: float = float(
+    os.getenv("OPENSEARCH_SNIFFER_TIMEOUT_S", "0")
+)
+# Serve searches with the async OpenSearch client
+OPENSEARCH_ASYNC_SEARCH: bool = (
+    os.getenv("OPENSEARCH_ASYNC_SEARCH", "False").lower() == "true"
+)
+# Search each index separately & concurrently, merging the results. Indices that do
+# not respond within the timeout are left out, and the results marked as partial.
+OPENSEARCH_FAN_OUT_SEARCH: bool = (
+    os.getenv("OPENSEARCH_FAN_OUT_SEARCH", "False").lower() == "true"
+)
+OPENSEARCH_FAN_OUT_INDEX_TIMEOUT_S: float = float(
+    os.getenv("OPENSEARCH_FAN_OUT_INDEX_TIMEOUT_S", "10")
+)
+# Fill in a request body template compiled once per shape of query, optionally
+# stored in OpenSearch as a search template so that only parameters are sent
+OPENSEARCH_QUERY_TEMPLATES: bool = (
+    os.getenv("OPENSEARCH_QUERY_TEMPLATES", "False").lower() == "true"
+)
+OPENSEARCH_STORED_SEARCH_TEMPLATES: bool = (
+    os.getenv("OPENSEARCH_STORED_SEARCH_TEMPLATES", "False").lower() == "true"
+)
+# Skip validation of documents returned by OpenSearch when building search results
+OPENSEARCH_FAST_RESPONSE_PARSING: bool = (
+    os.getenv("OPENSEARCH_FAST_RESPONSE_PARSING", "False").lower() == "true"
+)
 
 
 # OpenSearch Index Config
@@ -34,6 +82,46 @@ OPENSEARCH_INDEX_MAX_PASSAGES_PER_DOC: int = int(
     os.getenv("OPENSEARCH_INDEX_MAX_PASSAGES_PER_DOC", "10")
 )
 OPENSEARCH_INDEX_KNN_K_VALUE = int(os.getenv("OPENSEARCH_INDEX_KNN_K_VALUE", "10000"))
+# Start semantic searches with a k derived from the requested page, searching again
+# with OPENSEARCH_INDEX_KNN_K_VALUE only if too few documents are found
+OPENSEARCH_ADAPTIVE_KNN: bool = (
+    os.getenv("OPENSEARCH_ADAPTIVE_KNN", "False").lower() == "true"
+)
+OPENSEARCH_KNN_MIN_K: int = int(os.getenv("OPENSEARCH_KNN_MIN_K", "100"))
+# Nearest passages to ask for per document needed
+OPENSEARCH_KNN_K_PER_DOC: int = int(os.getenv("OPENSEARCH_KNN_K_PER_DOC", "20"))
+# Filter within kNN clauses, rather than only after them. Needs an index using the
+# lucene or faiss engine with OpenSearch 2.9+
+OPENSEARCH_KNN_FILTER: bool = (
+    os.getenv("OPENSEARCH_KNN_FILTER", "False").lower() == "true"
+)
+# When set, document descriptions are searched in-process using the snapshot of
+# their embeddings at this path, rather than by kNN in OpenSearch
+OPENSEARCH_DESCRIPTION_INDEX_PATH: str = os.getenv(
+    "OPENSEARCH_DESCRIPTION_INDEX_PATH", ""
+)
+# Answer browse requests from an in-memory snapshot of the core index, which is
+# refreshed when the index generation changes
+OPENSEARCH_LOCAL_BROWSE: bool = (
+    os.getenv("OPENSEARCH_LOCAL_BROWSE", "False").lower() == "true"
+)
+# Coalesce identical searches made while one is in flight into a single search
+OPENSEARCH_COALESCE_SEARCHES: bool = (
+    os.getenv("OPENSEARCH_COALESCE_SEARCHES", "False").lower() == "true"
+)
+# Maximum latency budget of a request to the searches endpoint, also applied to
+# requests without one, after which partial results are returned (0 for no cap)
+OPENSEARCH_SEARCHES_MAX_LATENCY_BUDGET_MS: int = int(
+    os.getenv("OPENSEARCH_SEARCHES_MAX_LATENCY_BUDGET_MS", "0")
+)
+# Maximum number of documents to collect per shard before returning partial results
+# (0 for no limit)
+OPENSEARCH_TERMINATE_AFTER: int = int(os.getenv("OPENSEARCH_TERMINATE_AFTER", "0"))
+# When set, the first pages of frequent searches are served from the snapshot of
+# precomputed results at this path, while the indices are unchanged
+OPENSEARCH_PRECOMPUTED_RESULTS_PATH: str = os.getenv(
+    "OPENSEARCH_PRECOMPUTED_RESULTS_PATH", ""
+)
 OPENSEARCH_INDEX_N_PASSAGES_TO_SAMPLE_PER_SHARD: int = int(
     os.getenv("OPENSEARCH_INDEX_N_PASSAGES_TO_SAMPLE_PER_SHARD", "5000")
 )
@@ -65,3 +153,94 @@ OPENSEARCH_INDEX_ENCODER: str = os.getenv(
     "OPENSEARCH_INDEX_ENCODER", "sentence-transformers/msmarco-distilbert-dot-v5"
 )
 OPENSEARCH_JIT_MAX_DOC_COUNT: int = int(os.getenv("OPENSEARCH_JIT_MAX_DOC_COUNT", "20"))
+# Size JIT searches from their recent latency, to keep its p95 near the target
+OPENSEARCH_JIT_ADAPTIVE: bool = (
+    os.getenv("OPENSEARCH_JIT_ADAPTIVE", "False").lower() == "true"
+)
+OPENSEARCH_JIT_TARGET_LATENCY_MS: int = int(
+    os.getenv("OPENSEARCH_JIT_TARGET_LATENCY_MS", "400")
+)
+# Maximum number of values to count for each requested facet
+OPENSEARCH_FACET_SIZE: int = int(os.getenv("OPENSEARCH_FACET_SIZE", "250"))
+# Rank documents first, then fetch passages only for the documents on the page
+OPENSEARCH_TWO_PHASE_SEARCH: bool = (
+    os.getenv("OPENSEARCH_TWO_PHASE_SEARCH", "False").lower() == "true"
+)
+
+# Query encoder config
+# Inference backend for the encoder model: "fp32", or "int8" for dynamic quantisation
+OPENSEARCH_INDEX_ENCODER_BACKEND: str = os.getenv(
+    "OPENSEARCH_INDEX_ENCODER_BACKEND", "fp32"
+).lower()
+# Number of CPU threads used for encoding (0 uses the torch default)
+OPENSEARCH_INDEX_ENCODER_THREADS: int = int(
+    os.getenv("OPENSEARCH_INDEX_ENCODER_THREADS", "0")
+)
+INDEX_ENCODER_CACHE_FOLDER: str = os.getenv("INDEX_ENCODER_CACHE_FOLDER", "/models")
+# When set, queries are encoded by a shared encoder process listening on this socket
+OPENSEARCH_INDEX_ENCODER_SOCKET: str = os.getenv("OPENSEARCH_INDEX_ENCODER_SOCKET", "")
+OPENSEARCH_INDEX_ENCODER_WARMUP: bool = (
+    os.getenv("OPENSEARCH_INDEX_ENCODER_WARMUP", "True").lower() == "true"
+)
+# Number of query embeddings kept in each worker's LRU cache (0 disables caching)
+OPENSEARCH_INDEX_ENCODER_CACHE_SIZE: int = int(
+    os.getenv("OPENSEARCH_INDEX_ENCODER_CACHE_SIZE", "1024")
+)
+# Directory of precomputed embeddings for frequent queries, loaded at startup
+OPENSEARCH_INDEX_ENCODER_CACHE_STORE: str = os.getenv(
+    "OPENSEARCH_INDEX_ENCODER_CACHE_STORE", ""
+)
+# Queries arriving within this window are encoded together (0 disables batching)
+OPENSEARCH_INDEX_ENCODER_BATCH_WINDOW_MS: float = float(
+    os.getenv("OPENSEARCH_INDEX_ENCODER_BATCH_WINDOW_MS", "0")
+)
+OPENSEARCH_INDEX_ENCODER_MAX_BATCH_SIZE: int = int(
+    os.getenv("OPENSEARCH_INDEX_ENCODER_MAX_BATCH_SIZE", "32")
+)
+
+# Sensitive query terms config
+# TSV of sensitive query terms, defaults to the list packaged with the app
+SENSITIVE_QUERY_TERMS_PATH: str = os.getenv("SENSITIVE_QUERY_TERMS_PATH", "")
+# How often to check the sensitive query terms file for changes (0 disables reload)
+SENSITIVE_QUERY_TERMS_RELOAD_INTERVAL_S: float = float(
+    os.getenv("SENSITIVE_QUERY_TERMS_RELOAD_INTERVAL_S", "60")
+)
+
+# Lookups config
+# How often to reload the geography hierarchy used to resolve search filters
+GEOGRAPHY_INDEX_REFRESH_INTERVAL_S: float = float(
+    os.getenv("GEOGRAPHY_INDEX_REFRESH_INTERVAL_S", "300")
+)
+# How often to reload the document postfixes attached to search results
+DOCUMENT_POSTFIX_REFRESH_INTERVAL_S: float = float(
+    os.getenv("DOCUMENT_POSTFIX_REFRESH_INTERVAL_S", "300")
+)
+# Listen for document postfix changes made by other processes, to apply them before
+# the next reload. Each worker process holds a database connection of its own to
+# listen on, outside the connection pool
+DOCUMENT_POSTFIX_LISTEN: bool = (
+    os.getenv("DOCUMENT_POSTFIX_LISTEN", "False").lower() == "true"
+)
+
+# Search result cache config, disabled by default as cached results can be up to
+# the TTL out of date (a size of 0 disables the cache)
+OPENSEARCH_RESULT_CACHE_SIZE: int = int(os.getenv("OPENSEARCH_RESULT_CACHE_SIZE", "0"))
+OPENSEARCH_RESULT_CACHE_TTL_S: float = float(
+    os.getenv("OPENSEARCH_RESULT_CACHE_TTL_S", "300")
+)
+# How often to check whether the OpenSearch indices have been rebuilt
+OPENSEARCH_INDEX_GENERATION_CHECK_S: float = float(
+    os.getenv("OPENSEARCH_INDEX_GENERATION_CHECK_S", "30")
+)
+# Search cursor config, cursors let later pages skip ranking. Disabled by default
+# (a size of 0 disables)
+OPENSEARCH_CURSOR_CACHE_SIZE: int = int(os.getenv("OPENSEARCH_CURSOR_CACHE_SIZE", "0"))
+OPENSEARCH_CURSOR_TTL_S: float = float(os.getenv("OPENSEARCH_CURSOR_TTL_S", "600"))
+# Store of the full results of recent searches, including those made in the
+# background of JIT searches, used to serve their later pages (a size of 0 disables)
+OPENSEARCH_RESULT_SET_STORE_SIZE: int = int(
+    os.getenv("OPENSEARCH_RESULT_SET_STORE_SIZE", "0")
+)
+OPENSEARCH_RESULT_SET_TTL_S: float = float(
+    os.getenv("OPENSEARCH_RESULT_SET_TTL_S", "120")
+)
@@ -0,0 +1,244 @@
+"""An in-process index of document description embeddings.
+
+There is only one description embedding per document, so they fit in memory and
+can be searched exactly with a matrix product rather than an HNSW traversal on the
+cluster. The index is loaded from a snapshot written by `write_description_index`
+(see scripts/build_description_index), whose embeddings are memory-mapped so that
+they are shared between workers by the OS page cache.
+"""
+import json
+import logging
+import os
+from collections import defaultdict
+from typing import Any, Mapping, Optional, Sequence
+
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+# Files making up a snapshot of the index
+_SNAPSHOT_DOCUMENTS_FILE = "documents.json"
+_SNAPSHOT_EMBEDDINGS_FILE = "embeddings.npy"
+_SNAPSHOT_METADATA_FILE = "metadata.json"
+_EMBEDDING_DTYPE = np.dtype("<f4")
+_DATE_FIELD = "document_date"
+
+
+def _document_year(document: Mapping[str, Any]) -> int:
+    # Dates are indexed as dd/mm/yyyy
+    date = document.get(_DATE_FIELD) or ""
+    try:
+        return int(date.rsplit("/", 1)[-1])
+    except ValueError:
+        return -1
+
+
+class DescriptionEmbeddingIndex:
+    """Description embeddings of documents, with the fields used to filter them.
+
+    Each row is a document, identified by its key, with the source of its
+    description entry in the `_core` index.
+    """
+
+    def __init__(
+        self,
+        document_keys: Sequence[str],
+        documents: Sequence[Mapping[str, Any]],
+        embeddings: np.ndarray,
+        generation: str = "",
+    ):
+        """Create the index.
+
+        :param generation: the generation of the `_core` index the documents were
+            read at, as "index:uuid:docs.count", or "" if unknown
+        """
+
+        if not (len(document_keys) == len(documents) == embeddings.shape[0]):
+            raise ValueError(
+                f"Description index has {len(document_keys)} keys, {len(documents)} "
+                f"documents and {embeddings.shape[0]} embeddings"
+            )
+
+        self.document_keys = document_keys
+        self.documents = documents
+        self._embeddings = embeddings
+        self.generation = generation
+        self._rows_by_key = {key: row for row, key in enumerate(document_keys)}
+        self._years = np.array([_document_year(d) for d in documents], dtype=np.int32)
+        # Rows by field & value, built the first time a field is filtered on
+        self._rows_by_value: dict[str, Mapping[str, np.ndarray]] = {}
+
+    @classmethod
+    def load(cls, snapshot_path: str) -> "DescriptionEmbeddingIndex":
+        """Load a snapshot of the index, memory-mapping its embeddings."""
+
+        with open(os.path.join(snapshot_path, _SNAPSHOT_DOCUMENTS_FILE), "r") as f:
+            snapshot = json.load(f)
+        try:
+            with open(os.path.join(snapshot_path, _SNAPSHOT_METADATA_FILE), "r") as f:
+                generation = json.load(f)["generation"]
+        except FileNotFoundError:
+            # Snapshots written before generations were recorded are never current
+            _LOGGER.warning(
+                "Description embedding index snapshot has no generation",
+                extra={"props": {"path": snapshot_path}},
+            )
+            generation = ""
+        embeddings = np.load(
+            os.path.join(snapshot_path, _SNAPSHOT_EMBEDDINGS_FILE), mmap_mode="r"
+        )
+        index = cls(
+            document_keys=[d["key"] for d in snapshot],
+            documents=[d["source"] for d in snapshot],
+            embeddings=embeddings,
+            generation=generation,
+        )
+        _LOGGER.info(
+            "Loaded description embedding index",
+            extra={
+                "props": {
+                    "path": snapshot_path,
+                    "documents": len(index),
+                    "generation": generation,
+                }
+            },
+        )
+        return index
+
+    def __len__(self) -> int:
+        """Get the number of documents in the index."""
+        return len(self.document_keys)
+
+    def _field_rows(self, field: str) -> Mapping[str, np.ndarray]:
+        field_rows = self._rows_by_value.get(field)
+        if field_rows is None:
+            rows_by_value = defaultdict(list)
+            for row, document in enumerate(self.documents):
+                values = document.get(field)
+                if isinstance(values, str) or values is None:
+                    values = [values]
+                for value in values:
+                    rows_by_value[value].append(row)
+            field_rows = {
+                value: np.array(rows, dtype=np.int64)
+                for value, rows in rows_by_value.items()
+            }
+            self._rows_by_value[field] = field_rows
+        return field_rows
+
+    def filter_mask(
+        self,
+        keyword_filters: Optional[Mapping[str, Sequence[str]]] = None,
+        year_range: Optional[tuple[Optional[int], Optional[int]]] = None,
+        document_keys: Optional[Sequence[str]] = None,
+    ) -> Optional[np.ndarray]:
+        """Get a mask of the documents matching the given filters.
+
+        :param keyword_filters: values to match, by document field
+        :param year_range: inclusive range of document years, either end optional
+        :param document_keys: keys of the only documents to match
+        :return: a boolean mask of matching rows, or None if there are no filters
+        """
+
+        mask: Optional[np.ndarray] = None
+
+        def restrict(rows_mask: np.ndarray):
+            nonlocal mask
+            mask = rows_mask if mask is None else mask & rows_mask
+
+        for field, values in (keyword_filters or {}).items():
+            field_rows = self._field_rows(field)
+            field_mask = np.zeros(len(self), dtype=bool)
+            for value in values:
+                rows = field_rows.get(value)
+                if rows is not None:
+                    field_mask[rows] = True
+            restrict(field_mask)
+
+        if year_range is not None:
+            start, end = year_range
+            if start is not None:
+                restrict(self._years >= start)
+            if end is not None:
+                restrict((self._years <= end) & (self._years >= 0))
+
+        if document_keys is not None:
+            keys_mask = np.zeros(len(self), dtype=bool)
+            keys_mask[
+                [self._rows_by_key[k] for k in document_keys if k in self._rows_by_key]
+            ] = True
+            restrict(keys_mask)
+
+        return mask
+
+    def search(
+        self,
+        embeddings: np.ndarray,
+        limit: int,
+        min_similarity: float,
+        mask: Optional[np.ndarray] = None,
+    ) -> list[list[tuple[int, float]]]:
+        """Find the documents with the most similar descriptions to each query.
+
+        Similarity is the inner product of embeddings, computed for a batch of
+        queries by a single matrix product.
+
+        :param embeddings: a query embedding, or a matrix of one per row
+        :param limit: the maximum number of documents to find for each query
+        :param min_similarity: the minimum similarity of a document to be found
+        :param mask: a boolean mask of the rows which may be found
+        :return: rows & similarities of the documents found for each query, most
+            similar first
+        """
+
+        queries = np.atleast_2d(np.asarray(embeddings, dtype=_EMBEDDING_DTYPE))
+        similarities = queries @ self._embeddings.T
+        if mask is not None:
+            similarities[:, ~mask] = -np.inf
+
+        limit = min(limit, len(self))
+        results = []
+        for query_similarities in similarities:
+            if limit <= 0:
+                results.append([])
+                continue
+            top_rows = np.argpartition(-query_similarities, limit - 1)[:limit]
+            top_rows = top_rows[np.argsort(-query_similarities[top_rows])]
+            results.append(
+                [
+                    (int(row), float(query_similarities[row]))
+                    for row in top_rows
+                    if query_similarities[row] >= min_similarity
+                ]
+            )
+        return results
+
+
+def write_description_index(
+    snapshot_path: str,
+    document_keys: Sequence[str],
+    documents: Sequence[Mapping[str, Any]],
+    embeddings: Sequence[Sequence[float]],
+    generation: str,
+) -> None:
+    """Write a snapshot of the description embedding index to disk.
+
+    :param generation: the generation of the `_core` index the documents were read
+        at, which the snapshot is only searched while current
+    """
+
+    os.makedirs(snapshot_path, exist_ok=True)
+    np.save(
+        os.path.join(snapshot_path, _SNAPSHOT_EMBEDDINGS_FILE),
+        np.asarray(embeddings, dtype=_EMBEDDING_DTYPE),
+    )
+    with open(os.path.join(snapshot_path, _SNAPSHOT_DOCUMENTS_FILE), "w") as f:
+        json.dump(
+            [
+                {"key": key, "source": document}
+                for key, document in zip(document_keys, documents)
+            ],
+            f,
+        )
+    with open(os.path.join(snapshot_path, _SNAPSHOT_METADATA_FILE), "w") as f:
+        json.dump({"generation": generation}, f)
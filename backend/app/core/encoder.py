@@ -0,0 +1,567 @@
+"""Sentence encoders used to embed search queries.
+
+Loading the encoder model is expensive, so it is deferred until first use (or an
+explicit warmup) rather than happening at import time. When
+OPENSEARCH_INDEX_ENCODER_SOCKET is configured, encoding is delegated to a separate
+encoder process listening on that Unix socket so that all API workers on a host
+share a single copy of the model. Run the encoder process with:
+
+    python -m app.core.encoder --socket /tmp/navigator-encoder.sock
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import (
+    INDEX_ENCODER_CACHE_FOLDER,
+    OPENSEARCH_INDEX_ENCODER,
+    OPENSEARCH_INDEX_ENCODER_BACKEND,
+    OPENSEARCH_INDEX_ENCODER_BATCH_WINDOW_MS,
+    OPENSEARCH_INDEX_ENCODER_CACHE_SIZE,
+    OPENSEARCH_INDEX_ENCODER_CACHE_STORE,
+    OPENSEARCH_INDEX_ENCODER_MAX_BATCH_SIZE,
+    OPENSEARCH_INDEX_ENCODER_SOCKET,
+    OPENSEARCH_INDEX_ENCODER_THREADS,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Requests are a length-prefixed JSON list of strings, responses are the shape of
+# the embedding matrix followed by its float32 values.
+_LENGTH_HEADER = struct.Struct("!I")
+_SHAPE_HEADER = struct.Struct("!II")
+_EMBEDDING_DTYPE = np.dtype("<f4")
+# Files making up a precomputed embedding store
+_STORE_QUERIES_FILE = "queries.json"
+_STORE_EMBEDDINGS_FILE = "embeddings.npy"
+# Supported inference backends for locally loaded models
+ENCODER_BACKENDS = ("fp32", "int8")
+# Backoff of warmup retries while the encoder is unavailable
+_WARMUP_RETRY_INITIAL_DELAY_S = 1.0
+_WARMUP_RETRY_MAX_DELAY_S = 30.0
+
+
+class SentenceEncoder(ABC):
+    """Base class for encoders that turn query strings into embeddings."""
+
+    @property
+    @abstractmethod
+    def is_ready(self) -> bool:
+        """Whether the encoder can serve requests without a cold start."""
+
+    @abstractmethod
+    def warmup(self) -> None:
+        """Prepare the encoder so that the first request is not slowed down."""
+
+    @abstractmethod
+    def encode_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """Encode a sequence of strings into a 2D array of embeddings."""
+
+    def encode(self, text: str) -> np.ndarray:
+        """Encode a single string into a 1D embedding."""
+        return self.encode_batch([text])[0]
+
+
+class LocalSentenceEncoder(SentenceEncoder):
+    """Encodes using a SentenceTransformer model loaded into this process.
+
+    The "int8" backend applies dynamic quantisation to the linear layers of the
+    model, which is considerably faster on CPU at the cost of a small drift in the
+    embeddings produced (see scripts/benchmarks/encoder_backends).
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        cache_folder: str,
+        backend: str = "fp32",
+        num_threads: int = 0,
+    ):
+        if backend not in ENCODER_BACKENDS:
+            raise ValueError(
+                f"Unknown encoder backend '{backend}', expected one of "
+                f"{ENCODER_BACKENDS}"
+            )
+        self._model_name = model_name
+        self._cache_folder = cache_folder
+        self._backend = backend
+        self._num_threads = num_threads
+        self._model: Optional[Any] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether the model has been loaded."""
+        return self._model is not None
+
+    def warmup(self) -> None:
+        """Load the model."""
+        self._get_model()
+
+    def encode_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """Encode strings with the model, loading it if necessary."""
+        return self._get_model().encode(list(texts), convert_to_numpy=True)
+
+    def _get_model(self) -> Any:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    start = time.time_ns()
+                    self._model = self._load_model()
+                    _LOGGER.info(
+                        "Loaded sentence encoder",
+                        extra={
+                            "props": {
+                                "encoder": self._model_name,
+                                "backend": self._backend,
+                                "load_time": round((time.time_ns() - start) / 1e6),
+                            }
+                        },
+                    )
+        return self._model
+
+    def _load_model(self) -> Any:
+        # Imported here as importing torch alone is slow & memory hungry
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if self._num_threads > 0:
+            torch.set_num_threads(self._num_threads)
+
+        model = SentenceTransformer(
+            model_name_or_path=self._model_name,
+            cache_folder=self._cache_folder,
+            device="cpu" if self._backend == "int8" else None,
+        )
+        if self._backend == "int8":
+            model = torch.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        model.eval()
+        return model
+
+
+def normalise_query(text: str) -> str:
+    """Normalise a query string for use as an embedding cache key.
+
+    The configured encoder is uncased, so neither case nor repeated whitespace
+    change the embedding it produces.
+    """
+    return " ".join(text.lower().split())
+
+
+class CachingSentenceEncoder(SentenceEncoder):
+    """Caches the embeddings produced by another encoder.
+
+    Recently used embeddings are kept in an in-memory LRU cache. Embeddings for
+    frequent queries can also be precomputed into a store (see
+    `write_embedding_store`) which is memory-mapped when the encoder is created.
+    """
+
+    def __init__(
+        self,
+        encoder: SentenceEncoder,
+        max_size: int,
+        store_path: Optional[str] = None,
+    ):
+        self._encoder = encoder
+        self._max_size = max_size
+        self._cache: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._store_index: dict[str, int] = {}
+        self._store: Optional[np.ndarray] = None
+        self.hits = 0
+        self.misses = 0
+        if store_path:
+            self.load_store(store_path)
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether the cached encoder is ready."""
+        return self._encoder.is_ready
+
+    def warmup(self) -> None:
+        """Warm up the cached encoder."""
+        self._encoder.warmup()
+
+    def load_store(self, store_path: str) -> None:
+        """Memory-map a store of precomputed query embeddings."""
+
+        with open(os.path.join(store_path, _STORE_QUERIES_FILE), "r") as f:
+            queries = json.load(f)
+        embeddings = np.load(
+            os.path.join(store_path, _STORE_EMBEDDINGS_FILE), mmap_mode="r"
+        )
+        if len(queries) != embeddings.shape[0]:
+            raise ValueError(
+                f"Embedding store at {store_path} has {len(queries)} queries but "
+                f"{embeddings.shape[0]} embeddings"
+            )
+
+        self._store_index = {normalise_query(q): i for i, q in enumerate(queries)}
+        self._store = embeddings
+        _LOGGER.info(
+            "Loaded query embedding store",
+            extra={"props": {"path": store_path, "queries": len(queries)}},
+        )
+
+    def _lookup(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            embedding = self._cache.get(key)
+            if embedding is not None:
+                self._cache.move_to_end(key)
+                return embedding
+        store_row = self._store_index.get(key)
+        if store_row is not None and self._store is not None:
+            return self._store[store_row]
+        return None
+
+    def _remember(self, key: str, embedding: np.ndarray) -> None:
+        with self._lock:
+            self._cache[key] = embedding
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._max_size:
+                self._cache.popitem(last=False)
+
+    def encode_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """Encode strings, only encoding those not cached or in the store."""
+        if not texts:
+            return self._encoder.encode_batch(texts)
+
+        keys = [normalise_query(text) for text in texts]
+        embeddings: list[Optional[np.ndarray]] = [self._lookup(key) for key in keys]
+
+        # Encode each distinct missing query once, using its first spelling
+        missing: dict[str, str] = {}
+        for key, text, embedding in zip(keys, texts, embeddings):
+            if embedding is None and key not in missing:
+                missing[key] = text
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            encoded = self._encoder.encode_batch(list(missing.values()))
+            encoded_by_key = dict(zip(missing.keys(), encoded))
+            for key, embedding in encoded_by_key.items():
+                self._remember(key, embedding)
+            embeddings = [
+                encoded_by_key[key] if embedding is None else embedding
+                for key, embedding in zip(keys, embeddings)
+            ]
+
+        return np.stack(embeddings)  # type: ignore
+
+
+class BatchingSentenceEncoder(SentenceEncoder):
+    """Coalesces concurrent encode requests into batches for another encoder.
+
+    Texts queued within `window_ms` of the first text in a batch, up to
+    `max_batch_size` texts, are encoded with a single call on a background thread,
+    making use of the batched throughput of the model under concurrent load.
+    """
+
+    def __init__(
+        self,
+        encoder: SentenceEncoder,
+        window_ms: float,
+        max_batch_size: int,
+    ):
+        self._encoder = encoder
+        self._window_s = window_ms / 1000
+        self._max_batch_size = max_batch_size
+        self._queue: "queue.Queue[tuple[str, Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self.batches = 0
+        self.batched_texts = 0
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether the batched encoder is ready."""
+        return self._encoder.is_ready
+
+    def warmup(self) -> None:
+        """Warm up the batched encoder & start the batching thread."""
+        self._encoder.warmup()
+        self._ensure_worker()
+
+    def encode_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """Encode strings in the batches of the batching thread."""
+        if not texts:
+            return self._encoder.encode_batch(texts)
+
+        self._ensure_worker()
+        futures = []
+        for text in texts:
+            future: Future = Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        return np.stack([future.result() for future in futures])
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(
+                        target=self._run, name="encoder-batcher", daemon=True
+                    )
+                    self._worker.start()
+
+    def _next_batch(self) -> list[tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self._window_s
+        while len(batch) < self._max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            try:
+                embeddings = self._encoder.encode_batch([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.batched_texts += len(batch)
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+
+def write_embedding_store(
+    store_path: str,
+    queries: Sequence[str],
+    encoder: SentenceEncoder,
+    batch_size: int = 64,
+) -> None:
+    """Precompute embeddings for the given queries into a store on disk."""
+
+    unique_queries = list(dict.fromkeys(normalise_query(q) for q in queries))
+    embeddings = np.concatenate(
+        [
+            np.asarray(
+                encoder.encode_batch(unique_queries[i : i + batch_size]),
+                dtype=_EMBEDDING_DTYPE,
+            )
+            for i in range(0, len(unique_queries), batch_size)
+        ]
+    )
+
+    os.makedirs(store_path, exist_ok=True)
+    np.save(os.path.join(store_path, _STORE_EMBEDDINGS_FILE), embeddings)
+    with open(os.path.join(store_path, _STORE_QUERIES_FILE), "w") as f:
+        json.dump(unique_queries, f)
+
+
+def _recv_exact(sock: socket.socket, n_bytes: int) -> bytes:
+    chunks = []
+    remaining = n_bytes
+    while remaining > 0:
+        chunk = sock.recv(remaining)
+        if not chunk:
+            raise ConnectionError("Encoder socket closed mid-message")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+class SocketSentenceEncoder(SentenceEncoder):
+    """Encodes by delegating to a shared encoder process over a Unix socket."""
+
+    def __init__(self, socket_path: str, timeout: float = 10.0):
+        self._socket_path = socket_path
+        self._timeout = timeout
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether the encoder process is accepting requests."""
+        try:
+            self.encode_batch([])
+        except OSError:
+            return False
+        return True
+
+    def warmup(self) -> None:
+        """Check that the encoder process is accepting requests."""
+        self.encode_batch([])
+
+    def encode_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """Encode strings in the encoder process."""
+        payload = json.dumps(list(texts)).encode("utf-8")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self._timeout)
+            sock.connect(self._socket_path)
+            sock.sendall(_LENGTH_HEADER.pack(len(payload)) + payload)
+            rows, dim = _SHAPE_HEADER.unpack(_recv_exact(sock, _SHAPE_HEADER.size))
+            data = _recv_exact(sock, rows * dim * _EMBEDDING_DTYPE.itemsize)
+        return np.frombuffer(data, dtype=_EMBEDDING_DTYPE).reshape(rows, dim)
+
+
+class _EncoderRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        encoder: SentenceEncoder = self.server.encoder  # type: ignore
+        while True:
+            header = self.rfile.read(_LENGTH_HEADER.size)
+            if len(header) < _LENGTH_HEADER.size:
+                return
+            (length,) = _LENGTH_HEADER.unpack(header)
+            texts = json.loads(self.rfile.read(length).decode("utf-8"))
+            if texts:
+                embeddings = np.ascontiguousarray(
+                    encoder.encode_batch(texts), dtype=_EMBEDDING_DTYPE
+                )
+            else:
+                embeddings = np.zeros((0, 0), dtype=_EMBEDDING_DTYPE)
+            self.wfile.write(_SHAPE_HEADER.pack(*embeddings.shape))
+            self.wfile.write(embeddings.tobytes())
+            self.wfile.flush()
+
+
+class _EncoderServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, encoder: SentenceEncoder):
+        self.encoder = encoder
+        super().__init__(socket_path, _EncoderRequestHandler)
+
+
+def serve(socket_path: str, encoder: SentenceEncoder) -> None:
+    """Serve embeddings from the given encoder on a Unix socket until interrupted."""
+
+    encoder.warmup()
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    with _EncoderServer(socket_path, encoder) as server:
+        _LOGGER.info(
+            "Sentence encoder listening",
+            extra={"props": {"socket": socket_path}},
+        )
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(socket_path)
+
+
+def create_model_encoder() -> SentenceEncoder:
+    """Create an encoder for the configured model, batching requests if configured."""
+
+    encoder: SentenceEncoder = LocalSentenceEncoder(
+        OPENSEARCH_INDEX_ENCODER,
+        INDEX_ENCODER_CACHE_FOLDER,
+        backend=OPENSEARCH_INDEX_ENCODER_BACKEND,
+        num_threads=OPENSEARCH_INDEX_ENCODER_THREADS,
+    )
+    if OPENSEARCH_INDEX_ENCODER_BATCH_WINDOW_MS > 0:
+        encoder = BatchingSentenceEncoder(
+            encoder,
+            window_ms=OPENSEARCH_INDEX_ENCODER_BATCH_WINDOW_MS,
+            max_batch_size=OPENSEARCH_INDEX_ENCODER_MAX_BATCH_SIZE,
+        )
+    return encoder
+
+
+def warmup_encoder(
+    encoder: SentenceEncoder,
+    initial_delay_s: float = _WARMUP_RETRY_INITIAL_DELAY_S,
+) -> None:
+    """Warm up an encoder, retrying in the background if it is not available yet.
+
+    A shared encoder process may start after the API does, so failing to reach it
+    does not fail startup. Retries back off exponentially, and the encoder is
+    reported as not ready until one succeeds.
+    """
+
+    try:
+        encoder.warmup()
+    except OSError:
+        _LOGGER.warning("Sentence encoder is not available, retrying warmup")
+        threading.Thread(
+            target=_retry_warmup,
+            args=(encoder, initial_delay_s),
+            name="encoder-warmup",
+            daemon=True,
+        ).start()
+
+
+def _retry_warmup(encoder: SentenceEncoder, delay_s: float) -> None:
+    while True:
+        time.sleep(delay_s)
+        try:
+            encoder.warmup()
+        except OSError:
+            delay_s = min(delay_s * 2, _WARMUP_RETRY_MAX_DELAY_S)
+            continue
+        _LOGGER.info("Sentence encoder warmed up")
+        return
+
+
+_ENCODER: Optional[SentenceEncoder] = None
+_ENCODER_LOCK = threading.Lock()
+
+
+def get_encoder() -> SentenceEncoder:
+    """Get the process-wide query encoder, creating it from config if necessary."""
+
+    global _ENCODER
+    if _ENCODER is None:
+        with _ENCODER_LOCK:
+            if _ENCODER is None:
+                encoder: SentenceEncoder
+                if OPENSEARCH_INDEX_ENCODER_SOCKET:
+                    encoder = SocketSentenceEncoder(OPENSEARCH_INDEX_ENCODER_SOCKET)
+                else:
+                    encoder = create_model_encoder()
+                if (
+                    OPENSEARCH_INDEX_ENCODER_CACHE_SIZE > 0
+                    or OPENSEARCH_INDEX_ENCODER_CACHE_STORE
+                ):
+                    encoder = CachingSentenceEncoder(
+                        encoder,
+                        max_size=OPENSEARCH_INDEX_ENCODER_CACHE_SIZE,
+                        store_path=OPENSEARCH_INDEX_ENCODER_CACHE_STORE or None,
+                    )
+                _ENCODER = encoder
+    return _ENCODER
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the query encoder model.")
+    parser.add_argument(
+        "--socket",
+        default=OPENSEARCH_INDEX_ENCODER_SOCKET,
+        help="Path of the Unix socket to listen on",
+    )
+    args = parser.parse_args()
+    if not args.socket:
+        parser.error("a socket path must be given or configured")
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+    serve(args.socket, create_model_encoder())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 from fastapi import Depends
 from sqlalchemy.orm import Session
 
+from app.core.config import OPENSEARCH_INDEX_ENCODER_WARMUP
+from app.core.encoder import get_encoder
 from app.db.session import get_db
 
 
@@ -11,3 +13,13 @@ def is_database_online(db: Session = Depends(get_db)) -> bool:
     TODO: More comprehensive health checks
     """
     return True
+
+
+def is_encoder_ready() -> bool:
+    """
+    Checks the query encoder can serve searches without a cold start.
+
+    When warmup is disabled the encoder loads on first use, so is always reported
+    as ready.
+    """
+    return not OPENSEARCH_INDEX_ENCODER_WARMUP or get_encoder().is_ready
@@ -1,11 +1,18 @@
 import dataclasses
 import logging
-from typing import Optional
+from typing import AsyncIterator, Iterator, Optional, Sequence, Union
 from fastapi import BackgroundTasks
 
-from app.core.search import OpenSearchConnection, OpenSearchQueryConfig
+from app.core.jit_sizing import AdaptiveJitSizer
+from app.core.search import (
+    AsyncOpenSearchConnection,
+    OpenSearchConnection,
+    OpenSearchQueryConfig,
+    OpenSearchResponse,
+)
 from app.api.api_v1.schemas.search import (
     JitQuery,
+    SearchEvent,
     SearchRequestBody,
     SearchResults,
 )
@@ -18,15 +25,85 @@ def is_first_page(r: SearchRequestBody):
     return r.offset == 0
 
 
+def use_jit_query(search_request_body: SearchRequestBody) -> bool:
+    """Whether a request should be served by a JIT search."""
+    return search_request_body.jit_query == JitQuery.ENABLED and is_first_page(
+        search_request_body
+    )
+
+
+def use_jit_search(
+    os_connection: Union[OpenSearchConnection, AsyncOpenSearchConnection],
+    search_request_body: SearchRequestBody,
+    opensearch_internal_config: OpenSearchQueryConfig,
+) -> bool:
+    """Whether a request should be served by a JIT search on a connection."""
+
+    # Precomputed results are as quick as a JIT search, with no full search to follow
+    return use_jit_query(
+        search_request_body
+    ) and not os_connection.has_precomputed_results(
+        search_request_body, opensearch_internal_config
+    )
+
+
+def jit_query_config(
+    opensearch_internal_config: OpenSearchQueryConfig,
+    search_request_body: Optional[SearchRequestBody] = None,
+    jit_sizer: Optional[AdaptiveJitSizer] = None,
+) -> OpenSearchQueryConfig:
+    """Override config values to return the first page quickly.
+
+    The first page is still as accurate as possible. When a JIT sizer is given, the
+    JIT search for the request is sized by it from the latency of recent JIT
+    searches of the same shape.
+    """
+    overrides = {
+        "max_doc_count": opensearch_internal_config.jit_max_doc_count,
+    }
+    if jit_sizer is not None and search_request_body is not None:
+        overrides.update(
+            jit_sizer.sizes(search_request_body, opensearch_internal_config)
+        )
+    return dataclasses.replace(opensearch_internal_config, **overrides)
+
+
+def _log_jit_search(config: OpenSearchQueryConfig) -> None:
+    _LOGGER.info(
+        "Starting JIT search...",
+        extra={
+            "props": {
+                "max_doc_count": config.max_doc_count,
+                "n_passages_to_sample_per_shard": (
+                    config.n_passages_to_sample_per_shard
+                ),
+            }
+        },
+    )
+
+
+def _observe_jit_search(
+    jit_sizer: Optional[AdaptiveJitSizer],
+    search_request_body: SearchRequestBody,
+    response: SearchResults,
+    searches: Sequence[OpenSearchResponse],
+) -> None:
+    # Only searches which queried OpenSearch tell how long JIT searches take, not
+    # ones served from the result cache, precomputed results or another search
+    if jit_sizer is not None and searches:
+        jit_sizer.observe(search_request_body, response.query_time_ms)
+
+
 def jit_query(
     os_connection: OpenSearchConnection,
     search_request_body: SearchRequestBody,
     config: OpenSearchQueryConfig,
     preference: Optional[str],
     is_background: bool = False,
+    searches: Optional[list[OpenSearchResponse]] = None,
 ):
     """Static function has been created so it can be used as a BackgroundTask."""
-    response = os_connection.query(search_request_body, config, preference)
+    response = os_connection.query(search_request_body, config, preference, searches)
     if is_background:
         _LOGGER.info(
             "Background search complete.",
@@ -41,34 +118,30 @@ def jit_query_wrapper(
     opensearch_internal_config: OpenSearchQueryConfig,
     preference: Optional[str],
     background_tasks: Optional[BackgroundTasks] = None,
+    jit_sizer: Optional[AdaptiveJitSizer] = None,
 ) -> SearchResults:
     """Wraps the OpenSearchConnection query function to provide JIT search."""
 
-    if (
-        search_request_body.jit_query == JitQuery.ENABLED
-        and background_tasks is not None
-        and is_first_page(search_request_body)
+    if background_tasks is not None and use_jit_search(
+        os_connection, search_request_body, opensearch_internal_config
     ):
-        # Override certain config values to return the first page ASAP and
-        # as accurately as possible.
-
-        config = opensearch_internal_config
-
-        overrides = {
-            "max_doc_count": config.jit_max_doc_count,
-        }
-        config = dataclasses.replace(opensearch_internal_config, **overrides)
-        _LOGGER.info(
-            "Starting JIT search...",
+        config = jit_query_config(
+            opensearch_internal_config, search_request_body, jit_sizer
         )
+        _log_jit_search(config)
 
-        response = jit_query(os_connection, search_request_body, config, preference)
+        searches: list[OpenSearchResponse] = []
+        response = jit_query(
+            os_connection, search_request_body, config, preference, searches=searches
+        )
+        _observe_jit_search(jit_sizer, search_request_body, response, searches)
 
         _LOGGER.info(
             "JIT search complete - starting background search.",
         )
 
-        # In the background do the full query to prime the OpenSearch cache.
+        # In the background do the full query to prime the OpenSearch cache, and
+        # the connection's result set store to serve the following pages from.
         background_tasks.add_task(
             jit_query,
             os_connection,
@@ -89,3 +162,154 @@ def jit_query_wrapper(
         opensearch_internal_config,
         preference,
     )
+
+
+def progressive_jit_query(
+    os_connection: OpenSearchConnection,
+    search_request_body: SearchRequestBody,
+    opensearch_internal_config: OpenSearchQueryConfig,
+    preference: Optional[str],
+    jit_sizer: Optional[AdaptiveJitSizer] = None,
+) -> Iterator[tuple[SearchEvent, SearchResults]]:
+    """Query progressively, for the JIT search's results then the full search's.
+
+    The full search's results are yielded as a refinement of the JIT search's, and
+    requests not served by a JIT search only yield the full search's results.
+    """
+
+    if not use_jit_search(
+        os_connection, search_request_body, opensearch_internal_config
+    ):
+        yield SearchEvent.RESULTS, jit_query(
+            os_connection,
+            search_request_body,
+            opensearch_internal_config,
+            preference,
+        )
+        return
+
+    config = jit_query_config(
+        opensearch_internal_config, search_request_body, jit_sizer
+    )
+    _log_jit_search(config)
+    searches: list[OpenSearchResponse] = []
+    response = jit_query(
+        os_connection, search_request_body, config, preference, searches=searches
+    )
+    _observe_jit_search(jit_sizer, search_request_body, response, searches)
+    yield SearchEvent.RESULTS, response
+    yield SearchEvent.REFINED, jit_query(
+        os_connection,
+        search_request_body,
+        opensearch_internal_config,
+        preference,
+    )
+
+
+async def async_jit_query(
+    os_connection: AsyncOpenSearchConnection,
+    search_request_body: SearchRequestBody,
+    config: OpenSearchQueryConfig,
+    preference: Optional[str],
+    is_background: bool = False,
+    searches: Optional[list[OpenSearchResponse]] = None,
+):
+    """Async version of `jit_query`, also usable as a BackgroundTask."""
+    response = await os_connection.query(
+        search_request_body, config, preference, searches
+    )
+    if is_background:
+        _LOGGER.info(
+            "Background search complete.",
+        )
+
+    return response
+
+
+async def async_jit_query_wrapper(
+    os_connection: AsyncOpenSearchConnection,
+    search_request_body: SearchRequestBody,
+    opensearch_internal_config: OpenSearchQueryConfig,
+    preference: Optional[str],
+    background_tasks: Optional[BackgroundTasks] = None,
+    jit_sizer: Optional[AdaptiveJitSizer] = None,
+) -> SearchResults:
+    """Wraps the AsyncOpenSearchConnection query function to provide JIT search."""
+
+    if background_tasks is not None and use_jit_search(
+        os_connection, search_request_body, opensearch_internal_config
+    ):
+        config = jit_query_config(
+            opensearch_internal_config, search_request_body, jit_sizer
+        )
+        _log_jit_search(config)
+
+        searches: list[OpenSearchResponse] = []
+        response = await async_jit_query(
+            os_connection, search_request_body, config, preference, searches=searches
+        )
+        _observe_jit_search(jit_sizer, search_request_body, response, searches)
+
+        _LOGGER.info(
+            "JIT search complete - starting background search.",
+        )
+
+        # In the background do the full query to prime the OpenSearch cache, and
+        # the connection's result set store to serve the following pages from.
+        background_tasks.add_task(
+            async_jit_query,
+            os_connection,
+            search_request_body,
+            opensearch_internal_config,
+            preference,
+            True,
+        )
+        return response
+
+    _LOGGER.info(
+        "Starting normal search...",
+    )
+    return await async_jit_query(
+        os_connection,
+        search_request_body,
+        opensearch_internal_config,
+        preference,
+    )
+
+
+async def async_progressive_jit_query(
+    os_connection: AsyncOpenSearchConnection,
+    search_request_body: SearchRequestBody,
+    opensearch_internal_config: OpenSearchQueryConfig,
+    preference: Optional[str],
+    jit_sizer: Optional[AdaptiveJitSizer] = None,
+) -> AsyncIterator[tuple[SearchEvent, SearchResults]]:
+    """Async version of `progressive_jit_query`."""
+
+    if not use_jit_search(
+        os_connection, search_request_body, opensearch_internal_config
+    ):
+        yield SearchEvent.RESULTS, await async_jit_query(
+            os_connection,
+            search_request_body,
+            opensearch_internal_config,
+            preference,
+        )
+        return
+
+    config = jit_query_config(
+        opensearch_internal_config, search_request_body, jit_sizer
+    )
+    _log_jit_search(config)
+    searches: list[OpenSearchResponse] = []
+    response = await async_jit_query(
+        os_connection, search_request_body, config, preference, searches=searches
+    )
+    _observe_jit_search(jit_sizer, search_request_body, response, searches)
+    yield SearchEvent.RESULTS, response
+    yield SearchEvent.REFINED, await async_jit_query(
+        os_connection,
+        search_request_body,
+        opensearch_internal_config,
+        preference,
+    )
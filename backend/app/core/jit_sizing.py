@@ -0,0 +1,207 @@
+"""Adaptive sizing of JIT searches, from their observed latency.
+
+The latencies of recent JIT searches are tracked per query shape. Once a high
+percentile of a shape's latencies exceeds the target, its JIT searches are shrunk
+by a level (ranking fewer documents from a smaller sample of passages), and once
+it falls well below the target, they are grown by a level. Levels are discrete so
+that JIT searches keep a small number of distinct configs, which are shared by the
+result cache and query templates. The level & chosen sizes of each shape are
+exported as Prometheus metrics, labelled by the fields of the shape.
+
+Shapes are coarse (e.g. whether a search is filtered, not by which fields), so
+that there are few of them to track & export whatever is requested.
+"""
+import logging
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, NamedTuple
+
+from prometheus_client import Gauge
+
+from app.api.api_v1.schemas.search import SearchRequestBody
+
+_LOGGER = logging.getLogger(__name__)
+
+# Each level scales the configured JIT search by this factor
+_LEVEL_GROWTH = 1.5
+_MIN_LEVEL = -4
+_MAX_LEVEL = 4
+# Latencies tracked per query shape, and needed before resizing
+_LATENCY_WINDOW = 50
+_MIN_LATENCIES = 20
+_LATENCY_PERCENTILE = 0.95
+# Searches are grown once the latency percentile is below this fraction of target
+_IDLE_FRACTION = 0.5
+# The most shapes tracked, the least recently searched being forgotten beyond it
+_MAX_SHAPES = 64
+
+
+class JitQueryShape(NamedTuple):
+    """The parts of a request that determine how long its search takes.
+
+    The requested page is not part of the shape, as JIT searches are always sized
+    to rank enough documents for it.
+    """
+
+    query: str  # "none", "semantic" or "exact"
+    filtered: bool
+    year_range: bool
+    sorted: bool
+    included_results: bool
+
+    def labels(self) -> list[str]:
+        """Get the values of the shape's metric labels, in field order."""
+        return [str(value).lower() for value in self]
+
+
+# Each worker's gauges are exported (labelled by pid) when metrics are collected
+# from several processes, see `PROMETHEUS_MULTIPROC_DIR`
+_JIT_LEVEL = Gauge(
+    "jit_search_level",
+    "Size level of JIT searches",
+    JitQueryShape._fields,
+    multiprocess_mode="liveall",
+)
+_JIT_LATENCY_PERCENTILE_MS = Gauge(
+    "jit_search_latency_percentile_ms",
+    "Latency percentile of recent JIT searches, when last resized",
+    JitQueryShape._fields,
+    multiprocess_mode="liveall",
+)
+_JIT_MAX_DOC_COUNT = Gauge(
+    "jit_search_max_doc_count",
+    "Documents ranked by the last JIT search",
+    JitQueryShape._fields,
+    multiprocess_mode="liveall",
+)
+_JIT_N_PASSAGES_TO_SAMPLE_PER_SHARD = Gauge(
+    "jit_search_n_passages_to_sample_per_shard",
+    "Passages sampled per shard by the last JIT search",
+    JitQueryShape._fields,
+    multiprocess_mode="liveall",
+)
+
+
+def jit_query_shape(search_request_body: SearchRequestBody) -> JitQueryShape:
+    """Get the shape of a request's JIT search."""
+
+    if not search_request_body.query_string:
+        query = "none"
+    elif search_request_body.exact_match:
+        query = "exact"
+    else:
+        query = "semantic"
+    return JitQueryShape(
+        query=query,
+        filtered=bool(search_request_body.keyword_filters),
+        year_range=search_request_body.year_range is not None,
+        sorted=search_request_body.sort_field is not None,
+        included_results=bool(search_request_body.include_results),
+    )
+
+
+@dataclass
+class _ShapeState:
+    level: int = 0
+    latencies_ms: deque = field(default_factory=lambda: deque(maxlen=_LATENCY_WINDOW))
+
+
+class AdaptiveJitSizer:
+    """Sizes JIT searches to keep their latency percentile near a target."""
+
+    def __init__(self, target_latency_ms: float):
+        self._target_latency_ms = target_latency_ms
+        # Ordered from least to most recently searched
+        self._states: OrderedDict[JitQueryShape, _ShapeState] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def level(self, search_request_body: SearchRequestBody) -> int:
+        """Get the current size level of JIT searches for a request's shape."""
+
+        with self._lock:
+            state = self._states.get(jit_query_shape(search_request_body))
+            return 0 if state is None else state.level
+
+    def sizes(
+        self,
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: Any,
+    ) -> dict[str, int]:
+        """Get the JIT search config overrides for a request.
+
+        At level 0 the configured JIT search is used. Lower levels sample fewer
+        passages & rank fewer documents (but always enough for the requested page),
+        and higher levels rank more documents, up to the full search's.
+
+        :param SearchRequestBody search_request_body: the search request
+        :param OpenSearchQueryConfig opensearch_internal_config: the full search config
+        :return dict[str, int]: `max_doc_count` & `n_passages_to_sample_per_shard`
+        """
+
+        level = self.level(search_request_body)
+        scale = _LEVEL_GROWTH**level
+        page_end = search_request_body.offset + search_request_body.limit
+        max_doc_count = round(opensearch_internal_config.jit_max_doc_count * scale)
+        sizes = {
+            "max_doc_count": max(
+                page_end, min(opensearch_internal_config.max_doc_count, max_doc_count)
+            ),
+            "n_passages_to_sample_per_shard": round(
+                opensearch_internal_config.n_passages_to_sample_per_shard
+                * min(scale, 1.0)
+            ),
+        }
+        labels = jit_query_shape(search_request_body).labels()
+        _JIT_LEVEL.labels(*labels).set(level)
+        _JIT_MAX_DOC_COUNT.labels(*labels).set(sizes["max_doc_count"])
+        _JIT_N_PASSAGES_TO_SAMPLE_PER_SHARD.labels(*labels).set(
+            sizes["n_passages_to_sample_per_shard"]
+        )
+        return sizes
+
+    def observe(self, search_request_body: SearchRequestBody, latency_ms: int) -> None:
+        """Record the latency of a JIT search, resizing searches of its shape."""
+
+        shape = jit_query_shape(search_request_body)
+        with self._lock:
+            state = self._states.get(shape)
+            if state is None:
+                state = self._states[shape] = _ShapeState()
+                if len(self._states) > _MAX_SHAPES:
+                    self._states.popitem(last=False)
+            self._states.move_to_end(shape)
+            state.latencies_ms.append(latency_ms)
+            if len(state.latencies_ms) < _MIN_LATENCIES:
+                return
+
+            latencies_ms = sorted(state.latencies_ms)
+            percentile_ms = latencies_ms[
+                int(_LATENCY_PERCENTILE * (len(latencies_ms) - 1))
+            ]
+            if percentile_ms > self._target_latency_ms and state.level > _MIN_LEVEL:
+                state.level -= 1
+            elif (
+                percentile_ms < self._target_latency_ms * _IDLE_FRACTION
+                and state.level < _MAX_LEVEL
+            ):
+                state.level += 1
+            else:
+                return
+            # Latencies at the previous size no longer apply
+            state.latencies_ms.clear()
+            level = state.level
+
+        _JIT_LEVEL.labels(*shape.labels()).set(level)
+        _JIT_LATENCY_PERCENTILE_MS.labels(*shape.labels()).set(percentile_ms)
+        _LOGGER.info(
+            "Resized JIT searches",
+            extra={
+                "props": {
+                    "query_shape": shape._asdict(),
+                    "jit_level": level,
+                    "latency_percentile_ms": percentile_ms,
+                    "target_latency_ms": self._target_latency_ms,
+                }
+            },
+        )
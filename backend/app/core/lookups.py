@@ -1,4 +1,8 @@
-from typing import Optional, Sequence, cast
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import NamedTuple, Optional, Sequence, cast
 
 from sqlalchemy.orm import Session
 
@@ -16,6 +20,9 @@ from app.db.models import (
     Sector,
     Source,
 )
+from app.db.session import DbOpener
+
+_LOGGER = logging.getLogger(__name__)
 
 
 def get_metadata(db: Session):
@@ -64,3 +71,132 @@ def get_country_by_slug(db: Session, country_slug: str) -> Optional[Geography]:
         return None
 
     return geography
+
+
+class _GeographyNode(NamedTuple):
+    id: int
+    slug: str
+    value: Optional[str]
+    parent_id: Optional[int]
+
+
+class GeographyHierarchy:
+    """A snapshot of the geography table, resolving slugs without querying it."""
+
+    def __init__(self, nodes: Sequence[_GeographyNode]):
+        self.version = hash(tuple(sorted(nodes)))
+        self._nodes_by_slug = {node.slug: node for node in nodes}
+        child_values = defaultdict(list)
+        for node in nodes:
+            if node.parent_id is not None:
+                child_values[node.parent_id].append(node.value)
+        self._child_values = dict(child_values)
+
+    def __len__(self) -> int:
+        """Get the number of geographies in the hierarchy."""
+        return len(self._nodes_by_slug)
+
+    def __contains__(self, slug: str) -> bool:
+        """Check whether a geography slug is in the hierarchy."""
+        return slug in self._nodes_by_slug
+
+    def country_values_for_region(self, region_slug: str) -> Sequence[str]:
+        """Get the values of the countries in a region."""
+
+        node = self._nodes_by_slug.get(region_slug)
+        if node is None or node.parent_id is not None:  # unknown or not a region
+            return []
+        return self._child_values.get(node.id, [])
+
+    def country_value(self, country_slug: str) -> Optional[str]:
+        """Get the value of a country."""
+
+        node = self._nodes_by_slug.get(country_slug)
+        if node is None or node.parent_id is None:  # unknown or not a country
+            return None
+        return node.value
+
+
+class GeographyIndex:
+    """The geography hierarchy of a process, reloaded from the database as it ages.
+
+    The hierarchy is loaded when first requested, then reloaded in the background
+    (while the loaded one is still served) once it is older than
+    `refresh_interval_s` seconds. It is only rebuilt when its version (derived from
+    the rows of the geography table) changes. Slugs it does not know are unknown
+    until the next reload, so that requests for unknown geographies do not each
+    reload it.
+    """
+
+    def __init__(self, refresh_interval_s: float):
+        self._refresh_interval_s = refresh_interval_s
+        self._hierarchy: Optional[GeographyHierarchy] = None
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._first_load_lock = threading.Lock()
+        self._reloading = False
+
+    def _is_current(self) -> bool:
+        return (
+            self._hierarchy is not None
+            and self._loaded_at is not None
+            and time.monotonic() - self._loaded_at < self._refresh_interval_s
+        )
+
+    def _start_reload(self) -> bool:
+        # Only one reload at a time
+        with self._lock:
+            if self._reloading:
+                return False
+            self._reloading = True
+            return True
+
+    def _reload(self, open_db: DbOpener) -> None:
+        try:
+            with open_db() as db:
+                rows = db.query(
+                    Geography.id, Geography.slug, Geography.value, Geography.parent_id
+                ).all()
+            hierarchy = GeographyHierarchy([_GeographyNode(*row) for row in rows])
+            with self._lock:
+                self._loaded_at = time.monotonic()
+                if (
+                    self._hierarchy is None
+                    or hierarchy.version != self._hierarchy.version
+                ):
+                    self._hierarchy = hierarchy
+                    _LOGGER.info(
+                        "Loaded geography hierarchy",
+                        extra={"props": {"geographies": len(hierarchy)}},
+                    )
+        finally:
+            with self._lock:
+                self._reloading = False
+
+    def _reload_in_background(self, open_db: DbOpener) -> None:
+        try:
+            self._reload(open_db)
+        except Exception:
+            _LOGGER.exception("Could not reload the geography hierarchy")
+
+    def get(self, open_db: DbOpener) -> GeographyHierarchy:
+        """Get the geography hierarchy, starting to reload it if it is stale.
+
+        :param DbOpener open_db: opens the database to (re)load the hierarchy from
+        :return GeographyHierarchy: the current geography hierarchy
+        """
+
+        if self._hierarchy is None:
+            # There is no hierarchy to serve until it is first loaded
+            with self._first_load_lock:
+                if self._hierarchy is None:
+                    self._reload(open_db)
+        elif not self._is_current() and self._start_reload():
+            threading.Thread(
+                target=self._reload_in_background,
+                args=(open_db,),
+                name="geography-reload",
+                daemon=True,
+            ).start()
+
+        return cast(GeographyHierarchy, self._hierarchy)
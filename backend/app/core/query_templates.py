@@ -0,0 +1,110 @@
+"""Request body templates for OpenSearch queries.
+
+A template is a request body in which the values that vary between requests are
+`{{name}}` placeholders. It is compiled once into JSON text, so that a request only
+has to serialise its parameters into it. Placeholders are valid mustache, so the
+same template can be stored in OpenSearch as a search template.
+"""
+import hashlib
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Mapping, Union
+
+# Either a whole JSON string value which is a placeholder, or a placeholder
+# within a JSON string value
+_PLACEHOLDER_PATTERN = re.compile(r'"\{\{(\w+)\}\}"|\{\{(\w+)\}\}')
+
+
+def template_param(name: str) -> str:
+    """Get the placeholder for a template parameter."""
+    return f"{{{{{name}}}}}"
+
+
+@dataclass(frozen=True)
+class _Placeholder:
+    name: str
+    # Whether the placeholder is a whole value, rather than part of a string value
+    is_value: bool
+
+
+@dataclass(frozen=True)
+class QueryTemplate:
+    """A compiled request body template."""
+
+    id: str
+    body: Mapping[str, Any]
+    source: str
+    _parts: tuple[Union[str, _Placeholder], ...]
+    # Params used as whole values
+    _value_params: frozenset[str]
+
+    @classmethod
+    def compile(cls, body: Mapping[str, Any], id_prefix: str = "") -> "QueryTemplate":
+        """Compile a request body containing placeholders into a template."""
+
+        source = json.dumps(body, separators=(",", ":"))
+        parts: list[Union[str, _Placeholder]] = []
+        position = 0
+        for match in _PLACEHOLDER_PATTERN.finditer(source):
+            parts.append(source[position : match.start()])
+            if match.group(1) is not None:
+                parts.append(_Placeholder(match.group(1), is_value=True))
+            else:
+                parts.append(_Placeholder(match.group(2), is_value=False))
+            position = match.end()
+        parts.append(source[position:])
+
+        template_id = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+        return cls(
+            id=f"{id_prefix}{template_id}",
+            body=body,
+            source=source,
+            _parts=tuple(parts),
+            _value_params=frozenset(
+                part.name
+                for part in parts
+                if isinstance(part, _Placeholder) and part.is_value
+            ),
+        )
+
+    @property
+    def mustache_source(self) -> str:
+        """The template as mustache, for storing as an OpenSearch search template."""
+
+        return "".join(
+            part
+            if isinstance(part, str)
+            else f"{{{{#toJson}}}}{part.name}{{{{/toJson}}}}"
+            if part.is_value
+            else template_param(part.name)
+            for part in self._parts
+        )
+
+    def render(
+        self,
+        params: Mapping[str, Any],
+        dumps: Callable[[Any], str] = json.dumps,
+    ) -> str:
+        """Render the template as a JSON request body.
+
+        Each param is serialised once with `dumps`, however often it is used.
+        """
+
+        values = {name: dumps(params[name]) for name in self._value_params}
+        return "".join(
+            part
+            if isinstance(part, str)
+            else values[part.name]
+            if part.is_value
+            else json.dumps(str(params[part.name]))[1:-1]
+            for part in self._parts
+        )
+
+
+@dataclass(frozen=True)
+class TemplateQuery:
+    """A request to make using a template."""
+
+    template: QueryTemplate
+    params: Mapping[str, Any]
@@ -1,19 +1,41 @@
+import asyncio
 import csv
+import dataclasses
 import json
 import logging
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import wait
 from dataclasses import dataclass
+from datetime import datetime, timezone
 from enum import Enum
 from pathlib import Path
-from typing import Any, Mapping, Optional, Sequence
+from functools import lru_cache
+from typing import (
+    Any,
+    Mapping,
+    Optional,
+    Sequence,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+)
 import string
 
-from opensearchpy import OpenSearch
+from opensearchpy import AsyncOpenSearch, OpenSearch
 from opensearchpy import JSONSerializer as jss
-from sentence_transformers import SentenceTransformer
+from opensearchpy.exceptions import SerializationError
+from opensearchpy.helpers import async_scan, scan
+import orjson
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
 from app.api.api_v1.schemas.search import (
+    Coord,
     FilterField,
     OpenSearchResponseDescriptionMatch,
     OpenSearchResponseNameMatch,
@@ -32,6 +54,10 @@ from app.core.config import (
     OPENSEARCH_INDEX_MAX_DOC_COUNT,
     OPENSEARCH_INDEX_MAX_PASSAGES_PER_DOC,
     OPENSEARCH_INDEX_KNN_K_VALUE,
+    OPENSEARCH_ADAPTIVE_KNN,
+    OPENSEARCH_KNN_MIN_K,
+    OPENSEARCH_KNN_K_PER_DOC,
+    OPENSEARCH_KNN_FILTER,
     OPENSEARCH_INDEX_N_PASSAGES_TO_SAMPLE_PER_SHARD,
     OPENSEARCH_INDEX_NAME_BOOST,
     OPENSEARCH_INDEX_DESCRIPTION_BOOST,
@@ -41,7 +67,6 @@ from app.core.config import (
     OPENSEARCH_INDEX_DESCRIPTION_EMBEDDING_KEY,
     OPENSEARCH_INDEX_INDEX_KEY,
     OPENSEARCH_INDEX_TEXT_BLOCK_KEY,
-    OPENSEARCH_INDEX_ENCODER,
     OPENSEARCH_URL,
     OPENSEARCH_INDEX_PREFIX,
     OPENSEARCH_USERNAME,
@@ -50,17 +75,59 @@ from app.core.config import (
     OPENSEARCH_USE_SSL,
     OPENSEARCH_VERIFY_CERTS,
     OPENSEARCH_SSL_WARNINGS,
+    OPENSEARCH_FAST_RESPONSE_PARSING,
+    OPENSEARCH_CONNECTION_POOL_MAXSIZE,
+    OPENSEARCH_HTTP_KEEP_ALIVE,
+    OPENSEARCH_HTTP_COMPRESS,
+    OPENSEARCH_SNIFF_ON_START,
+    OPENSEARCH_SNIFF_ON_CONNECTION_FAIL,
+    OPENSEARCH_SNIFFER_TIMEOUT_S,
+    OPENSEARCH_FAN_OUT_SEARCH,
+    OPENSEARCH_QUERY_TEMPLATES,
+    OPENSEARCH_STORED_SEARCH_TEMPLATES,
+    OPENSEARCH_FAN_OUT_INDEX_TIMEOUT_S,
     OPENSEARCH_JIT_MAX_DOC_COUNT,
+    OPENSEARCH_INDEX_GENERATION_CHECK_S,
+    OPENSEARCH_LOCAL_BROWSE,
+    OPENSEARCH_COALESCE_SEARCHES,
+    OPENSEARCH_TERMINATE_AFTER,
+    OPENSEARCH_TWO_PHASE_SEARCH,
+    OPENSEARCH_FACET_SIZE,
+    SENSITIVE_QUERY_TERMS_PATH,
+    SENSITIVE_QUERY_TERMS_RELOAD_INTERVAL_S,
+)
+from app.core.browse_index import BrowseIndex
+from app.core.description_index import DescriptionEmbeddingIndex
+from app.core.encoder import get_encoder
+from app.core.query_templates import QueryTemplate, TemplateQuery, template_param
+from app.core.search_cache import (
+    AsyncSingleFlight,
+    PrecomputedResults,
+    SearchCursor,
+    SearchCursorStores,
+    SingleFlight,
+    TTLCache,
+    canonical_result_set_request,
+    canonical_search_request,
+)
+from app.core.search_fan_out import fan_out_request_body, merge_search_response_bodies
+from app.core.search_flow import (
+    CoalesceStep,
+    ComputeStep,
+    Flights,
+    Operation,
+    ScanBrowseIndexStep,
+    SearchStep,
+    T,
+    coalesced,
+    run,
+    run_async,
 )
 from app.core.util import to_cdn_url
 
 
 _LOGGER = logging.getLogger(__name__)
 
-_ENCODER = SentenceTransformer(
-    model_name_or_path=OPENSEARCH_INDEX_ENCODER,
-    cache_folder=os.environ.get("INDEX_ENCODER_CACHE_FOLDER", "/models"),
-)
 # Map a sort field type to the document key used by OpenSearch
 _SORT_FIELD_MAP: Mapping[SortField, str] = {
     SortField.DATE: "document_date",
@@ -76,10 +143,50 @@ _FILTER_FIELD_MAP: Mapping[FilterField, str] = {
     FilterField.KEYWORD: "document_keyword",
     FilterField.LANGUAGE: "document_language",
 }
+# Fields which can be requested as facets
+FACET_FIELDS: Sequence[FilterField] = tuple(_FILTER_FIELD_MAP)
+_FACET_AGGREGATION_PREFIX = "facet_"
 _REQUIRED_FIELDS = ["document_name"]
 _DEFAULT_BROWSE_SORT_FIELD = SortField.DATE
 _DEFAULT_SORT_ORDER = SortOrder.DESCENDING
-_JSON_SERIALIZER = jss()
+# OpenSearch only checks its search timeout between segments, so the client waits
+# this much longer for the partial results
+_CLIENT_TIMEOUT_GRACE_S = 1.0
+
+
+class OpenSearchJSONSerializer(jss):
+    """JSON serializer for OpenSearch requests & responses, using orjson.
+
+    orjson is considerably faster than the standard library, which matters for our
+    large aggregation responses and for requests containing query embeddings.
+    """
+
+    def loads(self, s):
+        """Override"""
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError as e:
+            raise SerializationError(s, e)
+
+    def dumps(self, data):
+        """Override"""
+        if isinstance(data, str):
+            return super().dumps(data)
+        try:
+            return orjson.dumps(
+                data, default=self.default, option=orjson.OPT_SERIALIZE_NUMPY
+            ).decode("utf-8")
+        except TypeError as e:
+            raise SerializationError(data, e)
+
+
+_JSON_SERIALIZER = OpenSearchJSONSerializer()
+_PUNCTUATION_TRANSLATION = str.maketrans("", "", string.punctuation)
+_SENSITIVE_QUERY_TERMS_PATH = Path(
+    SENSITIVE_QUERY_TERMS_PATH or Path(__file__).parent / "sensitive_query_terms.tsv"
+)
+# Key marking the end of a term in a SensitiveQueryTermMatcher trie
+_TERM_END = ""
 
 
 class QueryMode(Enum):
@@ -104,13 +211,25 @@ def _innerproduct_threshold_to_lucene_threshold(ip_thresh: float) -> float:
         return 1 / (1 - ip_thresh)
 
 
-def load_sensitive_query_terms() -> set[str]:
+def _lucene_threshold_to_innerproduct_threshold(lucene_thresh: float) -> float:
+    """Map a lucene threshold to inner product.
+
+    This is the inverse of `_innerproduct_threshold_to_lucene_threshold`.
+    """
+    if lucene_thresh > 1:
+        return lucene_thresh - 1
+    else:
+        return 1 - 1 / lucene_thresh
+
+
+def load_sensitive_query_terms(
+    tsv_path: Union[str, Path] = _SENSITIVE_QUERY_TERMS_PATH
+) -> set[str]:
     """
     Return sensitive query terms from the first column of a TSV file. Outputs are lowercased for case-insensitive matching.
 
     :return _type_: _description_
     """
-    tsv_path = Path(__file__).parent / "sensitive_query_terms.tsv"
     with open(tsv_path, "r") as tsv_file:
         reader = csv.reader(tsv_file, delimiter="\t")
 
@@ -120,6 +239,89 @@ def load_sensitive_query_terms() -> set[str]:
     return sensitive_terms
 
 
+def _tokenize_for_matching(text: str) -> list[str]:
+    return text.translate(_PUNCTUATION_TRANSLATION).lower().split()
+
+
+class SensitiveQueryTermMatcher:
+    """Finds sensitive terms within query strings.
+
+    Terms are compiled into a trie of tokens so that matching is linear in the
+    length of the query and only matches whole words. Terms and queries are both
+    normalised by removing punctuation and lowercasing. The TSV file is checked for
+    changes at most every `reload_interval_s` seconds and recompiled when modified.
+    """
+
+    def __init__(
+        self,
+        tsv_path: Union[str, Path] = _SENSITIVE_QUERY_TERMS_PATH,
+        reload_interval_s: float = SENSITIVE_QUERY_TERMS_RELOAD_INTERVAL_S,
+    ):
+        self._tsv_path = tsv_path
+        self._reload_interval_s = reload_interval_s
+        self._reload_lock = threading.Lock()
+        self._next_reload_check = time.monotonic() + reload_interval_s
+        self._mtime = os.stat(tsv_path).st_mtime
+        self._trie = self.compile(load_sensitive_query_terms(tsv_path))
+
+    @staticmethod
+    def compile(terms: set[str]) -> dict[str, Any]:
+        """Compile a set of terms into a trie keyed by token."""
+
+        trie: dict[str, Any] = {}
+        for term in terms:
+            tokens = _tokenize_for_matching(term)
+            if not tokens:
+                continue
+            node = trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node[_TERM_END] = " ".join(tokens)
+        return trie
+
+    def maybe_reload(self) -> None:
+        """Recompile the terms if the TSV file has changed since it was loaded."""
+
+        if (
+            self._reload_interval_s <= 0
+            or time.monotonic() < self._next_reload_check
+            or not self._reload_lock.acquire(blocking=False)
+        ):
+            return
+
+        try:
+            self._next_reload_check = time.monotonic() + self._reload_interval_s
+            mtime = os.stat(self._tsv_path).st_mtime
+            if mtime != self._mtime:
+                self._trie = self.compile(load_sensitive_query_terms(self._tsv_path))
+                self._mtime = mtime
+                _LOGGER.info(
+                    "Reloaded sensitive query terms",
+                    extra={"props": {"path": str(self._tsv_path)}},
+                )
+        except (OSError, IndexError):
+            _LOGGER.exception("Failed to reload sensitive query terms")
+        finally:
+            self._reload_lock.release()
+
+    def find(self, query_string: str) -> list[str]:
+        """Return the sensitive terms contained in the query string."""
+
+        self.maybe_reload()
+        trie = self._trie
+        tokens = _tokenize_for_matching(query_string)
+        matches = []
+        for start in range(len(tokens)):
+            node = trie
+            for token in tokens[start:]:
+                node = node.get(token)
+                if node is None:
+                    break
+                if _TERM_END in node:
+                    matches.append(node[_TERM_END])
+        return matches
+
+
 @dataclass(frozen=True)
 class OpenSearchQueryConfig:
     """Configuration for searches sent to OpenSearch."""
@@ -135,13 +337,25 @@ class OpenSearchQueryConfig:
     n_passages_to_sample_per_shard: int = (
         OPENSEARCH_INDEX_N_PASSAGES_TO_SAMPLE_PER_SHARD
     )
-    k = OPENSEARCH_INDEX_KNN_K_VALUE
+    k: int = OPENSEARCH_INDEX_KNN_K_VALUE
+    adaptive_knn: bool = OPENSEARCH_ADAPTIVE_KNN
+    knn_min_k: int = OPENSEARCH_KNN_MIN_K
+    knn_k_per_doc: int = OPENSEARCH_KNN_K_PER_DOC
+    knn_filter: bool = OPENSEARCH_KNN_FILTER
     jit_max_doc_count: int = OPENSEARCH_JIT_MAX_DOC_COUNT
+    two_phase: bool = OPENSEARCH_TWO_PHASE_SEARCH
+    facet_size: int = OPENSEARCH_FACET_SIZE
+    # Limits on each search request, after which OpenSearch returns partial results
+    timeout_ms: Optional[int] = None
+    terminate_after: int = OPENSEARCH_TERMINATE_AFTER
 
 
 @dataclass
 class OpenSearchConfig:
-    """Config for accessing an OpenSearch instance."""
+    """Config for accessing an OpenSearch instance.
+
+    `url` may be a comma-separated list of node URLs.
+    """
 
     url: str = OPENSEARCH_URL
     username: str = OPENSEARCH_USERNAME
@@ -151,6 +365,25 @@ class OpenSearchConfig:
     use_ssl: bool = OPENSEARCH_USE_SSL
     verify_certs: bool = OPENSEARCH_VERIFY_CERTS
     ssl_show_warnings: bool = OPENSEARCH_SSL_WARNINGS
+    fast_response_parsing: bool = OPENSEARCH_FAST_RESPONSE_PARSING
+    connection_pool_maxsize: int = OPENSEARCH_CONNECTION_POOL_MAXSIZE
+    http_keep_alive: bool = OPENSEARCH_HTTP_KEEP_ALIVE
+    http_compress: bool = OPENSEARCH_HTTP_COMPRESS
+    sniff_on_start: bool = OPENSEARCH_SNIFF_ON_START
+    sniff_on_connection_fail: bool = OPENSEARCH_SNIFF_ON_CONNECTION_FAIL
+    sniffer_timeout_s: float = OPENSEARCH_SNIFFER_TIMEOUT_S
+    fan_out_search: bool = OPENSEARCH_FAN_OUT_SEARCH
+    query_templates: bool = OPENSEARCH_QUERY_TEMPLATES
+    stored_search_templates: bool = OPENSEARCH_STORED_SEARCH_TEMPLATES
+    fan_out_index_timeout_s: float = OPENSEARCH_FAN_OUT_INDEX_TIMEOUT_S
+    index_generation_check_s: float = OPENSEARCH_INDEX_GENERATION_CHECK_S
+    local_browse: bool = OPENSEARCH_LOCAL_BROWSE
+    coalesce_searches: bool = OPENSEARCH_COALESCE_SEARCHES
+
+    @property
+    def node_urls(self) -> list[str]:
+        """The URLs of the configured OpenSearch nodes."""
+        return [url.strip() for url in self.url.split(",") if url.strip()]
 
 
 @dataclass
@@ -159,6 +392,27 @@ class OpenSearchResponse:
 
     raw_response: Mapping[str, Any]
     request_time_ms: int
+    # Whether some of the queried indices did not respond, or did not finish searching
+    partial: bool = False
+
+
+# A search request body, or a request to make from a template
+SearchRequest = Union[Mapping[str, Any], TemplateQuery]
+
+
+def dumps_template_param(value: Any) -> str:
+    """Serialise a template parameter value as JSON."""
+
+    # The serializer passes strings through unchanged, taking them to be JSON already
+    if isinstance(value, str):
+        return json.dumps(value)
+    return _JSON_SERIALIZER.dumps(value)
+
+
+def stored_search_template_body(template: QueryTemplate) -> Mapping[str, Any]:
+    """Get the body to store a template as an OpenSearch search template."""
+
+    return {"script": {"lang": "mustache", "source": template.mustache_source}}
 
 
 class OpenSearchEncoder(json.JSONEncoder):
@@ -169,57 +423,404 @@ class OpenSearchEncoder(json.JSONEncoder):
         return _JSON_SERIALIZER.default(obj)
 
 
-class OpenSearchConnection:
-    """OpenSearch connection helper, allows query based on config."""
+class _OpenSearchConnectionBase:
+    """State, helpers & query flow shared by the sync and async OpenSearch connections.
+
+    The query flow is written once, as generators yielding the requests they need
+    made, which each connection runs by making the requests with its own client.
+    """
+
+    # Set by the connections when `coalesce_searches` is configured
+    _search_flights: Optional[Flights]
+    _result_set_flights: Optional[Flights]
 
     def __init__(
         self,
         opensearch_config: OpenSearchConfig,
+        result_cache: Optional[TTLCache[SearchResults]] = None,
+        cursor_store: Optional[TTLCache[SearchCursor]] = None,
+        description_index: Optional[DescriptionEmbeddingIndex] = None,
+        precomputed_results: Optional[PrecomputedResults] = None,
+        result_set_store: Optional[TTLCache[SearchCursor]] = None,
     ):
         self._opensearch_config = opensearch_config
-        self._opensearch_connection: Optional[OpenSearch] = None
-        self._sensitive_query_terms = load_sensitive_query_terms()
+        self._sensitive_query_terms = SensitiveQueryTermMatcher()
+        self._result_cache = result_cache
+        # Cursors & result sets of searches, which serve their further pages
+        self._cursors = SearchCursorStores(cursor_store, result_set_store)
+        self._index_generation = ""
+        self._index_generation_checked_at: Optional[float] = None
+        self._stored_template_ids: set[str] = set()
+        # Templates for the request sent to each index of a fan-out search
+        self._fan_out_templates: dict[tuple[str, int], QueryTemplate] = {}
+        # When set, description similarity is computed in-process, not by OpenSearch
+        self._description_index = description_index
+        # Snapshot of the core index for browsing, when configured
+        self._browse_index: Optional[BrowseIndex] = None
+        self._browse_index_lock = threading.Lock()
+        self._browse_index_refresh_generation: Optional[str] = None
+        # First pages of frequent searches, computed offline
+        self._precomputed_results = precomputed_results
+
+    def _get_indices(
+        self, search_request_body: SearchRequestBody, mode: QueryMode
+    ) -> str:
+        # We only need to use the {PREFIX}_core index if browsing, as there's no need to access the text passages.
+        if mode == QueryMode.SEARCH:
+            return self._get_opensearch_indices_to_query(search_request_body)
+        return f"{self._opensearch_config.index_prefix}_core"
+
+    def _uses_index_generation(self) -> bool:
+        return (
+            self._result_cache is not None
+            or self._cursors.cursor_store is not None
+            or self._precomputed_results is not None
+            or self._cursors.result_set_store is not None
+            or self._opensearch_config.local_browse
+            or self._description_index is not None
+        )
 
-    def query(
+    @staticmethod
+    def _search_flight_key(
+        cache_key: str,
+        index_generation: str,
+        opensearch_internal_config: OpenSearchQueryConfig,
+    ) -> str:
+        # Searches are only coalesced with those given as long to complete
+        return f"{index_generation}:{opensearch_internal_config.timeout_ms}:{cache_key}"
+
+    def search_request_key(
         self,
         search_request_body: SearchRequestBody,
         opensearch_internal_config: OpenSearchQueryConfig,
-        preference: Optional[str],
-    ) -> SearchResults:
-        """Build & make an OpenSearch query based on the given request body."""
+    ) -> str:
+        """Get the key the results of a search are cached & precomputed under."""
+
+        mode = query_mode(search_request_body)
+        return canonical_search_request(
+            search_request_body,
+            self._get_indices(search_request_body, mode),
+            opensearch_internal_config,
+        )
+
+    def has_precomputed_results(
+        self,
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: OpenSearchQueryConfig,
+    ) -> bool:
+        """Check whether the results of a search are precomputed.
+
+        This is as of the last known index generation, without checking for a newer one.
+        """
+
+        return (
+            self._precomputed_results is not None
+            and self._precomputed_results.get(
+                self.search_request_key(
+                    search_request_body, opensearch_internal_config
+                ),
+                self._index_generation,
+            )
+            is not None
+        )
+
+    def _browse_index_scan_args(self) -> dict[str, Any]:
+        # Browse requests only match the description entries of documents
+        return {
+            "index": f"{self._opensearch_config.index_prefix}_core",
+            "query": {"query": {"exists": {"field": OPENSEARCH_INDEX_DESCRIPTION_KEY}}},
+            "_source_excludes": [OPENSEARCH_INDEX_DESCRIPTION_EMBEDDING_KEY],
+        }
+
+    @staticmethod
+    def _create_browse_index(
+        hits: Sequence[Mapping[str, Any]], index_generation: str
+    ) -> BrowseIndex:
+        return BrowseIndex(
+            [hit["_source"] for hit in hits],
+            keyword_fields=_FILTER_FIELD_MAP.values(),
+            date_field=_SORT_FIELD_MAP[SortField.DATE],
+            title_field=_SORT_FIELD_MAP[SortField.TITLE],
+            generation=index_generation,
+        )
+
+    def _start_browse_index_refresh(self, index_generation: str) -> bool:
+        """Claim the refresh of the browse index for a new index generation.
+
+        Only one refresh is attempted for each generation, so that requests which
+        arrive during a refresh (or after it failed) browse using OpenSearch.
+        """
 
+        with self._browse_index_lock:
+            if self._browse_index_refresh_generation == index_generation:
+                return False
+            self._browse_index_refresh_generation = index_generation
+            return True
+
+    def _local_browse(
+        self,
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: OpenSearchQueryConfig,
+        index_generation: str,
+    ) -> Optional[SearchResults]:
+        """Browse using the snapshot of the core index.
+
+        :return: the results, or None if the snapshot is not current or cannot
+            answer the request
+        """
+
+        browse_index = self._browse_index
+        if browse_index is None or browse_index.generation != index_generation:
+            return None
+
+        start = time.time_ns()
         opensearch_request = build_opensearch_request_body(
             search_request=search_request_body,
             opensearch_internal_config=opensearch_internal_config,
+        )
+        response = browse_index.search(opensearch_request.query)
+        if response is None:
+            return None
+        return self._process_browse_response(
+            OpenSearchResponse(
+                raw_response=response,
+                request_time_ms=round((time.time_ns() - start) / 1e6),
+            )
+        )
+
+    def _build_request(
+        self,
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: OpenSearchQueryConfig,
+    ) -> "QueryBuilder":
+        return build_opensearch_request_body(
+            search_request=search_request_body,
+            opensearch_internal_config=opensearch_internal_config,
             sensitive_query_terms=self._sensitive_query_terms,
+            use_templates=self._opensearch_config.query_templates,
+            description_knn=self._local_description_index(search_request_body) is None,
         )
 
-        # We only need to use the {PREFIX}_core index if browsing, as there's no need to access the text passages.
-        indices = (
-            self._get_opensearch_indices_to_query(search_request_body)
-            if opensearch_request.mode == QueryMode.SEARCH
-            else f"{self._opensearch_config.index_prefix}_core"
+    def _local_description_index(
+        self, search_request_body: SearchRequestBody
+    ) -> Optional[DescriptionEmbeddingIndex]:
+        """Get the in-process description index to search for a request, if any.
+
+        The index is only searched while its snapshot is of the current `_core`
+        index, and not for requests with facets, as it has no facet counts.
+        Descriptions are searched by the kNN clause in OpenSearch otherwise.
+        """
+
+        description_index = self._description_index
+        if (
+            description_index is None
+            or search_request_body.facets
+            or not description_index.generation
+            or description_index.generation not in self._index_generation.split(",")
+        ):
+            return None
+        return description_index
+
+    def _with_description_matches(
+        self,
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: OpenSearchQueryConfig,
+        opensearch_request: "QueryBuilder",
+        opensearch_response_body: OpenSearchResponse,
+        document_keys: Optional[Sequence[str]] = None,
+    ) -> OpenSearchResponse:
+        """Fuse matches from the in-process description index into a search response.
+
+        Description matches are merged with the response as if they came from
+        another index, so a document's score is the best of its passage, title &
+        description matches.
+        """
+
+        embedding = opensearch_request.query_embedding
+        if (
+            self._description_index is None
+            or opensearch_request.description_knn
+            or embedding is None
+        ):
+            return opensearch_response_body
+
+        start = time.time_ns()
+        request_body = opensearch_request.query
+        if isinstance(request_body, TemplateQuery):
+            request_body = request_body.template.body
+        description_response = description_match_response(
+            self._description_index,
+            request_body,
+            embedding,
+            opensearch_internal_config,
+            keyword_filters=search_request_body.keyword_filters,
+            year_range=search_request_body.year_range,
+            document_keys=document_keys,
         )
+        return merge_search_responses(
+            request_body,
+            [opensearch_response_body, description_response],
+            request_time_ms=opensearch_response_body.request_time_ms
+            + round((time.time_ns() - start) / 1e6),
+            partial=opensearch_response_body.partial,
+        )
+
+    @staticmethod
+    def _knn_configs(
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: OpenSearchQueryConfig,
+    ) -> list[OpenSearchQueryConfig]:
+        return [
+            dataclasses.replace(opensearch_internal_config, k=k)
+            if k != opensearch_internal_config.k
+            else opensearch_internal_config
+            for k in knn_k_schedule(search_request_body, opensearch_internal_config)
+        ]
 
-        opensearch_response_body = self.raw_query(
-            opensearch_request.query, preference, indices
+    @staticmethod
+    def _ranked_doc_count(
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: OpenSearchQueryConfig,
+        knn_config: OpenSearchQueryConfig,
+        opensearch_request: "QueryBuilder",
+        opensearch_response_body: OpenSearchResponse,
+    ) -> Optional[int]:
+        """Get how many documents a search ranked.
+
+        :return: the number of documents, or None to search again with a larger kNN k
+        """
+
+        max_doc_count = opensearch_internal_config.max_doc_count
+        if (
+            not opensearch_request.uses_knn
+            or knn_config.k >= opensearch_internal_config.k
+        ):
+            return max_doc_count
+
+        # With a reduced k, only the documents up to the end of the page are ranked
+        doc_count = min(
+            search_request_body.offset + search_request_body.limit, max_doc_count
+        )
+        aggregations = opensearch_response_body.raw_response["aggregations"]
+        found_doc_count = len(aggregations["sample"]["top_docs"]["buckets"])
+        if found_doc_count >= doc_count or opensearch_response_body.partial:
+            return doc_count
+        return None
+
+    @staticmethod
+    def _page_query_config(
+        opensearch_internal_config: OpenSearchQueryConfig, doc_count: int
+    ) -> OpenSearchQueryConfig:
+        # When kNN clauses are filtered to the documents on the page, only their
+        # passages need to be found
+        config = opensearch_internal_config
+        if config.adaptive_knn and config.knn_filter:
+            k = min(config.k, max(config.knn_min_k, doc_count * config.knn_k_per_doc))
+            return dataclasses.replace(config, k=k)
+        return config
+
+    def _store_result_set(
+        self,
+        opensearch_response_body: OpenSearchResponse,
+        result_set_key: str,
+        ranked_doc_count: int,
+        index_generation: str,
+        with_passages: bool,
+    ) -> None:
+        if self._cursors.result_set_store is None or opensearch_response_body.partial:
+            return
+
+        self._cursors.add_result_set(
+            dataclasses.replace(
+                create_search_cursor(
+                    opensearch_response_body, result_set_key, ranked_doc_count
+                ),
+                response=opensearch_response_body if with_passages else None,
+            ),
+            index_generation,
         )
 
-        if opensearch_request.mode == QueryMode.SEARCH:
-            return process_search_response_body(
-                opensearch_response_body,
-                limit=search_request_body.limit,
-                offset=search_request_body.offset,
-            )
+    def _page_from_result_set(
+        self,
+        search_request_body: SearchRequestBody,
+        result_set: SearchCursor,
+        cursor_token: Optional[str],
+    ) -> SearchResults:
+        # The passages of every document were kept, so the page needs no query
+        results = self._process_search_response(
+            result_set.response,
+            limit=search_request_body.limit,
+            offset=search_request_body.offset,
+        )
+        results.query_time_ms = 0
+        results.cursor = cursor_token
+        return results
+
+    @staticmethod
+    def _result_set_flight_key(
+        result_set_key: str,
+        index_generation: str,
+        opensearch_internal_config: OpenSearchQueryConfig,
+        with_passages: bool,
+    ) -> str:
+        return ":".join(
+            [
+                index_generation,
+                str(opensearch_internal_config.max_doc_count),
+                str(opensearch_internal_config.timeout_ms),
+                str(with_passages),
+                result_set_key,
+            ]
+        )
 
-        if opensearch_request.mode == QueryMode.BROWSE:
-            return process_browse_response_body(
-                opensearch_response_body,
-            )
+    def _process_search_response(
+        self,
+        opensearch_response_body: OpenSearchResponse,
+        limit: int,
+        offset: int,
+        document_keys: Optional[Sequence[str]] = None,
+    ) -> SearchResults:
+        return process_search_response_body(
+            opensearch_response_body,
+            limit=limit,
+            offset=offset,
+            document_keys=document_keys,
+            validate=not self._opensearch_config.fast_response_parsing,
+        )
+
+    def _process_browse_response(
+        self, opensearch_response_body: OpenSearchResponse
+    ) -> SearchResults:
+        return process_browse_response_body(
+            opensearch_response_body,
+            validate=not self._opensearch_config.fast_response_parsing,
+        )
+
+    def _index_generation_is_current(self) -> bool:
+        return (
+            self._index_generation_checked_at is not None
+            and time.monotonic() - self._index_generation_checked_at
+            < self._opensearch_config.index_generation_check_s
+        )
 
-        raise RuntimeError(
-            f"Could not execute unknown query type: {opensearch_request.mode}"
+    def _cat_indices_args(self) -> Mapping[str, str]:
+        return {
+            "index": f"{self._opensearch_config.index_prefix}_*",
+            "format": "json",
+            "h": "index,uuid,docs.count",
+        }
+
+    def _update_index_generation(self, indices: Sequence[Mapping[str, str]]) -> str:
+        index_generation = ",".join(
+            sorted(f"{i['index']}:{i['uuid']}:{i['docs.count']}" for i in indices)
         )
+        if index_generation != self._index_generation:
+            _LOGGER.info(
+                "Index generation changed",
+                extra={"props": {"index_generation": index_generation}},
+            )
+            self._index_generation = index_generation
+        return self._index_generation
 
     def _get_opensearch_indices_to_query(
         self, search_request: SearchRequestBody
@@ -236,67 +837,1035 @@ class OpenSearchConnection:
             return ",".join(indices_include)
 
         if IncludedResults.PDFS_TRANSLATED in search_request.include_results:
-            indices_include.extend(
+            indices_include.append(
                 f"{self._opensearch_config.index_prefix}_pdfs_translated"
             )
 
-        if IncludedResults.HTMLS_TRANSLATED in search_request.include_results:
-            indices_include.extend(
-                f"{self._opensearch_config.index_prefix}_htmls_translated"
-            )
+        if IncludedResults.HTMLS_TRANSLATED in search_request.include_results:
+            indices_include.append(
+                f"{self._opensearch_config.index_prefix}_htmls_translated"
+            )
+
+        if IncludedResults.HTMLS_NON_TRANSLATED in search_request.include_results:
+            indices_include.append(
+                f"{self._opensearch_config.index_prefix}_htmls_non_translated"
+            )
+
+        return ",".join(indices_include)
+
+    def _fan_out_indices(self, indices: str) -> Optional[list[str]]:
+        if not self._opensearch_config.fan_out_search:
+            return None
+        index_list = indices.split(",")
+        return index_list if len(index_list) > 1 else None
+
+    def _fan_out_request(
+        self, request_body: SearchRequest, index_count: int
+    ) -> SearchRequest:
+        """Get the request to send to each index of a fan-out search.
+
+        See `fan_out_request_body`.
+        """
+
+        if not isinstance(request_body, TemplateQuery):
+            return fan_out_request_body(request_body, index_count)
+
+        key = (request_body.template.id, index_count)
+        template = self._fan_out_templates.get(key)
+        if template is None:
+            template = QueryTemplate.compile(
+                fan_out_request_body(request_body.template.body, index_count),
+                id_prefix="navigator_",
+            )
+            if len(self._fan_out_templates) >= TemplatedQueryBuilder._MAX_TEMPLATES:
+                self._fan_out_templates.clear()
+            self._fan_out_templates[key] = template
+        return TemplateQuery(template=template, params=request_body.params)
+
+    def _fan_out_query_config(
+        self, query_config: Optional[OpenSearchQueryConfig]
+    ) -> OpenSearchQueryConfig:
+        """Get the config of the search of each index of a fan-out search.
+
+        OpenSearch is asked to stop searching an index once its share of the time is
+        spent, so that a slow index does not keep searching after its results are no
+        longer waited for.
+        """
+
+        timeout_ms = round(self._opensearch_config.fan_out_index_timeout_s * 1000)
+        if query_config is None:
+            return OpenSearchQueryConfig(timeout_ms=timeout_ms, terminate_after=0)
+        if query_config.timeout_ms:
+            timeout_ms = min(timeout_ms, query_config.timeout_ms)
+        return dataclasses.replace(query_config, timeout_ms=timeout_ms)
+
+    def _merge_fan_out_responses(
+        self,
+        request_body: SearchRequest,
+        indices: Sequence[str],
+        responses: Sequence[Union[OpenSearchResponse, BaseException]],
+        start_ns: int,
+    ) -> OpenSearchResponse:
+        index_responses = []
+        errors = []
+        for index, response in zip(indices, responses):
+            if isinstance(response, BaseException):
+                _LOGGER.warning(
+                    "Search of index failed",
+                    extra={"props": {"index": index, "error": repr(response)}},
+                )
+                errors.append(response)
+            else:
+                index_responses.append(response)
+
+        if not index_responses:
+            raise errors[0]
+
+        return merge_search_responses(
+            request_body.template.body
+            if isinstance(request_body, TemplateQuery)
+            else request_body,
+            index_responses,
+            request_time_ms=round((time.time_ns() - start_ns) / 1e6),
+            partial=bool(errors) or any(r.partial for r in index_responses),
+        )
+
+    def _client_kwargs(self) -> dict[str, Any]:
+        config = self._opensearch_config
+        return {
+            "hosts": config.node_urls,
+            "http_auth": (config.username, config.password),
+            "use_ssl": config.use_ssl,
+            "verify_certs": config.verify_certs,
+            "ssl_show_warn": config.ssl_show_warnings,
+            "maxsize": config.connection_pool_maxsize,
+            "headers": {
+                "connection": "keep-alive" if config.http_keep_alive else "close"
+            },
+            "http_compress": config.http_compress,
+            "sniff_on_start": config.sniff_on_start,
+            "sniff_on_connection_fail": config.sniff_on_connection_fail,
+            "sniffer_timeout": config.sniffer_timeout_s or None,
+            "serializer": _JSON_SERIALIZER,
+        }
+
+    def _search_kwargs(
+        self,
+        request_body: SearchRequest,
+        request_timeout: Optional[float],
+        query_config: Optional[OpenSearchQueryConfig],
+    ) -> dict[str, Any]:
+        """Get the arguments limiting how long a search request may take."""
+
+        request_timeout = request_timeout or self._opensearch_config.request_timeout
+        kwargs: dict[str, Any] = {"request_timeout": request_timeout}
+        if query_config is None:
+            return kwargs
+
+        if query_config.timeout_ms:
+            kwargs["request_timeout"] = min(
+                request_timeout,
+                query_config.timeout_ms / 1000 + _CLIENT_TIMEOUT_GRACE_S,
+            )
+        # Stored search templates can only be limited by the client timeout
+        if (
+            isinstance(request_body, TemplateQuery)
+            and self._opensearch_config.stored_search_templates
+        ):
+            return kwargs
+        if query_config.timeout_ms:
+            kwargs["timeout"] = f"{query_config.timeout_ms}ms"
+        if query_config.terminate_after:
+            kwargs["terminate_after"] = query_config.terminate_after
+        return kwargs
+
+    def _body_to_send(self, request_body: SearchRequest) -> Union[Mapping, str]:
+        if not isinstance(request_body, TemplateQuery):
+            return request_body
+        if self._opensearch_config.stored_search_templates:
+            return {"id": request_body.template.id, "params": request_body.params}
+        return request_body.template.render(request_body.params, dumps_template_param)
+
+    def _search_response(
+        self,
+        request_body: Union[Mapping[str, Any], str],
+        response: Mapping[str, Any],
+        start_ns: int,
+    ) -> OpenSearchResponse:
+        search_request_time = round((time.time_ns() - start_ns) / 1e6)
+
+        _LOGGER.info(
+            "Search request completed",
+            extra={
+                "props": {
+                    "search_request": _JSON_SERIALIZER.dumps(request_body),
+                    "search_request_time": search_request_time,
+                },
+            },
+        )
+
+        partial = bool(response.get("timed_out") or response.get("terminated_early"))
+        if partial:
+            _LOGGER.warning(
+                "Search request returned partial results",
+                extra={
+                    "props": {
+                        "timed_out": response.get("timed_out", False),
+                        "terminated_early": response.get("terminated_early", False),
+                    }
+                },
+            )
+
+        return OpenSearchResponse(
+            raw_response=response,
+            request_time_ms=search_request_time,
+            partial=partial,
+        )
+
+    def _query(
+        self,
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: OpenSearchQueryConfig,
+        preference: Optional[str],
+        index_generation: str,
+    ) -> Operation[SearchResults]:
+        mode = query_mode(search_request_body)
+        indices = self._get_indices(search_request_body, mode)
+
+        cache_key: Optional[str] = None
+        if (
+            self._result_cache is not None
+            or self._search_flights is not None
+            or self._precomputed_results is not None
+        ):
+            cache_key = canonical_search_request(
+                search_request_body, indices, opensearch_internal_config
+            )
+        if self._precomputed_results is not None and cache_key is not None:
+            precomputed_results = self._precomputed_results.get(
+                cache_key, index_generation
+            )
+            if precomputed_results is not None:
+                return precomputed_results
+        if self._result_cache is not None and cache_key is not None:
+            cached_results = self._result_cache.get(cache_key, index_generation)
+            if cached_results is not None:
+                return cached_results
+
+        return (
+            yield from coalesced(
+                self._search_flights,
+                None
+                if cache_key is None
+                else self._search_flight_key(
+                    cache_key, index_generation, opensearch_internal_config
+                ),
+                lambda: self._run_query(
+                    search_request_body,
+                    opensearch_internal_config,
+                    preference,
+                    mode,
+                    indices,
+                    index_generation,
+                    cache_key,
+                ),
+            )
+        )
+
+    def _run_query(
+        self,
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: OpenSearchQueryConfig,
+        preference: Optional[str],
+        mode: QueryMode,
+        indices: str,
+        index_generation: str,
+        cache_key: Optional[str],
+    ) -> Operation[SearchResults]:
+        if mode == QueryMode.SEARCH:
+            results = yield from self._search(
+                search_request_body,
+                opensearch_internal_config,
+                preference,
+                indices,
+                index_generation,
+            )
+        elif mode == QueryMode.BROWSE:
+            results = yield from self._browse(
+                search_request_body,
+                opensearch_internal_config,
+                preference,
+                indices,
+                index_generation,
+            )
+        else:
+            raise RuntimeError(f"Could not execute unknown query type: {mode}")
+
+        # Partial results are not cached, so that the search is retried next time
+        if (
+            self._result_cache is not None
+            and cache_key is not None
+            and not results.partial
+        ):
+            self._result_cache.set(cache_key, results, index_generation)
+
+        return results
+
+    def _browse(
+        self,
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: OpenSearchQueryConfig,
+        preference: Optional[str],
+        indices: str,
+        index_generation: str,
+    ) -> Operation[SearchResults]:
+        """Browse documents, using the snapshot of the core index if configured."""
+
+        if self._opensearch_config.local_browse:
+            yield from self._refresh_browse_index(index_generation)
+            results = yield ComputeStep(
+                self._local_browse,
+                (search_request_body, opensearch_internal_config, index_generation),
+            )
+            if results is not None:
+                return results
+
+        # Browse requests have no query string to encode
+        opensearch_request = self._build_request(
+            search_request_body, opensearch_internal_config
+        )
+        opensearch_response_body = yield SearchStep(
+            opensearch_request.query, preference, indices, opensearch_internal_config
+        )
+        return self._process_browse_response(opensearch_response_body)
+
+    def _refresh_browse_index(self, index_generation: str) -> Operation[None]:
+        if not self._start_browse_index_refresh(index_generation):
+            return
+
+        try:
+            hits = yield ScanBrowseIndexStep()
+            self._browse_index = yield ComputeStep(
+                self._create_browse_index, (hits, index_generation)
+            )
+        except Exception:
+            _LOGGER.exception("Could not refresh the browse index")
+
+    def _search(
+        self,
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: OpenSearchQueryConfig,
+        preference: Optional[str],
+        indices: str,
+        index_generation: str,
+    ) -> Operation[SearchResults]:
+        """Run a search, serving the page from a cursor if possible.
+
+        The first page of a search stores the ordered documents it found under a new
+        cursor. Requests for further pages of the same search that supply the cursor
+        only query for the passages of the documents on the requested page. When a
+        result set store is configured, the documents found by recent searches are
+        also kept with their passages, so that any request for a further page of the
+        same search is served without querying.
+
+        In two phase mode, the first query only ranks documents and passages are
+        always fetched by a second query for the documents on the requested page.
+        """
+
+        result_set_key = canonical_result_set_request(
+            search_request_body, indices, opensearch_internal_config
+        )
+        cursor = self._cursors.page_cursor(
+            search_request_body.cursor,
+            result_set_key,
+            index_generation,
+            offset=search_request_body.offset,
+            limit=search_request_body.limit,
+            max_doc_count=opensearch_internal_config.max_doc_count,
+        )
+        if cursor is not None:
+            return (
+                yield from self._search_page_from_cursor(
+                    search_request_body,
+                    opensearch_internal_config,
+                    preference,
+                    indices,
+                    cursor,
+                    search_request_body.cursor,
+                )
+            )
+
+        if opensearch_internal_config.two_phase:
+            return (
+                yield from self._two_phase_search(
+                    search_request_body,
+                    opensearch_internal_config,
+                    preference,
+                    indices,
+                    index_generation,
+                    result_set_key,
+                )
+            )
+
+        opensearch_response_body, ranked_doc_count = yield from self._ranked_result_set(
+            search_request_body,
+            opensearch_internal_config,
+            preference,
+            indices,
+            index_generation,
+            result_set_key,
+            with_passages=True,
+        )
+        results = self._process_search_response(
+            opensearch_response_body,
+            limit=search_request_body.limit,
+            offset=search_request_body.offset,
+        )
+        if self._cursors.cursor_store is not None and not results.partial:
+            results.cursor = self._cursors.add_cursor(
+                create_search_cursor(
+                    opensearch_response_body,
+                    result_set_key,
+                    ranked_doc_count,
+                ),
+                index_generation,
+            )
+        return results
+
+    def _ranked_result_set(
+        self,
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: OpenSearchQueryConfig,
+        preference: Optional[str],
+        indices: str,
+        index_generation: str,
+        result_set_key: str,
+        with_passages: bool,
+    ) -> Operation[tuple[OpenSearchResponse, int]]:
+        """Rank the documents matching a request, keeping them to serve later pages.
+
+        Searches ranking the same documents while one is in flight wait for & share
+        its response when configured, so that e.g. a request for the second page
+        waits for the full search made in the background of a JIT search.
+        """
+
+        def rank() -> Operation[tuple[OpenSearchResponse, int]]:
+            opensearch_response_body, ranked_doc_count = yield from self._ranked_search(
+                search_request_body,
+                opensearch_internal_config,
+                preference,
+                indices,
+                with_passages,
+            )
+            self._store_result_set(
+                opensearch_response_body,
+                result_set_key,
+                ranked_doc_count,
+                index_generation,
+                with_passages,
+            )
+            return opensearch_response_body, ranked_doc_count
+
+        return (
+            yield from coalesced(
+                self._result_set_flights,
+                self._result_set_flight_key(
+                    result_set_key,
+                    index_generation,
+                    opensearch_internal_config,
+                    with_passages,
+                ),
+                rank,
+            )
+        )
+
+    def _ranked_search(
+        self,
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: OpenSearchQueryConfig,
+        preference: Optional[str],
+        indices: str,
+        with_passages: bool,
+    ) -> Operation[tuple[OpenSearchResponse, int]]:
+        """Search for the documents matching a request.
+
+        The smallest kNN k in the schedule that finds enough of them is used.
+
+        :return: the response, and the number of documents it ranked
+        """
+
+        request_time_ms = 0
+        for knn_config in self._knn_configs(
+            search_request_body, opensearch_internal_config
+        ):
+            opensearch_request = yield ComputeStep(
+                self._build_request, (search_request_body, knn_config)
+            )
+            if not with_passages:
+                opensearch_request.without_passages()
+            opensearch_response_body = yield SearchStep(
+                opensearch_request.query, preference, indices, knn_config
+            )
+            opensearch_response_body = yield ComputeStep(
+                self._with_description_matches,
+                (
+                    search_request_body,
+                    knn_config,
+                    opensearch_request,
+                    opensearch_response_body,
+                ),
+            )
+            request_time_ms += opensearch_response_body.request_time_ms
+            ranked_doc_count = self._ranked_doc_count(
+                search_request_body,
+                opensearch_internal_config,
+                knn_config,
+                opensearch_request,
+                opensearch_response_body,
+            )
+            if ranked_doc_count is not None:
+                opensearch_response_body.request_time_ms = request_time_ms
+                return opensearch_response_body, ranked_doc_count
+
+        raise RuntimeError("kNN search did not reach the configured k")
+
+    def _two_phase_search(
+        self,
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: OpenSearchQueryConfig,
+        preference: Optional[str],
+        indices: str,
+        index_generation: str,
+        result_set_key: str,
+    ) -> Operation[SearchResults]:
+        ranking_response_body, ranked_doc_count = yield from self._ranked_result_set(
+            search_request_body,
+            opensearch_internal_config,
+            preference,
+            indices,
+            index_generation,
+            result_set_key,
+            with_passages=False,
+        )
+        cursor = create_search_cursor(
+            ranking_response_body, result_set_key, ranked_doc_count
+        )
+
+        results = yield from self._search_page_from_cursor(
+            search_request_body,
+            opensearch_internal_config,
+            preference,
+            indices,
+            cursor,
+            None
+            if ranking_response_body.partial
+            else self._cursors.add_cursor(cursor, index_generation),
+        )
+        results.query_time_ms += ranking_response_body.request_time_ms
+        results.partial = results.partial or ranking_response_body.partial
+        return results
+
+    def _search_page_from_cursor(
+        self,
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: OpenSearchQueryConfig,
+        preference: Optional[str],
+        indices: str,
+        cursor: SearchCursor,
+        cursor_token: Optional[str],
+    ) -> Operation[SearchResults]:
+        start = search_request_body.offset
+        page_document_keys = cursor.document_keys[
+            start : start + search_request_body.limit
+        ]
+        if not page_document_keys:
+            return SearchResults(
+                hits=cursor.hits,
+                query_time_ms=0,
+                cursor=cursor_token,
+                facets=cursor.facets,
+                documents=[],
+            )
+        if cursor.response is not None:
+            return self._page_from_result_set(search_request_body, cursor, cursor_token)
+
+        # Facets are for the whole search, so come from the cursor, not the page
+        opensearch_request = yield ComputeStep(
+            self._build_request,
+            (
+                search_request_body.copy(update={"facets": None}),
+                self._page_query_config(
+                    opensearch_internal_config, len(page_document_keys)
+                ),
+            ),
+        )
+        opensearch_request.with_document_keys_filter(page_document_keys)
+        opensearch_response_body = yield SearchStep(
+            opensearch_request.query, preference, indices, opensearch_internal_config
+        )
+        opensearch_response_body = yield ComputeStep(
+            self._with_description_matches,
+            (
+                search_request_body,
+                opensearch_internal_config,
+                opensearch_request,
+                opensearch_response_body,
+                page_document_keys,
+            ),
+        )
+
+        results = self._process_search_response(
+            opensearch_response_body,
+            limit=len(page_document_keys),
+            offset=0,
+            document_keys=page_document_keys,
+        )
+        results.hits = cursor.hits
+        results.cursor = cursor_token
+        results.facets = cursor.facets
+        return results
+
+
+class OpenSearchConnection(_OpenSearchConnectionBase):
+    """OpenSearch connection helper, allows query based on config."""
+
+    def __init__(
+        self,
+        opensearch_config: OpenSearchConfig,
+        result_cache: Optional[TTLCache[SearchResults]] = None,
+        cursor_store: Optional[TTLCache[SearchCursor]] = None,
+        description_index: Optional[DescriptionEmbeddingIndex] = None,
+        precomputed_results: Optional[PrecomputedResults] = None,
+        result_set_store: Optional[TTLCache[SearchCursor]] = None,
+    ):
+        super().__init__(
+            opensearch_config,
+            result_cache,
+            cursor_store,
+            description_index,
+            precomputed_results,
+            result_set_store,
+        )
+        self._opensearch_connection: Optional[OpenSearch] = None
+        self._search_flights = (
+            SingleFlight() if opensearch_config.coalesce_searches else None
+        )
+        self._result_set_flights = (
+            SingleFlight() if opensearch_config.coalesce_searches else None
+        )
+        self._fan_out_executor = ThreadPoolExecutor(
+            max_workers=opensearch_config.connection_pool_maxsize,
+            thread_name_prefix="opensearch-fan-out",
+        )
+
+    def query(
+        self,
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: OpenSearchQueryConfig,
+        preference: Optional[str],
+        searches: Optional[list[OpenSearchResponse]] = None,
+    ) -> SearchResults:
+        """Build & make an OpenSearch query based on the given request body.
+
+        Results are served from the result cache when one is configured and holds
+        results for an equivalent request against the current index generation.
+        Identical searches made while one is in flight wait for & share its results,
+        when `coalesce_searches` is configured. Precomputed results are served for
+        the searches they were computed for while the index generation is unchanged.
+        Cached, precomputed & coalesced results are shared, so must not be modified
+        by the caller.
+
+        :param searches: if given, the responses to the OpenSearch queries made for
+            this query (none if its results were served without querying) are
+            appended to it
+        """
+
+        index_generation = (
+            self.index_generation() if self._uses_index_generation() else ""
+        )
+        return self._run(
+            self._query(
+                search_request_body,
+                opensearch_internal_config,
+                preference,
+                index_generation,
+            ),
+            searches,
+        )
+
+    def _run(
+        self,
+        operation: Operation[T],
+        searches: Optional[list[OpenSearchResponse]] = None,
+    ) -> T:
+        """Run a query flow, making the requests it yields."""
+
+        return run(operation, lambda step: self._make_request(step, searches))
+
+    def _make_request(
+        self, step: Any, searches: Optional[list[OpenSearchResponse]]
+    ) -> Any:
+        if isinstance(step, SearchStep):
+            response = self._search_query(
+                step.request_body, step.preference, step.indices, step.query_config
+            )
+            if searches is not None:
+                searches.append(response)
+            return response
+        if isinstance(step, ComputeStep):
+            return step.function(*step.args)
+        if isinstance(step, ScanBrowseIndexStep):
+            return list(scan(self._get_connection(), **self._browse_index_scan_args()))
+        if isinstance(step, CoalesceStep):
+            return step.flights.do(
+                step.key, lambda: self._run(step.operation(), searches)
+            )
+        raise TypeError(f"Unknown query step: {step!r}")
+
+    def index_generation(self) -> str:
+        """Get a token that changes whenever the configured indices are rebuilt.
+
+        The token is derived from the UUID and document count of each index, and is
+        refreshed at most every `index_generation_check_s` seconds.
+        """
+
+        if self._index_generation_is_current():
+            return self._index_generation
+
+        self._index_generation_checked_at = time.monotonic()
+        try:
+            indices = self._get_connection().cat.indices(**self._cat_indices_args())
+        except Exception:
+            _LOGGER.exception("Could not determine the index generation")
+            return self._index_generation
+
+        return self._update_index_generation(indices)
+
+    def connect(self) -> None:
+        """Create the OpenSearch client, which is shared by all queries.
+
+        This should be called once at startup, so that the first query does not pay
+        for creating the client (and sniffing the cluster, if configured).
+        """
+
+        if self._opensearch_connection is None:
+            self._opensearch_connection = OpenSearch(**self._client_kwargs())
+
+    def close(self) -> None:
+        """Close the connections to OpenSearch."""
+
+        if self._opensearch_connection is not None:
+            self._opensearch_connection.close()
+            self._opensearch_connection = None
+
+    def _get_connection(self) -> OpenSearch:
+        if self._opensearch_connection is None:
+            self.connect()
+        return cast(OpenSearch, self._opensearch_connection)
+
+    def _search_query(
+        self,
+        request_body: SearchRequest,
+        preference: Optional[str],
+        indices: str,
+        query_config: Optional[OpenSearchQueryConfig] = None,
+    ) -> OpenSearchResponse:
+        """Make a search query, querying each index concurrently if configured.
+
+        Each index is given `fan_out_index_timeout_s` (or the remaining latency
+        budget, if less) to respond, and the results of the indices that did are
+        merged & marked as partial if any did not.
+        """
+
+        fan_out_indices = self._fan_out_indices(indices)
+        if fan_out_indices is None:
+            return self.raw_query(
+                request_body, preference, indices, query_config=query_config
+            )
+
+        start = time.time_ns()
+        index_request_body = self._fan_out_request(request_body, len(fan_out_indices))
+        timeout_s = self._opensearch_config.fan_out_index_timeout_s
+        index_query_config = self._fan_out_query_config(query_config)
+        futures = [
+            self._fan_out_executor.submit(
+                self.raw_query,
+                index_request_body,
+                preference,
+                index,
+                timeout_s,
+                index_query_config,
+            )
+            for index in fan_out_indices
+        ]
+        # The client may take longer than its timeout, e.g. if it retries
+        done, _ = wait(futures, timeout=timeout_s + _CLIENT_TIMEOUT_GRACE_S)
+        responses: list[Union[OpenSearchResponse, BaseException]] = []
+        for future in futures:
+            if future in done:
+                responses.append(future.exception() or future.result())
+            else:
+                # The request cannot be cancelled once running, but ends at its
+                # own timeout
+                responses.append(FutureTimeoutError("Index did not respond in time"))
+        return self._merge_fan_out_responses(
+            request_body, fan_out_indices, responses, start
+        )
+
+    def raw_query(
+        self,
+        request_body: SearchRequest,
+        preference: Optional[str],
+        indices: str,
+        request_timeout: Optional[float] = None,
+        query_config: Optional[OpenSearchQueryConfig] = None,
+    ) -> OpenSearchResponse:
+        """Query the configured OpenSearch instance with a JSON OpenSearch body.
+
+        The search is limited by the timeout & terminate_after of `query_config`, if
+        given, when OpenSearch returns the results found so far marked as partial.
+        """
+
+        start = time.time_ns()
+        body = self._body_to_send(request_body)
+        if (
+            isinstance(request_body, TemplateQuery)
+            and self._opensearch_config.stored_search_templates
+        ):
+            self._store_template(request_body.template)
+            search = self._get_connection().search_template
+        else:
+            search = self._get_connection().search
+        response = search(
+            body=body,
+            index=indices,
+            preference=preference,
+            **self._search_kwargs(request_body, request_timeout, query_config),
+        )
+        return self._search_response(body, response, start)
+
+    def _store_template(self, template: QueryTemplate) -> None:
+        if template.id not in self._stored_template_ids:
+            self._get_connection().put_script(
+                id=template.id, body=stored_search_template_body(template)
+            )
+            self._stored_template_ids.add(template.id)
+
+
+class AsyncOpenSearchConnection(_OpenSearchConnectionBase):
+    """Async OpenSearch connection helper, allows query based on config.
+
+    Queries are awaited rather than blocking a worker thread, and only encoding the
+    query string (the CPU-bound part of building a search request) is run in the
+    threadpool.
+    """
+
+    def __init__(
+        self,
+        opensearch_config: OpenSearchConfig,
+        result_cache: Optional[TTLCache[SearchResults]] = None,
+        cursor_store: Optional[TTLCache[SearchCursor]] = None,
+        description_index: Optional[DescriptionEmbeddingIndex] = None,
+        precomputed_results: Optional[PrecomputedResults] = None,
+        result_set_store: Optional[TTLCache[SearchCursor]] = None,
+    ):
+        super().__init__(
+            opensearch_config,
+            result_cache,
+            cursor_store,
+            description_index,
+            precomputed_results,
+            result_set_store,
+        )
+        self._opensearch_connection: Optional[AsyncOpenSearch] = None
+        self._search_flights = (
+            AsyncSingleFlight() if opensearch_config.coalesce_searches else None
+        )
+        self._result_set_flights = (
+            AsyncSingleFlight() if opensearch_config.coalesce_searches else None
+        )
+
+    async def query(
+        self,
+        search_request_body: SearchRequestBody,
+        opensearch_internal_config: OpenSearchQueryConfig,
+        preference: Optional[str],
+        searches: Optional[list[OpenSearchResponse]] = None,
+    ) -> SearchResults:
+        """Build & make an OpenSearch query based on the given request body.
+
+        See `OpenSearchConnection.query`.
+        """
+
+        index_generation = (
+            await self.index_generation() if self._uses_index_generation() else ""
+        )
+        return await self._run(
+            self._query(
+                search_request_body,
+                opensearch_internal_config,
+                preference,
+                index_generation,
+            ),
+            searches,
+        )
+
+    async def _run(
+        self,
+        operation: Operation[T],
+        searches: Optional[list[OpenSearchResponse]] = None,
+    ) -> T:
+        """Run a query flow, awaiting the requests it yields."""
+
+        return await run_async(
+            operation, lambda step: self._make_request(step, searches)
+        )
+
+    async def _make_request(
+        self, step: Any, searches: Optional[list[OpenSearchResponse]]
+    ) -> Any:
+        if isinstance(step, SearchStep):
+            response = await self._search_query(
+                step.request_body, step.preference, step.indices, step.query_config
+            )
+            if searches is not None:
+                searches.append(response)
+            return response
+        if isinstance(step, ComputeStep):
+            return await run_in_threadpool(step.function, *step.args)
+        if isinstance(step, ScanBrowseIndexStep):
+            return [
+                hit
+                async for hit in async_scan(
+                    self._get_connection(), **self._browse_index_scan_args()
+                )
+            ]
+        if isinstance(step, CoalesceStep):
+            return await step.flights.do(
+                step.key, lambda: self._run(step.operation(), searches)
+            )
+        raise TypeError(f"Unknown query step: {step!r}")
+
+    async def index_generation(self) -> str:
+        """Get a token that changes whenever the configured indices are rebuilt.
 
-        if IncludedResults.HTMLS_NON_TRANSLATED in search_request.include_results:
-            indices_include.extend(
-                f"{self._opensearch_config.index_prefix}_htmls_non_translated"
+        See `OpenSearchConnection.index_generation`.
+        """
+
+        if self._index_generation_is_current():
+            return self._index_generation
+
+        self._index_generation_checked_at = time.monotonic()
+        try:
+            indices = await self._get_connection().cat.indices(
+                **self._cat_indices_args()
             )
+        except Exception:
+            _LOGGER.exception("Could not determine the index generation")
+            return self._index_generation
 
-        return ",".join(indices_include)
+        return self._update_index_generation(indices)
 
-    def raw_query(
+    def connect(self) -> None:
+        """Create the OpenSearch client, which is shared by all queries.
+
+        See `OpenSearchConnection.connect`.
+        """
+
+        if self._opensearch_connection is None:
+            self._opensearch_connection = AsyncOpenSearch(**self._client_kwargs())
+
+    def _get_connection(self) -> AsyncOpenSearch:
+        if self._opensearch_connection is None:
+            self.connect()
+        return cast(AsyncOpenSearch, self._opensearch_connection)
+
+    async def _search_query(
         self,
-        request_body: Mapping[str, Any],
+        request_body: SearchRequest,
         preference: Optional[str],
         indices: str,
+        query_config: Optional[OpenSearchQueryConfig] = None,
     ) -> OpenSearchResponse:
-        """Query the configured OpenSearch instance with a JSON OpenSearch body."""
+        """Make a search query, querying each index concurrently if configured.
 
-        if self._opensearch_connection is None:
-            login_details = (
-                self._opensearch_config.username,
-                self._opensearch_config.password,
-            )
-            self._opensearch_connection = OpenSearch(
-                [self._opensearch_config.url],
-                http_auth=login_details,
-                use_ssl=self._opensearch_config.use_ssl,
-                veriy_certs=self._opensearch_config.verify_certs,
-                ssl_show_warn=self._opensearch_config.ssl_show_warnings,
+        See `OpenSearchConnection._search_query`.
+        """
+
+        fan_out_indices = self._fan_out_indices(indices)
+        if fan_out_indices is None:
+            return await self.raw_query(
+                request_body, preference, indices, query_config=query_config
             )
 
         start = time.time_ns()
-        response = self._opensearch_connection.search(
-            body=request_body,
+        index_request_body = self._fan_out_request(request_body, len(fan_out_indices))
+        timeout_s = self._opensearch_config.fan_out_index_timeout_s
+        index_query_config = self._fan_out_query_config(query_config)
+        responses = await asyncio.gather(
+            *(
+                asyncio.wait_for(
+                    self.raw_query(
+                        index_request_body,
+                        preference,
+                        index,
+                        timeout_s,
+                        index_query_config,
+                    ),
+                    timeout=timeout_s + _CLIENT_TIMEOUT_GRACE_S,
+                )
+                for index in fan_out_indices
+            ),
+            return_exceptions=True,
+        )
+        return self._merge_fan_out_responses(
+            request_body, fan_out_indices, responses, start
+        )
+
+    async def raw_query(
+        self,
+        request_body: SearchRequest,
+        preference: Optional[str],
+        indices: str,
+        request_timeout: Optional[float] = None,
+        query_config: Optional[OpenSearchQueryConfig] = None,
+    ) -> OpenSearchResponse:
+        """Query the configured OpenSearch instance with a JSON OpenSearch body.
+
+        See `OpenSearchConnection.raw_query`.
+        """
+
+        start = time.time_ns()
+        body = self._body_to_send(request_body)
+        if (
+            isinstance(request_body, TemplateQuery)
+            and self._opensearch_config.stored_search_templates
+        ):
+            await self._store_template(request_body.template)
+            search = self._get_connection().search_template
+        else:
+            search = self._get_connection().search
+        response = await search(
+            body=body,
             index=indices,
-            request_timeout=self._opensearch_config.request_timeout,
             preference=preference,
+            **self._search_kwargs(request_body, request_timeout, query_config),
         )
-        end = time.time_ns()
-        search_request_time = round((end - start) / 1e6)
+        return self._search_response(body, response, start)
 
-        _LOGGER.info(
-            "Search request completed",
-            extra={
-                "props": {
-                    "search_request": json.dumps(request_body, cls=OpenSearchEncoder),
-                    "search_request_time": search_request_time,
-                },
-            },
-        )
+    async def _store_template(self, template: QueryTemplate) -> None:
+        if template.id not in self._stored_template_ids:
+            await self._get_connection().put_script(
+                id=template.id, body=stored_search_template_body(template)
+            )
+            self._stored_template_ids.add(template.id)
 
-        return OpenSearchResponse(
-            raw_response=response,
-            request_time_ms=search_request_time,
-        )
+    async def close(self) -> None:
+        """Close the connections to OpenSearch."""
+
+        if self._opensearch_connection is not None:
+            await self._opensearch_connection.close()
+            self._opensearch_connection = None
 
 
 def _year_range_filter(
@@ -320,6 +1889,33 @@ def _year_range_filter(
     return None
 
 
+def query_mode(search_request: SearchRequestBody) -> QueryMode:
+    """Get the mode a search request will be run in: browse if there is no query."""
+
+    if search_request.query_string.translate(_PUNCTUATION_TRANSLATION).strip():
+        return QueryMode.SEARCH
+    return QueryMode.BROWSE
+
+
+def knn_k_schedule(
+    search_request: SearchRequestBody, config: OpenSearchQueryConfig
+) -> Sequence[int]:
+    """Get the values of kNN k to search with in turn, until enough documents are found.
+
+    Adaptive kNN starts with enough neighbours for the documents up to the end of the
+    requested page. If too few documents are found, e.g. as the filters exclude most
+    neighbours, it searches once more with the configured k, so that a search takes
+    at most two round trips.
+    """
+
+    if not config.adaptive_knn:
+        return [config.k]
+
+    documents = min(search_request.offset + search_request.limit, config.max_doc_count)
+    k = min(config.k, max(config.knn_min_k, documents * config.knn_k_per_doc))
+    return [k] if k >= config.k else [k, config.k]
+
+
 class QueryBuilder:
     """Helper class for building OpenSearch queries."""
 
@@ -327,6 +1923,11 @@ class QueryBuilder:
         self._config = config
         self._mode: Optional[QueryMode] = None
         self._request_body: dict[str, Any] = {}
+        self._uses_knn = False
+        self._query_embedding: Optional[Any] = None
+        self._description_knn = True
+        # kNN clauses, which are filtered as well as the query when configured to
+        self._knn_queries: list[dict[str, Any]] = []
 
     @property
     def query(self) -> Mapping[str, Any]:
@@ -340,6 +1941,35 @@ class QueryBuilder:
 
         return self._mode
 
+    @property
+    def uses_knn(self) -> bool:
+        """Whether the configured query includes kNN clauses."""
+
+        return self._uses_knn
+
+    @property
+    def query_embedding(self) -> Optional[Any]:
+        """The embedding of the query string, if searching semantically."""
+
+        return self._query_embedding
+
+    @property
+    def description_knn(self) -> bool:
+        """Whether descriptions are searched by the query's kNN clauses."""
+
+        return self._description_knn
+
+    def _with_filter(self, filter_clause: Mapping[str, Any]):
+        filters = self._request_body["query"]["bool"].get("filter") or []
+        filters.append(filter_clause)
+        self._request_body["query"]["bool"]["filter"] = filters
+        if self._config.knn_filter:
+            # Filtering within kNN clauses finds k neighbours that match the filters,
+            # rather than filtering k neighbours found from every document
+            for knn_query in self._knn_queries:
+                knn_filters = knn_query.setdefault("filter", {"bool": {"filter": []}})
+                knn_filters["bool"]["filter"].append(filter_clause)
+
     def _with_search_term_base(self):
         if self._mode is not None:
             raise RuntimeError("Query base has already been configured")
@@ -414,11 +2044,22 @@ class QueryBuilder:
             },
         }
 
-    def with_semantic_query(self, query_string: str, knn: bool):
-        """Configure the query to search semantically for a given query string."""
+    def with_semantic_query(
+        self,
+        query_string: str,
+        knn: bool,
+        embedding: Optional[Any] = None,
+        description_knn: bool = True,
+    ):
+        """Configure the query to search semantically for a given query string.
+
+        The query string is encoded for kNN search unless its `embedding` is given.
+        Without `description_knn`, only passages are searched by kNN, e.g. as
+        descriptions are searched in-process.
+        """
 
-        embedding = _ENCODER.encode(query_string)
         self._with_search_term_base()
+        self._description_knn = description_knn
         self._request_body["query"]["bool"]["should"] = [
             {
                 "bool": {
@@ -481,32 +2122,40 @@ class QueryBuilder:
             },
         ]
 
+        if knn and embedding is None:
+            # Only encode when needed, as it is the most CPU intensive step
+            embedding = get_encoder().encode(query_string)
         if knn:
-            self._request_body["query"]["bool"]["should"][1]["bool"]["should"].append(
-                {
-                    "function_score": {
-                        "query": {
-                            "knn": {
-                                OPENSEARCH_INDEX_DESCRIPTION_EMBEDDING_KEY: {
-                                    "vector": embedding,
-                                    "k": self._config.k,
+            self._uses_knn = True
+            self._query_embedding = embedding
+            if description_knn:
+                description_knn_query = {"vector": embedding, "k": self._config.k}
+                self._knn_queries.append(description_knn_query)
+                self._request_body["query"]["bool"]["should"][1]["bool"][
+                    "should"
+                ].append(
+                    {
+                        "function_score": {
+                            "query": {
+                                "knn": {
+                                    OPENSEARCH_INDEX_DESCRIPTION_EMBEDDING_KEY: (
+                                        description_knn_query
+                                    ),
                                 },
                             },
-                        },
-                        "min_score": self._config.lucene_threshold,
+                            "min_score": self._config.lucene_threshold,
+                        }
                     }
-                }
-            )
+                )
 
+            text_knn_query = {"vector": embedding, "k": self._config.k}
+            self._knn_queries.append(text_knn_query)
             self._request_body["query"]["bool"]["should"][2]["bool"]["should"].append(
                 {
                     "function_score": {
                         "query": {
                             "knn": {
-                                "text_embedding": {
-                                    "vector": embedding,
-                                    "k": self._config.k,
-                                },
+                                "text_embedding": text_knn_query,
                             },
                         },
                         "min_score": self._config.lucene_threshold,
@@ -553,18 +2202,14 @@ class QueryBuilder:
 
     def with_keyword_filter(self, field: FilterField, values: Sequence[str]):
         """Add a keyword filter to the configured query."""
-        filters = self._request_body["query"]["bool"].get("filter") or []
-        filters.append({"terms": {_FILTER_FIELD_MAP[field]: values}})
-        self._request_body["query"]["bool"]["filter"] = filters
+        self._with_filter({"terms": {_FILTER_FIELD_MAP[field]: values}})
 
     def with_year_range_filter(self, year_range: tuple[Optional[int], Optional[int]]):
         """Add a year range filter to the configured query."""
 
         year_range_filter = _year_range_filter(year_range)
         if year_range_filter is not None:
-            filters = self._request_body["query"]["bool"].get("filter") or []
-            filters.append(year_range_filter)
-            self._request_body["query"]["bool"]["filter"] = filters
+            self._with_filter(year_range_filter)
 
     def with_search_order(self, field: SortField, order: SortOrder):
         """Set sort order for search results."""
@@ -610,6 +2255,55 @@ class QueryBuilder:
             raise RuntimeError("Cannot configure offset when not in browse mode.")
         self._request_body["from"] = offset
 
+    def with_document_keys_filter(self, document_keys: Sequence[str]):
+        """Restrict a search to the given documents, e.g. to fetch a page of results."""
+        if self._mode != QueryMode.SEARCH:
+            raise RuntimeError("Cannot filter by document key for non-search mode.")
+
+        self._with_document_keys_filter(list(document_keys), len(document_keys))
+
+    def _with_document_keys_filter(self, document_keys: Any, size: int):
+        self._with_filter({"terms": {OPENSEARCH_INDEX_INDEX_KEY: document_keys}})
+        top_docs = self._request_body["aggs"]["sample"]["aggs"]["top_docs"]
+        top_docs["terms"]["size"] = size
+
+    def without_passages(self):
+        """Only rank documents, without returning any of their passages."""
+        if self._mode != QueryMode.SEARCH:
+            raise RuntimeError("Cannot exclude passages for non-search mode.")
+
+        top_docs = self._request_body["aggs"]["sample"]["aggs"]["top_docs"]
+        del top_docs["aggs"]["top_passage_hits"]
+
+    def with_facets(self, fields: Sequence[FilterField]):
+        """Count the documents matching the query by the values of the given fields.
+
+        Searches count documents within the sample of passages used to find results,
+        browsing counts all matching documents.
+        """
+
+        if self._mode == QueryMode.SEARCH:
+            aggs = self._request_body["aggs"]["sample"]["aggs"]
+            for field in fields:
+                aggs[f"{_FACET_AGGREGATION_PREFIX}{field.value}"] = {
+                    "terms": {
+                        "field": _FILTER_FIELD_MAP[field],
+                        "size": self._config.facet_size,
+                    },
+                    "aggs": {"documents": {"cardinality": {"field": "document_slug"}}},
+                }
+        elif self._mode == QueryMode.BROWSE:
+            aggs = self._request_body.setdefault("aggs", {})
+            for field in fields:
+                aggs[f"{_FACET_AGGREGATION_PREFIX}{field.value}"] = {
+                    "terms": {
+                        "field": _FILTER_FIELD_MAP[field],
+                        "size": self._config.facet_size,
+                    },
+                }
+        else:
+            raise RuntimeError("Cannot configure facets before the query mode.")
+
     def with_required_fields(self, required_fields: Sequence[str]):
         """Ensure that required fields are present in opensearch responses."""
         must_clause = self._request_body["query"]["bool"].get("must") or []
@@ -619,32 +2313,221 @@ class QueryBuilder:
         self._request_body["query"]["bool"]["must"] = must_clause
 
 
+class TemplatedQueryBuilder(QueryBuilder):
+    """QueryBuilder which fills in a request body template for each query shape.
+
+    Rather than building the request body, the configuration calls are recorded with
+    their varying values replaced by template parameters. The calls & query config
+    make up the shape of the query, and the request body is only built & compiled
+    into a template the first time a shape is seen.
+    """
+
+    _templates: dict[Any, QueryTemplate] = {}
+    _templates_lock = threading.Lock()
+    _MAX_TEMPLATES = 1024
+
+    def __init__(self, config: OpenSearchQueryConfig):
+        super().__init__(config)
+        self._calls: list[tuple[str, tuple[Any, ...]]] = []
+        self._params: dict[str, Any] = {}
+
+    @property
+    def query(self) -> TemplateQuery:  # type: ignore[override]
+        """Property to allow access to the request to make from a template."""
+
+        return TemplateQuery(template=self.template(), params=dict(self._params))
+
+    def template(self) -> QueryTemplate:
+        """Get the compiled template for the shape of the configured query."""
+
+        # Limits on the search are sent as request parameters, not in the body
+        config = dataclasses.replace(self._config, timeout_ms=None, terminate_after=0)
+        shape = (tuple(vars(config).values()), tuple(self._calls))
+        template = self._templates.get(shape)
+        if template is None:
+            builder = QueryBuilder(self._config)
+            for method, args in self._calls:
+                getattr(builder, method)(*args)
+            template = QueryTemplate.compile(builder.query, id_prefix="navigator_")
+            with self._templates_lock:
+                if len(self._templates) >= self._MAX_TEMPLATES:
+                    self._templates.clear()
+                self._templates[shape] = template
+        return template
+
+    def _record(self, method: str, *args: Any):
+        self._calls.append((method, args))
+
+    def _param(self, name: str, value: Any) -> str:
+        self._params[name] = value
+        return template_param(name)
+
+    def _with_search_term_base(self):
+        if self._mode is not None:
+            raise RuntimeError("Query base has already been configured")
+        self._mode = QueryMode.SEARCH
+
+    def _with_browse_base(self):
+        if self._mode is not None:
+            raise RuntimeError("Query base has already been configured")
+        self._mode = QueryMode.BROWSE
+
+    def with_semantic_query(
+        self,
+        query_string: str,
+        knn: bool,
+        embedding: Optional[Any] = None,
+        description_knn: bool = True,
+    ):
+        """Configure the query to search semantically for a given query string."""
+
+        self._with_search_term_base()
+        if knn and embedding is None:
+            embedding = get_encoder().encode(query_string)
+        self._uses_knn = knn
+        self._query_embedding = embedding if knn else None
+        self._description_knn = description_knn
+        self._record(
+            "with_semantic_query",
+            self._param("query_string", query_string),
+            knn,
+            self._param("embedding", embedding) if knn else None,
+            description_knn,
+        )
+
+    def with_exact_query(self, query_string: str):
+        """Configure the query to search for an exact match to a given query string."""
+
+        self._with_search_term_base()
+        self._record("with_exact_query", self._param("query_string", query_string))
+
+    def with_browse_query(self):
+        """Configure the query to browse documents according to supplied filters."""
+
+        self._with_browse_base()
+        self._record("with_browse_query")
+
+    def with_keyword_filter(self, field: FilterField, values: Sequence[str]):
+        """Add a keyword filter to the configured query."""
+
+        self._record(
+            "with_keyword_filter",
+            field,
+            self._param(f"keyword_filter_{field.value}", list(values)),
+        )
+
+    def with_year_range_filter(self, year_range: tuple[Optional[int], Optional[int]]):
+        """Add a year range filter to the configured query."""
+
+        self._record(
+            "with_year_range_filter",
+            tuple(
+                None if year is None else self._param(f"year_{i}", year)
+                for i, year in enumerate(year_range)
+            ),
+        )
+
+    def with_search_order(self, field: SortField, order: SortOrder):
+        """Set sort order for search results."""
+
+        if self._mode != QueryMode.SEARCH:
+            raise RuntimeError(
+                "Cannot configure search sort ordering for non-search mode."
+            )
+        self._record("with_search_order", field, order)
+
+    def with_browse_order(self, field: SortField, order: SortOrder):
+        """Set sort order for browse results."""
+
+        if self._mode != QueryMode.BROWSE:
+            raise RuntimeError(
+                "Cannot configure browse sort ordering for non-browse mode."
+            )
+        self._record("with_browse_order", field, order)
+
+    def with_browse_limit(self, limit: int):
+        """Set result limit for browse results."""
+
+        if self._mode != QueryMode.BROWSE:
+            raise RuntimeError("Cannot configure limit when not in browse mode.")
+        self._record("with_browse_limit", self._param("limit", limit))
+
+    def with_browse_offset(self, offset: int):
+        """Set result offset for browse results."""
+
+        if self._mode != QueryMode.BROWSE:
+            raise RuntimeError("Cannot configure offset when not in browse mode.")
+        self._record("with_browse_offset", self._param("offset", offset))
+
+    def with_document_keys_filter(self, document_keys: Sequence[str]):
+        """Restrict a search to the given documents, e.g. to fetch a page of results."""
+
+        if self._mode != QueryMode.SEARCH:
+            raise RuntimeError("Cannot filter by document key for non-search mode.")
+        # The number of documents sets the aggregation size, so is part of the shape
+        self._record(
+            "_with_document_keys_filter",
+            self._param("document_keys", list(document_keys)),
+            len(document_keys),
+        )
+
+    def without_passages(self):
+        """Only rank documents, without returning any of their passages."""
+
+        if self._mode != QueryMode.SEARCH:
+            raise RuntimeError("Cannot exclude passages for non-search mode.")
+        self._record("without_passages")
+
+    def with_facets(self, fields: Sequence[FilterField]):
+        """Count the documents matching the query by the values of the given fields."""
+
+        if self._mode is None:
+            raise RuntimeError("Cannot configure facets before the query mode.")
+        self._record("with_facets", tuple(fields))
+
+    def with_required_fields(self, required_fields: Sequence[str]):
+        """Ensure that required fields are present in opensearch responses."""
+
+        self._record("with_required_fields", tuple(required_fields))
+
+
 def build_opensearch_request_body(
     search_request: SearchRequestBody,
     opensearch_internal_config: Optional[OpenSearchQueryConfig] = None,
-    sensitive_query_terms: set[str] = set(),
+    sensitive_query_terms: Optional[SensitiveQueryTermMatcher] = None,
+    use_templates: bool = False,
+    description_knn: bool = True,
 ) -> QueryBuilder:
-    """Build a complete OpenSearch request body."""
+    """Build a complete OpenSearch request body.
+
+    If `use_templates` is set, the request is made from a template compiled once for
+    each shape of query (see `TemplatedQueryBuilder`). Without `description_knn`,
+    the query does not search document descriptions by kNN.
+    """
 
     search_config = opensearch_internal_config or OpenSearchQueryConfig(
         max_passages_per_doc=search_request.max_passages_per_doc,
     )
-    builder = QueryBuilder(search_config)
+    builder = (
+        TemplatedQueryBuilder(search_config)
+        if use_templates
+        else QueryBuilder(search_config)
+    )
 
     # Strip punctuation and leading and trailing whitespace from query string
     search_request.query_string = search_request.query_string.translate(
-        str.maketrans("", "", string.punctuation)
+        _PUNCTUATION_TRANSLATION
     ).strip()
 
     if search_request.query_string:
         if search_request.exact_match:
             builder.with_exact_query(search_request.query_string)
         else:
-            sensitive_terms_in_query = [
-                term
-                for term in sensitive_query_terms
-                if term in search_request.query_string.lower()
-            ]
+            sensitive_terms_in_query = (
+                sensitive_query_terms.find(search_request.query_string)
+                if sensitive_query_terms is not None
+                else []
+            )
 
             # If the query contains any sensitive terms, and the length of the shortest sensitive term is >=50% of the length of the query by number of words, then disable KNN
             if (
@@ -657,7 +2540,11 @@ def build_opensearch_request_body(
             else:
                 use_knn = True
 
-            builder.with_semantic_query(search_request.query_string, knn=use_knn)
+            builder.with_semantic_query(
+                search_request.query_string,
+                knn=use_knn,
+                description_knn=description_knn,
+            )
 
         if search_request.sort_field is not None:
             builder.with_search_order(
@@ -693,111 +2580,347 @@ def build_opensearch_request_body(
     if search_request.year_range is not None:
         builder.with_year_range_filter(search_request.year_range)
 
+    if search_request.facets:
+        builder.with_facets(search_request.facets)
+
     return builder
 
 
+def create_search_cursor(
+    opensearch_response_body: OpenSearchResponse,
+    request_key: str,
+    max_doc_count: int,
+) -> SearchCursor:
+    """Record the ordered documents found by a search."""
+
+    aggregations = opensearch_response_body.raw_response["aggregations"]
+    result_docs = aggregations["sample"]["top_docs"]["buckets"]
+    return SearchCursor(
+        request_key=request_key,
+        document_keys=tuple(result_doc["key"] for result_doc in result_docs),
+        scores=tuple(result_doc["top_hit"]["value"] for result_doc in result_docs),
+        hits=aggregations["no_unique_docs"]["value"],
+        max_doc_count=max_doc_count,
+        facets=process_facets(aggregations["sample"]),
+    )
+
+
+def merge_search_responses(
+    request_body: Mapping[str, Any],
+    responses: Sequence[OpenSearchResponse],
+    request_time_ms: int,
+    partial: bool,
+) -> OpenSearchResponse:
+    """Merge the responses to a search request sent separately to each index.
+
+    See `merge_search_response_bodies`.
+    """
+
+    return OpenSearchResponse(
+        raw_response=merge_search_response_bodies(
+            request_body, [response.raw_response for response in responses]
+        ),
+        request_time_ms=request_time_ms,
+        partial=partial,
+    )
+
+
+def _date_stats(date: Optional[str]) -> dict[str, Any]:
+    # Stats of a single date as OpenSearch aggregates them, in epoch milliseconds
+    try:
+        epoch_ms = (
+            datetime.strptime(date or "", "%d/%m/%Y")
+            .replace(tzinfo=timezone.utc)
+            .timestamp()
+            * 1000
+        )
+    except ValueError:
+        return {"count": 0, "min": None, "max": None, "avg": None, "sum": 0.0}
+    return {
+        "count": 1,
+        "min": epoch_ms,
+        "max": epoch_ms,
+        "avg": epoch_ms,
+        "sum": epoch_ms,
+    }
+
+
+def description_match_response(
+    description_index: DescriptionEmbeddingIndex,
+    request_body: Mapping[str, Any],
+    embedding: Any,
+    opensearch_internal_config: OpenSearchQueryConfig,
+    keyword_filters: Optional[Mapping[FilterField, Sequence[str]]] = None,
+    year_range: Optional[tuple[Optional[int], Optional[int]]] = None,
+    document_keys: Optional[Sequence[str]] = None,
+) -> OpenSearchResponse:
+    """Search the in-process description index as OpenSearch would for a request.
+
+    Matches are returned as the buckets of a response to `request_body`, each with
+    the document's description entry as its only hit, scored as the description kNN
+    clause would have scored it. Requests with facets are not supported, as the
+    index cannot count them.
+    """
+
+    config = opensearch_internal_config
+    sample_aggs = request_body["aggs"]["sample"]["aggs"]
+    if any(name.startswith(_FACET_AGGREGATION_PREFIX) for name in sample_aggs):
+        raise ValueError("Facets cannot be counted from the description index")
+    top_docs_request = sample_aggs["top_docs"]
+    mask = description_index.filter_mask(
+        keyword_filters={
+            _FILTER_FIELD_MAP[field]: values
+            for field, values in (keyword_filters or {}).items()
+        },
+        year_range=year_range,
+        document_keys=document_keys,
+    )
+    (matches,) = description_index.search(
+        embedding,
+        limit=top_docs_request["terms"]["size"],
+        min_similarity=_lucene_threshold_to_innerproduct_threshold(
+            config.lucene_threshold
+        ),
+        mask=mask,
+    )
+
+    with_passages = "top_passage_hits" in top_docs_request["aggs"]
+    date_key = _SORT_FIELD_MAP[SortField.DATE]
+    buckets = []
+    for row, similarity in matches:
+        score = config.description_boost * _innerproduct_threshold_to_lucene_threshold(
+            similarity
+        )
+        document = description_index.documents[row]
+        bucket: dict[str, Any] = {
+            "key": description_index.document_keys[row],
+            "doc_count": 1,
+            "top_hit": {"value": score},
+            date_key: _date_stats(document.get(date_key)),
+        }
+        if with_passages:
+            bucket["top_passage_hits"] = {
+                "hits": {"hits": [{"_score": score, "_source": document}]}
+            }
+        buckets.append(bucket)
+
+    return OpenSearchResponse(
+        raw_response={
+            "aggregations": {
+                "no_unique_docs": {"value": len(buckets)},
+                "sample": {"top_docs": {"buckets": buckets}},
+            }
+        },
+        request_time_ms=0,
+    )
+
+
+def process_facets(
+    aggregations: Mapping[str, Any]
+) -> Optional[Mapping[FilterField, Mapping[str, int]]]:
+    """Get facet counts from the aggregations they were requested in, if any."""
+
+    facets = {}
+    for name, aggregation in aggregations.items():
+        if not name.startswith(_FACET_AGGREGATION_PREFIX):
+            continue
+        field = FilterField(name[len(_FACET_AGGREGATION_PREFIX) :])
+        facets[field] = {
+            str(bucket["key"]): (
+                bucket["documents"]["value"]
+                if "documents" in bucket
+                else bucket["doc_count"]
+            )
+            for bucket in aggregation["buckets"]
+        }
+    return facets or None
+
+
+_Model = TypeVar("_Model", bound=BaseModel)
+
+
+def _build_model(model: Type[_Model], validate: bool, **values: Any) -> _Model:
+    """Build a model, skipping validation for trusted values if `validate` is False."""
+    return model(**values) if validate else model.construct(**values)
+
+
+@lru_cache(maxsize=None)
+def _required_fields(model: Type[BaseModel]) -> frozenset[str]:
+    return frozenset(name for name, f in model.__fields__.items() if f.required)
+
+
+def _match_type(source: Mapping[str, Any]) -> Type[OpenSearchResponseMatchBase]:
+    """Get the kind of match a match in an OpenSearch response is."""
+
+    if OPENSEARCH_INDEX_NAME_KEY in source:
+        return OpenSearchResponseNameMatch
+    if OPENSEARCH_INDEX_DESCRIPTION_KEY in source:
+        return OpenSearchResponseDescriptionMatch
+    if OPENSEARCH_INDEX_TEXT_BLOCK_KEY in source:
+        return OpenSearchResponsePassageMatch
+    raise RuntimeError("Unexpected data in match results")
+
+
+def _match_fields(
+    match_type: Type[OpenSearchResponseMatchBase],
+    source: Mapping[str, Any],
+    validate: bool,
+) -> Mapping[str, Any]:
+    """Get the fields of a match in an OpenSearch response.
+
+    If `validate` is False the match is trusted, and only checked for the fields
+    results are built from, so that a malformed response fails here rather than
+    when the results are encoded.
+    """
+
+    if validate:
+        return match_type(**source).dict()
+    missing_fields = _required_fields(match_type).difference(source)
+    if missing_fields:
+        raise ValueError(
+            f"OpenSearch match is missing fields: {', '.join(sorted(missing_fields))}"
+        )
+    return source
+
+
+class _DocumentMatches:
+    """The matches of a document in an OpenSearch response, to build its result."""
+
+    __slots__ = ("source", "title_match", "description_match", "passages")
+
+    def __init__(self, source: Mapping[str, Any]):
+        # The fields of the document's first match
+        self.source = source
+        self.title_match = False
+        self.description_match = False
+        # The text, text block id, (1-based) page & coords of each matching passage
+        self.passages: list[tuple[str, str, int, Sequence[Coord]]] = []
+
+    def add(
+        self, match_type: Type[OpenSearchResponseMatchBase], fields: Mapping[str, Any]
+    ) -> None:
+        """Add a match of the document, with the fields from `_match_fields`."""
+
+        if match_type is OpenSearchResponseNameMatch:
+            self.title_match = True
+        elif match_type is OpenSearchResponseDescriptionMatch:
+            self.description_match = True
+        else:
+            self.passages.append(
+                (
+                    fields["text"],
+                    fields["text_block_id"],
+                    fields["text_block_page"] + 1,
+                    fields["text_block_coords"],
+                )
+            )
+
+    def search_result(self, validate: bool) -> SearchResult:
+        """Build the document's search result."""
+
+        source = self.source
+        return _build_model(
+            SearchResult,
+            validate,
+            document_name=source["document_name"],
+            document_geography=source["document_geography"],
+            document_sectors=source["document_sectors"],
+            document_source=source["document_source"],
+            document_date=source["document_date"],
+            document_id=source["document_id"],
+            document_slug=source["document_slug"],
+            document_description=source["document_description"],
+            document_type=source["document_type"],
+            document_category=source["document_category"],
+            document_source_url=source.get("document_source_url"),
+            document_url=to_cdn_url(source.get("document_cdn_object")),
+            document_content_type=source.get("document_content_type"),
+            document_title_match=self.title_match,
+            document_description_match=self.description_match,
+            document_passage_matches=[
+                _build_model(
+                    SearchResponseDocumentPassage,
+                    validate,
+                    text=text,
+                    text_block_id=text_block_id,
+                    text_block_page=text_block_page,
+                    text_block_coords=text_block_coords,
+                )
+                for text, text_block_id, text_block_page, text_block_coords in (
+                    self.passages
+                )
+            ],
+        )
+
+
 def process_search_response_body(
     opensearch_response_body: OpenSearchResponse,
     limit: int = 10,
     offset: int = 0,
+    document_keys: Optional[Sequence[str]] = None,
+    validate: bool = True,
 ) -> SearchResults:
+    """Build search results from an OpenSearch response.
+
+    If `document_keys` are given, documents are returned in that order rather than
+    the order of the response. If `validate` is False, the response is trusted and
+    each document's result is built once from its matches without validation.
+    """
     opensearch_json_response = opensearch_response_body.raw_response
     search_response = SearchResults(
         hits=opensearch_json_response["aggregations"]["no_unique_docs"]["value"],
         query_time_ms=opensearch_response_body.request_time_ms,
+        partial=opensearch_response_body.partial,
+        facets=process_facets(opensearch_json_response["aggregations"]["sample"]),
         documents=[],
     )
-    search_response_document = None
 
     result_docs = opensearch_json_response["aggregations"]["sample"]["top_docs"][
         "buckets"
     ]
+    if document_keys is not None:
+        result_docs_by_key = {doc["key"]: doc for doc in result_docs}
+        result_docs = [
+            result_docs_by_key[key]
+            for key in document_keys
+            if key in result_docs_by_key
+        ]
     for result_doc in result_docs[offset : offset + limit]:
+        document_matches = None
         for document_match in result_doc["top_passage_hits"]["hits"]["hits"]:
-            document_match_source = document_match["_source"]
-            if OPENSEARCH_INDEX_NAME_KEY in document_match_source:
-                # Validate as a title match
-                name_match = OpenSearchResponseNameMatch(**document_match_source)
-                if search_response_document is None:
-                    search_response_document = create_search_response_document(
-                        name_match
-                    )
-                search_response_document.document_title_match = True
-            elif OPENSEARCH_INDEX_DESCRIPTION_KEY in document_match_source:
-                # Validate as a description match
-                desc_match = OpenSearchResponseDescriptionMatch(**document_match_source)
-                if search_response_document is None:
-                    search_response_document = create_search_response_document(
-                        desc_match
-                    )
-                search_response_document.document_description_match = True
-            elif OPENSEARCH_INDEX_TEXT_BLOCK_KEY in document_match_source:
-                # Process as a text block
-                passage_match = OpenSearchResponsePassageMatch(**document_match_source)
-                if search_response_document is None:
-                    search_response_document = create_search_response_document(
-                        passage_match
-                    )
-
-                response_passage = SearchResponseDocumentPassage(
-                    text=passage_match.text,
-                    text_block_id=passage_match.text_block_id,
-                    text_block_page=passage_match.text_block_page + 1,
-                    text_block_coords=passage_match.text_block_coords,
-                )
-                search_response_document.document_passage_matches.append(
-                    response_passage
-                )
-            else:
-                raise RuntimeError("Unexpected data in match results")
+            match_type = _match_type(document_match["_source"])
+            fields = _match_fields(match_type, document_match["_source"], validate)
+            if document_matches is None:
+                document_matches = _DocumentMatches(fields)
+            document_matches.add(match_type, fields)
 
-        if search_response_document is None:
+        if document_matches is None:
             raise RuntimeError("Unexpected document match with no matching passages")
 
-        search_response.documents.append(search_response_document)
-        search_response_document = None
+        search_response.documents.append(document_matches.search_result(validate))
 
     return search_response
 
 
 def process_browse_response_body(
     opensearch_response_body: OpenSearchResponse,
+    validate: bool = True,
 ) -> SearchResults:
     opensearch_json_response = opensearch_response_body.raw_response
     search_response = SearchResults(
         hits=opensearch_json_response["hits"]["total"]["value"],
         query_time_ms=opensearch_response_body.request_time_ms,
+        facets=process_facets(opensearch_json_response.get("aggregations", {})),
         documents=[],
     )
 
     result_docs = opensearch_json_response["hits"]["hits"]
     for result_doc in result_docs:
-        search_response_document = create_search_response_document(
-            OpenSearchResponseDescriptionMatch(**result_doc["_source"])
+        fields = _match_fields(
+            OpenSearchResponseDescriptionMatch, result_doc["_source"], validate
+        )
+        search_response.documents.append(
+            _DocumentMatches(fields).search_result(validate)
         )
-        search_response.documents.append(search_response_document)
 
     return search_response
-
-
-def create_search_response_document(
-    opensearch_match: OpenSearchResponseMatchBase,
-):
-    return SearchResult(
-        document_name=opensearch_match.document_name,
-        document_description=opensearch_match.document_description,
-        document_geography=opensearch_match.document_geography,
-        document_sectors=opensearch_match.document_sectors,
-        document_source=opensearch_match.document_source,
-        document_date=opensearch_match.document_date,
-        document_id=opensearch_match.document_id,
-        document_type=opensearch_match.document_type,
-        document_category=opensearch_match.document_category,
-        document_source_url=opensearch_match.document_source_url,
-        document_url=to_cdn_url(opensearch_match.document_cdn_object),
-        document_content_type=opensearch_match.document_content_type,
-        document_slug=opensearch_match.document_slug,
-        document_title_match=False,
-        document_description_match=False,
-        document_passage_matches=[],
-    )
@@ -0,0 +1,505 @@
+"""Caching of search results in front of OpenSearch.
+
+Searches are cached under a canonical form of the request, so that requests which
+differ only in ways that cannot change their results (e.g. filter ordering, query
+case or punctuation) share a cache entry. Entries are stored alongside the index
+generation they were computed against, so that a reindex invalidates them.
+Identical searches made concurrently, before the first has been cached, are
+coalesced into a single search by `SingleFlight` & `AsyncSingleFlight`. The first
+pages of the most frequent searches can also be precomputed offline (see
+scripts/precompute_search_results) and served from `PrecomputedResults`.
+"""
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+import secrets
+import string
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Generic,
+    Iterable,
+    Mapping,
+    Optional,
+    Sequence,
+    TypeVar,
+)
+
+from app.api.api_v1.schemas.search import (
+    FilterField,
+    SearchRequestBody,
+    SearchResults,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+_PUNCTUATION_TRANSLATION = str.maketrans("", "", string.punctuation)
+# Query config fields limiting how long a search may take, which only change the
+# results of searches that are cut short (whose results are never cached)
+_SEARCH_LIMIT_FIELDS = {"timeout_ms", "terminate_after"}
+# File making up a snapshot of precomputed results
+_PRECOMPUTED_RESULTS_FILE = "results.json"
+
+V = TypeVar("V")
+
+
+def normalise_query_string(query_string: str) -> str:
+    """Normalise a query string the same way as OpenSearch analyses it."""
+    return " ".join(query_string.translate(_PUNCTUATION_TRANSLATION).lower().split())
+
+
+def canonical_search_request(
+    search_request_body: SearchRequestBody,
+    indices: str,
+    opensearch_internal_config: Any,
+) -> str:
+    """Get a canonical string identifying the results of a search request.
+
+    :param SearchRequestBody search_request_body: the search request
+    :param str indices: comma-separated indices the request is sent to
+    :param OpenSearchQueryConfig opensearch_internal_config: query configuration
+    :return str: a key that is equal for all requests with the same results
+    """
+    keyword_filters = {
+        field.value: sorted(set(values))
+        for field, values in (search_request_body.keyword_filters or {}).items()
+    }
+    canonical = {
+        "query_string": normalise_query_string(search_request_body.query_string),
+        "exact_match": search_request_body.exact_match,
+        "max_passages_per_doc": search_request_body.max_passages_per_doc,
+        "keyword_filters": keyword_filters,
+        "year_range": search_request_body.year_range,
+        "sort_field": search_request_body.sort_field,
+        "sort_order": search_request_body.sort_order,
+        "facets": sorted(set(search_request_body.facets or [])),
+        "limit": search_request_body.limit,
+        "offset": search_request_body.offset,
+        "indices": sorted(set(indices.split(","))),
+        "config": {
+            field: value
+            for field, value in dataclasses.asdict(opensearch_internal_config).items()
+            if field not in _SEARCH_LIMIT_FIELDS
+        },
+    }
+    return json.dumps(canonical, sort_keys=True, default=str)
+
+
+def canonical_result_set_request(
+    search_request_body: SearchRequestBody,
+    indices: str,
+    opensearch_internal_config: Any,
+) -> str:
+    """Get a canonical string identifying the ordered documents of a search.
+
+    Unlike `canonical_search_request` this is the same for every page of a search,
+    and for searches that differ only in the number of documents aggregated.
+    """
+    return canonical_search_request(
+        search_request_body.copy(update={"limit": 0, "offset": 0}),
+        indices,
+        dataclasses.replace(
+            opensearch_internal_config, max_doc_count=0, jit_max_doc_count=0
+        ),
+    )
+
+
+@dataclasses.dataclass(frozen=True)
+class SearchCursor:
+    """The ordered documents found by a search, used to serve further pages."""
+
+    request_key: str
+    document_keys: Sequence[str]
+    scores: Sequence[float]
+    hits: int
+    max_doc_count: int
+    facets: Optional[Mapping[FilterField, Mapping[str, int]]] = None
+    # The response the documents were found in with their passages, if kept to
+    # serve pages from without querying
+    response: Optional[Any] = None
+
+    @property
+    def is_complete(self) -> bool:
+        """Whether the cursor holds every document that a full search would return."""
+        return len(self.document_keys) < self.max_doc_count
+
+    def covers(self, offset: int, limit: int, max_doc_count: int) -> bool:
+        """Whether the cursor can serve the given page of a search."""
+        return (
+            offset + limit <= len(self.document_keys)
+            or self.is_complete
+            or self.max_doc_count >= max_doc_count
+        )
+
+
+def new_cursor_token() -> str:
+    """Create a new opaque cursor token."""
+    return secrets.token_urlsafe(16)
+
+
+@dataclasses.dataclass
+class _CacheEntry(Generic[V]):
+    expires_at: float
+    generation: str
+    value: V
+
+
+class TTLCache(Generic[V]):
+    """A thread-safe, size-bounded LRU cache whose entries expire after a TTL.
+
+    Each entry records the generation it was stored under, and is treated as a miss
+    when looked up with a different generation.
+    """
+
+    def __init__(self, max_size: int, ttl_s: float):
+        self._max_size = max_size
+        self._ttl_s = ttl_s
+        self._entries: OrderedDict[str, _CacheEntry[V]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, generation: str = "") -> Optional[V]:
+        """Get a value from the cache, or None if missing, expired or stale."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                is_fresh = entry.expires_at > time.monotonic()
+                if is_fresh and entry.generation == generation:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: V, generation: str = "") -> None:
+        """Store a value in the cache, evicting the least recently used if full."""
+
+        with self._lock:
+            self._entries[key] = _CacheEntry(
+                expires_at=time.monotonic() + self._ttl_s,
+                generation=generation,
+                value=value,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        """Get the number of entries in the cache, including expired ones."""
+        return len(self._entries)
+
+
+class SearchCursorStores:
+    """The stores of the cursors & result sets which serve further pages of searches.
+
+    A cursor is handed to the client, which requests further pages of the search
+    with it. A result set is the documents found by a recent search, kept (with
+    their passages, if found) to serve any request for a further page of the same
+    search. Either store is optional.
+    """
+
+    def __init__(
+        self,
+        cursor_store: Optional[TTLCache[SearchCursor]] = None,
+        result_set_store: Optional[TTLCache[SearchCursor]] = None,
+    ):
+        self.cursor_store = cursor_store
+        self.result_set_store = result_set_store
+
+    def page_cursor(
+        self,
+        cursor_token: Optional[str],
+        result_set_key: str,
+        index_generation: str,
+        offset: int,
+        limit: int,
+        max_doc_count: int,
+    ) -> Optional[SearchCursor]:
+        """Get the request's cursor, or a stored result set, that covers its page.
+
+        A result set with the passages of its documents is preferred, as it serves
+        the page without querying.
+        """
+
+        page = (offset, limit, max_doc_count)
+        result_set = (
+            None
+            if self.result_set_store is None
+            else self.result_set_store.get(result_set_key, index_generation)
+        )
+        if (
+            result_set is not None
+            and result_set.response is not None
+            and result_set.covers(*page)
+        ):
+            return result_set
+        for cursor in (
+            self._cursor(cursor_token, result_set_key, index_generation),
+            result_set,
+        ):
+            if cursor is not None and cursor.covers(*page):
+                return cursor
+        return None
+
+    def _cursor(
+        self, cursor_token: Optional[str], result_set_key: str, index_generation: str
+    ) -> Optional[SearchCursor]:
+        if self.cursor_store is None or cursor_token is None:
+            return None
+
+        cursor = self.cursor_store.get(cursor_token, index_generation)
+        if cursor is None or cursor.request_key != result_set_key:
+            return None
+        return cursor
+
+    def add_cursor(self, cursor: SearchCursor, index_generation: str) -> Optional[str]:
+        """Store a cursor, returning its token, or None if cursors are not kept."""
+
+        if self.cursor_store is None:
+            return None
+
+        cursor_token = new_cursor_token()
+        self.cursor_store.set(cursor_token, cursor, index_generation)
+        return cursor_token
+
+    def add_result_set(self, result_set: SearchCursor, index_generation: str) -> None:
+        """Store a result set, unless a more complete one is stored for its search."""
+
+        if self.result_set_store is None:
+            return
+
+        # e.g. a background search's result set is kept over a JIT search's
+        stored = self.result_set_store.get(result_set.request_key, index_generation)
+        if stored is not None and (
+            stored.max_doc_count,
+            stored.response is not None,
+        ) > (result_set.max_doc_count, result_set.response is not None):
+            return
+        self.result_set_store.set(result_set.request_key, result_set, index_generation)
+
+
+def _log_coalesced(hits: int, misses: int) -> None:
+    _LOGGER.info(
+        "Coalesced search with an identical search in flight",
+        extra={"props": {"coalesced_searches": hits, "searches": misses}},
+    )
+
+
+class SingleFlight(Generic[V]):
+    """Coalesces concurrent calls with the same key into a single call.
+
+    The first caller for a key makes the call, and callers arriving while it is in
+    flight wait for & share its result (or exception). `hits` counts the calls that
+    were coalesced, and `misses` the calls that were made.
+    """
+
+    def __init__(self):
+        self._flights: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def do(self, key: str, fn: Callable[[], V]) -> V:
+        """Call `fn`, or wait for the in-flight call with the same key."""
+
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if flight is None:
+                flight = self._flights[key] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+                _log_coalesced(self.hits, self.misses)
+
+        if not is_leader:
+            return flight.result()
+
+        try:
+            flight.set_result(fn())
+        except BaseException as e:
+            flight.set_exception(e)
+        finally:
+            with self._lock:
+                del self._flights[key]
+        return flight.result()
+
+    def __len__(self) -> int:
+        """Get the number of searches in flight."""
+        return len(self._flights)
+
+
+class AsyncSingleFlight(Generic[V]):
+    """Async version of `SingleFlight`, for callers on the same event loop.
+
+    The call is run as a task, so that it completes for the other callers if the
+    caller that started it is cancelled.
+    """
+
+    def __init__(self):
+        self._flights: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[V]]) -> V:
+        """Await `fn`, or wait for the in-flight call with the same key."""
+
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = asyncio.ensure_future(fn())
+            flight.add_done_callback(lambda _: self._flights.pop(key, None))
+            self.misses += 1
+        else:
+            self.hits += 1
+            _log_coalesced(self.hits, self.misses)
+        return await asyncio.shield(flight)
+
+    def __len__(self) -> int:
+        """Get the number of searches in flight."""
+        return len(self._flights)
+
+
+def logged_search_request(log_line: str) -> Optional[SearchRequestBody]:
+    """Get the search request from a search request log line, if it is one."""
+
+    try:
+        record = json.loads(log_line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict):
+        return None
+    # Log props are either merged into the record or nested under "props"
+    search_request = record.get("search_request") or (record.get("props") or {}).get(
+        "search_request"
+    )
+    if not isinstance(search_request, dict):
+        return None
+    try:
+        return SearchRequestBody.parse_obj(search_request)
+    except ValueError:
+        return None
+
+
+def top_search_requests(
+    search_requests: Iterable[SearchRequestBody],
+    n: int,
+    opensearch_internal_config: Any,
+) -> list[SearchRequestBody]:
+    """Get the `n` most frequent first-page search requests.
+
+    Requests are counted by their canonical form, so each of the requests returned
+    stands for every equivalent request made.
+    """
+
+    counts: Counter[str] = Counter()
+    requests_by_key: dict[str, SearchRequestBody] = {}
+    for search_request in search_requests:
+        if search_request.offset != 0 or search_request.cursor is not None:
+            continue
+        included_results = ",".join(
+            sorted(r.value for r in search_request.include_results or [])
+        )
+        key = canonical_search_request(
+            search_request, included_results, opensearch_internal_config
+        )
+        counts[key] += 1
+        requests_by_key.setdefault(key, search_request)
+    return [requests_by_key[key] for key, _ in counts.most_common(n)]
+
+
+class PrecomputedResults:
+    """Search results precomputed against an index generation, by canonical request.
+
+    Results are only served while the indices are at the generation they were
+    computed against, so are ignored once the indices are rebuilt.
+    """
+
+    def __init__(
+        self,
+        results: Mapping[str, SearchResults],
+        generation: str,
+        created_at: float,
+    ):
+        self.generation = generation
+        self.created_at = created_at
+        self._results = results
+
+    @classmethod
+    def load(cls, snapshot_path: str) -> "PrecomputedResults":
+        """Load precomputed results written by `write_precomputed_results`."""
+
+        with open(os.path.join(snapshot_path, _PRECOMPUTED_RESULTS_FILE), "r") as f:
+            snapshot = json.load(f)
+        precomputed = cls(
+            results={
+                entry["key"]: SearchResults.parse_obj(entry["results"])
+                for entry in snapshot["results"]
+            },
+            generation=snapshot["generation"],
+            created_at=snapshot["created_at"],
+        )
+        _LOGGER.info(
+            "Loaded precomputed search results",
+            extra={
+                "props": {
+                    "path": snapshot_path,
+                    "searches": len(precomputed),
+                    "generation": precomputed.generation,
+                    "age_s": round(time.time() - precomputed.created_at),
+                }
+            },
+        )
+        return precomputed
+
+    def get(self, key: str, generation: str) -> Optional[SearchResults]:
+        """Get the results for a canonical request, if precomputed & current."""
+
+        if generation != self.generation:
+            return None
+        return self._results.get(key)
+
+    def __len__(self) -> int:
+        """Get the number of searches with precomputed results."""
+        return len(self._results)
+
+
+def write_precomputed_results(
+    snapshot_path: str,
+    results: Mapping[str, SearchResults],
+    generation: str,
+) -> None:
+    """Write a snapshot of precomputed search results to disk.
+
+    Cursors are dropped, as they are only valid for the process that made them.
+    """
+
+    os.makedirs(snapshot_path, exist_ok=True)
+    snapshot = {
+        "generation": generation,
+        "created_at": time.time(),
+        "results": [
+            {
+                "key": key,
+                "results": json.loads(search_results.json(exclude={"cursor"})),
+            }
+            for key, search_results in results.items()
+        ],
+    }
+    with open(os.path.join(snapshot_path, _PRECOMPUTED_RESULTS_FILE), "w") as f:
+        json.dump(snapshot, f)
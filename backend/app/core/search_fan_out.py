@@ -0,0 +1,191 @@
+"""Fan-out searches, which search each index separately & merge their responses.
+
+Each index is sent its share of the documents to rank (`fan_out_request_body`), and
+the responses are merged as OpenSearch would have aggregated them had the indices
+been searched together (`merge_search_response_bodies`).
+"""
+import math
+from typing import Any, Callable, Mapping, Sequence
+
+from app.api.api_v1.schemas.search import SortOrder
+
+# Each index of a fan-out search returns its share of the documents scaled as
+# OpenSearch scales the documents requested from each shard of a terms aggregation
+_FAN_OUT_SIZE_FACTOR = 1.5
+_FAN_OUT_SIZE_MARGIN = 10
+
+
+def fan_out_request_body(
+    request_body: Mapping[str, Any], index_count: int
+) -> Mapping[str, Any]:
+    """Get the request body to send to each index of a fan-out search.
+
+    Rather than all of the documents to rank, each index only returns its share of
+    them with some to spare. Its shards are still asked for as many documents as
+    when searching every index at once, so the documents it returns are as accurate.
+    """
+
+    sample = request_body.get("aggs", {}).get("sample")
+    if sample is None:
+        return request_body
+
+    top_docs = sample["aggs"]["top_docs"]
+    size = top_docs["terms"]["size"]
+    index_size = min(
+        size,
+        math.ceil(size / index_count * _FAN_OUT_SIZE_FACTOR) + _FAN_OUT_SIZE_MARGIN,
+    )
+    shard_size = top_docs["terms"].get(
+        "shard_size", math.ceil(size * _FAN_OUT_SIZE_FACTOR) + _FAN_OUT_SIZE_MARGIN
+    )
+    return {
+        **request_body,
+        "aggs": {
+            **request_body["aggs"],
+            "sample": {
+                **sample,
+                "aggs": {
+                    **sample["aggs"],
+                    "top_docs": {
+                        **top_docs,
+                        "terms": {
+                            **top_docs["terms"],
+                            "size": index_size,
+                            "shard_size": shard_size,
+                        },
+                    },
+                },
+            },
+        },
+    }
+
+
+def _merge_stats(stats: Sequence[Mapping[str, Any]]) -> dict[str, Any]:
+    count = sum(s["count"] for s in stats)
+    total = sum(s["sum"] or 0 for s in stats)
+    mins = [s["min"] for s in stats if s["min"] is not None]
+    maxes = [s["max"] for s in stats if s["max"] is not None]
+    return {
+        "count": count,
+        "min": min(mins, default=None),
+        "max": max(maxes, default=None),
+        "avg": total / count if count else None,
+        "sum": total,
+    }
+
+
+def _merge_buckets(
+    buckets: Sequence[Mapping[str, Any]], bucket_aggs: Mapping[str, Any]
+) -> dict[str, Any]:
+    """Merge the buckets for a document, by the aggregations the request made."""
+
+    merged: dict[str, Any] = {
+        "key": buckets[0]["key"],
+        "doc_count": sum(b["doc_count"] for b in buckets),
+    }
+    for name, agg in bucket_aggs.items():
+        values = [b[name] for b in buckets if name in b]
+        if "max" in agg:
+            merged[name] = {"value": max(v["value"] for v in values)}
+        elif "stats" in agg and len(values) == len(buckets):
+            merged[name] = _merge_stats(values)
+        elif "top_hits" in agg:
+            hits = sorted(
+                (hit for v in values for hit in v["hits"]["hits"]),
+                key=lambda hit: hit.get("_score") or 0,
+                reverse=True,
+            )
+            merged[name] = {"hits": {"hits": hits[: agg["top_hits"]["size"]]}}
+    return merged
+
+
+def _merge_facet(facets: Sequence[Mapping[str, Any]]) -> dict[str, Any]:
+    # Counts are summed, so may count a document found in several indices twice
+    counts: dict[Any, int] = {}
+    for facet in facets:
+        for bucket in facet["buckets"]:
+            counts[bucket["key"]] = (
+                counts.get(bucket["key"], 0) + bucket["documents"]["value"]
+            )
+    return {
+        "buckets": [
+            {"key": key, "doc_count": count, "documents": {"value": count}}
+            for key, count in sorted(counts.items(), key=lambda kv: -kv[1])
+        ]
+    }
+
+
+def _bucket_sort_key(order_field: str) -> Callable[[Mapping[str, Any]], Any]:
+    if order_field == "_key":
+        return lambda bucket: bucket["key"]
+    if order_field == "top_hit":
+        return lambda bucket: bucket["top_hit"]["value"]
+    # Stats ordering, e.g. "document_date.avg"
+    agg_name, _, stat = order_field.rpartition(".")
+    return lambda bucket: bucket[agg_name][stat]
+
+
+def _sort_buckets(
+    buckets: Sequence[Mapping[str, Any]], order_field: str, order: str
+) -> list[Mapping[str, Any]]:
+    """Order buckets by a field, as OpenSearch orders the terms of an aggregation.
+
+    Buckets without a value for the field, e.g. documents without a date, are last
+    in either direction.
+    """
+
+    sort_key = _bucket_sort_key(order_field)
+    with_value = [b for b in buckets if sort_key(b) is not None]
+    without_value = [b for b in buckets if sort_key(b) is None]
+    with_value.sort(key=sort_key, reverse=order == SortOrder.DESCENDING.value)
+    return with_value + without_value
+
+
+def merge_search_response_bodies(
+    request_body: Mapping[str, Any], response_bodies: Sequence[Mapping[str, Any]]
+) -> dict[str, Any]:
+    """Merge the responses to a search request sent separately to each index.
+
+    Buckets for the same document are merged as OpenSearch would have aggregated
+    them had the indices been searched together: the document score is the best
+    score of its passages, and the best scoring passages are kept. The merged
+    buckets are then ordered & limited as the request specifies. The count of unique
+    documents and facet counts are approximate, as a document can be found in several
+    indices.
+    """
+
+    sample_aggs = request_body["aggs"]["sample"]["aggs"]
+    top_docs_request = sample_aggs["top_docs"]
+    max_doc_count = top_docs_request["terms"]["size"]
+    ((order_field, order),) = top_docs_request["terms"]["order"].items()
+
+    buckets_by_key: dict[str, list[Mapping[str, Any]]] = {}
+    for response_body in response_bodies:
+        aggregations = response_body["aggregations"]
+        for bucket in aggregations["sample"]["top_docs"]["buckets"]:
+            buckets_by_key.setdefault(bucket["key"], []).append(bucket)
+
+    buckets = [
+        _merge_buckets(key_buckets, top_docs_request["aggs"])
+        for key_buckets in buckets_by_key.values()
+    ]
+    buckets = _sort_buckets(buckets, order_field, order)
+    unique_docs = max(
+        (b["aggregations"]["no_unique_docs"]["value"] for b in response_bodies),
+        default=0,
+    )
+    sample: dict[str, Any] = {"top_docs": {"buckets": buckets[:max_doc_count]}}
+    # The other aggregations of the sample are the facets
+    for name in sample_aggs:
+        if name != "top_docs":
+            sample[name] = _merge_facet(
+                [b["aggregations"]["sample"][name] for b in response_bodies]
+            )
+
+    return {
+        "took": max((b.get("took", 0) for b in response_bodies), default=0),
+        "aggregations": {
+            "no_unique_docs": {"value": max(unique_docs, len(buckets))},
+            "sample": sample,
+        },
+    }
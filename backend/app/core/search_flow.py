@@ -0,0 +1,102 @@
+"""The query flow shared by the sync & async OpenSearch connections.
+
+A query is written once, as a generator (an `Operation`) which yields the steps it
+needs run, e.g. a search or a CPU-bound computation, and is sent their results.
+Each connection runs the steps with its own client: the sync connection by `run`,
+the async connection by `run_async`, which runs `ComputeStep`s in the threadpool.
+"""
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Generator, Optional, TypeVar, Union
+
+from app.core.search_cache import AsyncSingleFlight, SingleFlight
+
+T = TypeVar("T")
+# A query flow: a generator which yields the steps it needs run (`SearchStep` etc.),
+# and is sent their results
+Operation = Generator[Any, Any, T]
+Flights = Union[SingleFlight[Any], AsyncSingleFlight[Any]]
+
+
+@dataclass(frozen=True)
+class SearchStep:
+    """Make a search query, resulting in its `OpenSearchResponse`."""
+
+    # A `SearchRequest`, limited by an `OpenSearchQueryConfig` (see app.core.search)
+    request_body: Any
+    preference: Optional[str]
+    indices: str
+    query_config: Any
+
+
+@dataclass(frozen=True)
+class ComputeStep:
+    """Call a CPU-bound function, which the async connection runs in the threadpool."""
+
+    function: Callable[..., Any]
+    args: tuple[Any, ...]
+
+
+@dataclass(frozen=True)
+class ScanBrowseIndexStep:
+    """Scan the core index for the browse index, resulting in the hits."""
+
+
+@dataclass(frozen=True)
+class CoalesceStep:
+    """Run an operation, waiting for & sharing the result of one in flight."""
+
+    flights: Flights
+    key: str
+    operation: Callable[[], Operation[Any]]
+
+
+def coalesced(
+    flights: Optional[Flights],
+    key: Optional[str],
+    operation: Callable[[], Operation[T]],
+) -> Operation[T]:
+    """Run an operation, coalescing it with identical ones if configured."""
+
+    if flights is None or key is None:
+        return (yield from operation())
+    return (yield CoalesceStep(flights, key, operation))
+
+
+def run(operation: Operation[T], run_step: Callable[[Any], Any]) -> T:
+    """Run a query flow, running each step it yields with `run_step`.
+
+    An exception raised by a step is thrown into the flow, which may handle it.
+    """
+
+    send: Callable[[Any], Any] = operation.send
+    result: Any = None
+    while True:
+        try:
+            step = send(result)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            result, send = run_step(step), operation.send
+        except Exception as e:
+            result, send = e, operation.throw
+
+
+async def run_async(
+    operation: Operation[T], run_step: Callable[[Any], Awaitable[Any]]
+) -> T:
+    """Run a query flow, awaiting each step it yields with `run_step`.
+
+    See `run`.
+    """
+
+    send: Callable[[Any], Any] = operation.send
+    result: Any = None
+    while True:
+        try:
+            step = send(result)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            result, send = await run_step(step), operation.send
+        except Exception as e:
+            result, send = e, operation.throw
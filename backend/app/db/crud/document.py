@@ -1,12 +1,18 @@
+import json
 import logging
+import select
+import threading
+import time
 from hashlib import md5
-from typing import Mapping, Sequence, Set, Tuple, Union, cast
+from typing import Any, Callable, Mapping, Optional, Sequence, Set, Tuple, Union, cast
 
 from fastapi import (
     HTTPException,
 )
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from slugify import slugify
-from sqlalchemy import extract
+from sqlalchemy import extract, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
@@ -33,6 +39,7 @@ from app.api.api_v1.schemas.metadata import (
     Topic as TopicSchema,
 )
 from app.core.aws import S3Client
+from app.core.config import DOCUMENT_POSTFIX_REFRESH_INTERVAL_S
 from app.core.util import to_cdn_url
 from app.core.validation import IMPORT_ID_MATCHER
 from app.core.validation.util import write_documents_to_s3
@@ -60,9 +67,17 @@ from app.db.models import (
     Source,
     DocumentType,
 )
+from app.db.session import DbOpener
 
 _LOGGER = logging.getLogger(__file__)
 
+# Postgres channel on which changes to document postfixes are notified
+_POSTFIX_CHANNEL = "document_postfixes"
+# Postgres rejects notification payloads of 8000 bytes or more
+_POSTFIX_NOTIFY_MAX_BYTES = 8000
+_POSTFIX_LISTEN_CHECK_S = 60
+_POSTFIX_LISTEN_RETRY_S = 5
+
 
 class UnknownMetadataError(Exception):
     """Base class for metadata lookup errors."""
@@ -658,6 +673,7 @@ def start_import(
             raise HTTPException(409, detail="Document already exists")
         raise e
 
+    notify_postfix_changes(db, {d.import_id: d.postfix for d in document_parser_inputs})
     write_documents_to_s3(s3_client=s3_client, documents=document_parser_inputs)
 
 
@@ -800,3 +816,190 @@ def get_postfix_map(db: Session, doc_ids: list[str]) -> Mapping[str, str]:
         postfix_map.update({missing_id: "" for missing_id in missing_ids})
 
     return postfix_map
+
+
+class DocumentPostfixIndex:
+    """The postfixes of all documents by import id, held in memory by a process.
+
+    The postfixes are loaded in the background when first requested, then reloaded
+    (while the loaded ones are still served) once they are older than
+    `refresh_interval_s` seconds. In between, the changes notified by
+    `notify_postfix_changes` are applied as they are received by `listen`, if it
+    is running. Documents missing from the loaded postfixes (including all of them
+    until they are first loaded) are looked up in the database each time they are
+    requested, until the postfixes are reloaded.
+    """
+
+    def __init__(self, refresh_interval_s: float):
+        self._refresh_interval_s = refresh_interval_s
+        self._postfixes: dict[str, str] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        # Changes made while reloading, to apply to the reloaded postfixes
+        self._reload_changes: Optional[dict[str, str]] = None
+
+    def _is_current(self) -> bool:
+        return (
+            self._loaded_at is not None
+            and time.monotonic() - self._loaded_at < self._refresh_interval_s
+        )
+
+    def _start_reload(self) -> bool:
+        # Only one reload at a time
+        with self._lock:
+            if self._reload_changes is not None:
+                return False
+            self._reload_changes = {}
+            return True
+
+    def _reload(self, open_db: DbOpener) -> None:
+        try:
+            with open_db() as db:
+                rows = db.query(Document.import_id, Document.postfix).all()
+        except Exception:
+            _LOGGER.exception("Could not reload document postfixes")
+            with self._lock:
+                self._reload_changes = None
+            return
+
+        postfixes = {doc_id: postfix if postfix else "" for doc_id, postfix in rows}
+        with self._lock:
+            postfixes.update(self._reload_changes or {})
+            self._postfixes = postfixes
+            self._loaded_at = time.monotonic()
+            self._reload_changes = None
+
+    def get(self, open_db: DbOpener, doc_ids: list[str]) -> Mapping[str, str]:
+        """Get the postfixes of documents, as `get_postfix_map`.
+
+        :param DbOpener open_db: opens a database session, which is only done to
+            load the postfixes or look up documents missing from them
+        :param list[str] doc_ids: the import ids of the documents
+        :return Mapping[str, str]: the postfix of each document
+        """
+
+        if not self._is_current() and self._start_reload():
+            threading.Thread(
+                target=self._reload,
+                args=(open_db,),
+                name="document-postfix-reload",
+                daemon=True,
+            ).start()
+
+        postfixes = self._postfixes
+        postfix_map = {
+            doc_id: postfixes[doc_id] for doc_id in doc_ids if doc_id in postfixes
+        }
+        missing_ids = [doc_id for doc_id in doc_ids if doc_id not in postfix_map]
+        if missing_ids:
+            with open_db() as db:
+                postfix_map.update(get_postfix_map(db, missing_ids))
+
+        return postfix_map
+
+    def update(self, postfixes: Mapping[str, Optional[str]]) -> None:
+        """Update the postfixes of documents which have changed."""
+
+        changes = {
+            doc_id: postfix if postfix else "" for doc_id, postfix in postfixes.items()
+        }
+        with self._lock:
+            self._postfixes.update(changes)
+            if self._reload_changes is not None:
+                self._reload_changes.update(changes)
+
+    def invalidate(self) -> None:
+        """Reload the postfixes when they are next requested, e.g. as changed."""
+
+        with self._lock:
+            if self._loaded_at is not None:
+                self._loaded_at -= self._refresh_interval_s
+
+    def listen(self, connect: Callable[[], Any]) -> None:
+        """Apply the changes notified by `notify_postfix_changes`, forever.
+
+        The postfixes are reloaded whenever notifications may have been missed, i.e.
+        after (re)connecting, or when the changes were too large to notify.
+
+        :param Callable[[], Any] connect: opens a psycopg2 connection to listen on
+        """
+
+        while True:
+            try:
+                connection = connect()
+                try:
+                    self._listen(connection)
+                finally:
+                    connection.close()
+            except Exception:
+                _LOGGER.exception("Stopped listening for document postfix changes")
+            time.sleep(_POSTFIX_LISTEN_RETRY_S)
+
+    def _listen(self, connection: Any) -> None:
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {_POSTFIX_CHANNEL}")
+        self.invalidate()
+        _LOGGER.info("Listening for document postfix changes")
+
+        while True:
+            if select.select([connection], [], [], _POSTFIX_LISTEN_CHECK_S)[0]:
+                connection.poll()
+            else:
+                # Check that the connection is still alive, as a dead one is quiet
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            while connection.notifies:
+                payload = connection.notifies.pop(0).payload
+                if payload:
+                    self.update(json.loads(payload))
+                else:
+                    self.invalidate()
+
+
+_DOCUMENT_POSTFIXES = DocumentPostfixIndex(DOCUMENT_POSTFIX_REFRESH_INTERVAL_S)
+
+
+def get_cached_postfix_map(open_db: DbOpener, doc_ids: list[str]) -> Mapping[str, str]:
+    """Get the postfixes of documents, from the database only when not yet known."""
+
+    return _DOCUMENT_POSTFIXES.get(open_db, doc_ids)
+
+
+def notify_postfix_changes(db: Session, postfixes: Mapping[str, Optional[str]]) -> None:
+    """Notify the postfix index of every process of documents created or updated.
+
+    This process' index is updated immediately, and others once the notification
+    is committed.
+    """
+
+    payload = json.dumps(postfixes)
+    if len(payload.encode()) >= _POSTFIX_NOTIFY_MAX_BYTES:
+        # Too many changes to notify, so indices reload all postfixes instead
+        payload = ""
+    db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": _POSTFIX_CHANNEL, "payload": payload},
+    )
+    db.commit()
+    _DOCUMENT_POSTFIXES.update(postfixes)
+
+
+def listen_for_postfix_changes(engine: Engine) -> None:
+    """Apply postfix changes notified by any process to this process' index.
+
+    Changes are listened for in a background thread, on a connection of its own.
+    """
+
+    def connect() -> Any:
+        connection = engine.raw_connection()
+        # The connection is held for as long as the process lives
+        connection.detach()
+        return connection.connection
+
+    threading.Thread(
+        target=_DOCUMENT_POSTFIXES.listen,
+        args=(connect,),
+        name="document-postfix-listener",
+        daemon=True,
+    ).start()
@@ -1,6 +1,9 @@
+from contextlib import contextmanager
+from typing import Callable, ContextManager, Iterator
+
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
 from app.core import config
 
@@ -12,6 +15,8 @@ engine = create_engine(
     max_overflow=240,
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Opens a database session for the duration of a with block
+DbOpener = Callable[[], ContextManager[Session]]
 
 
 def make_declarative_base():
@@ -48,6 +53,21 @@ def get_db():
         db.close()
 
 
+@contextmanager
+def open_db() -> Iterator[Session]:
+    """Open a database session, closing it at the end of the with block."""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Dependency, for routes which only use the database when their caches are stale
+def get_db_opener() -> DbOpener:
+    return open_db
+
+
 # TODO: Update to async db connection
 # https://fastapi.tiangolo.com/advanced/async-sql-databases/
 # async def get_session() -> AsyncSession:
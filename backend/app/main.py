@@ -8,8 +8,10 @@ from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_health import health
 from fastapi_pagination import add_pagination
+from prometheus_client import REGISTRY, CollectorRegistry, make_asgi_app, multiprocess
 from slowapi.errors import RateLimitExceeded
 from slowapi.extension import _rate_limit_exceeded_handler
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
 from alembic.command import upgrade
 from alembic.config import Config
@@ -23,7 +25,8 @@ from app.api.api_v1.routers.unauthenticated import unauthenticated_router
 from app.api.api_v1.routers.summaries import summary_router
 from app.core import config
 from app.core.auth import get_current_active_superuser
-from app.core.health import is_database_online
+from app.core.encoder import get_encoder, warmup_encoder
+from app.core.health import is_database_online, is_encoder_ready
 from app.core.ratelimit import limiter
 from app.db.session import SessionLocal
 
@@ -89,7 +92,17 @@ app.add_middleware(
 )
 
 # add health endpoint
-app.add_api_route("/health", health([is_database_online]))
+app.add_api_route("/health", health([is_database_online, is_encoder_ready]))
+
+# add Prometheus metrics endpoint, collecting the metrics of every worker process
+# when they share a PROMETHEUS_MULTIPROC_DIR (otherwise each scrape only sees the
+# metrics of the worker that served it)
+if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+    _metrics_registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(_metrics_registry)
+else:
+    _metrics_registry = REGISTRY
+app.mount("/metrics", make_asgi_app(_metrics_registry))
 
 
 @app.middleware("http")
@@ -134,6 +147,8 @@ app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 @app.on_event("startup")
 async def startup() -> None:
     upgrade(Config("./alembic.ini"), "head")
+    if config.OPENSEARCH_INDEX_ENCODER_WARMUP:
+        await run_in_threadpool(warmup_encoder, get_encoder())
 
 
 if __name__ == "__main__":
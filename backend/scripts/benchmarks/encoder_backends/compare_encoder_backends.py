@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import INDEX_ENCODER_CACHE_FOLDER, OPENSEARCH_INDEX_ENCODER
+from app.core.encoder import ENCODER_BACKENDS, LocalSentenceEncoder, SentenceEncoder
+
+_PASSAGES_PATH = (
+    Path(__file__).parents[3] / "tests/data/navigator_test_pdfs_non_translated.json"
+)
+_QUERIES = [
+    "climate change",
+    "adaptation",
+    "mitigation",
+    "carbon tax",
+    "renewable energy targets",
+    "net zero by 2050",
+    "deforestation",
+    "flood risk management",
+    "drought resilience in agriculture",
+    "electric vehicles",
+    "just transition",
+    "green hydrogen strategy",
+    "coal phase out",
+    "methane emissions from livestock",
+    "sea level rise",
+    "disaster risk reduction",
+    "energy efficiency in buildings",
+    "emissions trading scheme",
+    "kenya",
+    "spain",
+]
+
+
+def load_passages(max_passages: int) -> list[str]:
+    passages = []
+    with open(_PASSAGES_PATH) as f:
+        for line in f:
+            text = json.loads(line)["_source"].get("text")
+            if text:
+                passages.append(text)
+            if len(passages) >= max_passages:
+                break
+    return passages
+
+
+def time_encodes(encoder: SentenceEncoder, queries: list[str]) -> np.ndarray:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        encoder.encode(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def top_k(query_embeddings: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    scores = query_embeddings @ corpus.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def cosine_similarity(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.sum(a * b, axis=1) / (
+        np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", choices=ENCODER_BACKENDS, default="int8")
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--queries", help="File of extra queries, one per line")
+    parser.add_argument("--max-passages", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--min-recall", type=float, default=0.9)
+    args = parser.parse_args()
+
+    queries = list(_QUERIES)
+    if args.queries:
+        with open(args.queries) as f:
+            queries.extend(line.strip() for line in f if line.strip())
+
+    reference = LocalSentenceEncoder(
+        OPENSEARCH_INDEX_ENCODER, INDEX_ENCODER_CACHE_FOLDER, num_threads=args.threads
+    )
+    candidate = LocalSentenceEncoder(
+        OPENSEARCH_INDEX_ENCODER,
+        INDEX_ENCODER_CACHE_FOLDER,
+        backend=args.backend,
+        num_threads=args.threads,
+    )
+    reference.warmup()
+    candidate.warmup()
+
+    print(f"Encoding {args.max_passages} passages with the fp32 backend...")
+    corpus = reference.encode_batch(load_passages(args.max_passages))
+
+    reference_latency = time_encodes(reference, queries)
+    candidate_latency = time_encodes(candidate, queries)
+    reference_embeddings = reference.encode_batch(queries)
+    candidate_embeddings = candidate.encode_batch(queries)
+
+    cosine = cosine_similarity(reference_embeddings, candidate_embeddings)
+    expected = top_k(reference_embeddings, corpus, args.k)
+    actual = top_k(candidate_embeddings, corpus, args.k)
+    recall = np.mean([len(set(e) & set(a)) / args.k for e, a in zip(expected, actual)])
+
+    for name, latency in [
+        ("fp32", reference_latency),
+        (args.backend, candidate_latency),
+    ]:
+        print(
+            f"{name:>5}: mean {latency.mean():.2f} ms, "
+            f"p95 {np.percentile(latency, 95):.2f} ms"
+        )
+    print(
+        f"Cosine similarity to fp32: mean {cosine.mean():.4f}, "
+        f"min {cosine.min():.4f}"
+    )
+    print(f"Recall@{args.k} against fp32: {recall:.3f}")
+
+    if cosine.mean() < args.min_cosine or recall < args.min_recall:
+        print("Backend drifts too far from fp32")
+        sys.exit(1)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.core.config import INDEX_ENCODER_CACHE_FOLDER, OPENSEARCH_INDEX_ENCODER
+from app.core.encoder import (
+    BatchingSentenceEncoder,
+    LocalSentenceEncoder,
+    SentenceEncoder,
+)
+
+_QUERY_TERMS = [
+    "climate",
+    "adaptation",
+    "mitigation",
+    "flood",
+    "drought",
+    "renewable energy",
+    "carbon tax",
+    "emissions",
+    "forestry",
+    "agriculture",
+    "transport",
+    "coastal",
+]
+
+
+def make_queries(n_queries: int) -> list[str]:
+    return [
+        f"{_QUERY_TERMS[i % len(_QUERY_TERMS)]} policy {i}" for i in range(n_queries)
+    ]
+
+
+def run(encoder: SentenceEncoder, queries: list[str], concurrency: int):
+    def timed_encode(query: str) -> float:
+        start = time.perf_counter()
+        encoder.encode(query)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = np.array(list(executor.map(timed_encode, queries))) * 1000
+    elapsed = time.perf_counter() - start
+
+    return (
+        len(queries) / elapsed,
+        np.percentile(latencies, 50),
+        np.percentile(latencies, 95),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+
+    model_encoder = LocalSentenceEncoder(
+        OPENSEARCH_INDEX_ENCODER, INDEX_ENCODER_CACHE_FOLDER
+    )
+    model_encoder.warmup()
+    batching_encoder = BatchingSentenceEncoder(
+        model_encoder, window_ms=args.window_ms, max_batch_size=args.max_batch_size
+    )
+    queries = make_queries(args.requests)
+
+    print(
+        f"{'concurrency':>11} | {'mode':>9} | {'encodes/s':>9} | "
+        f"{'p50 ms':>8} | {'p95 ms':>8} | {'p95 added ms':>12}"
+    )
+    for concurrency in args.concurrency:
+        base_rate, base_p50, base_p95 = run(model_encoder, queries, concurrency)
+        rate, p50, p95 = run(batching_encoder, queries, concurrency)
+        print(
+            f"{concurrency:>11} | {'unbatched':>9} | {base_rate:>9.1f} | "
+            f"{base_p50:>8.2f} | {base_p95:>8.2f} | {'':>12}"
+        )
+        print(
+            f"{concurrency:>11} | {'batched':>9} | {rate:>9.1f} | "
+            f"{p50:>8.2f} | {p95:>8.2f} | {p95 - base_p95:>12.2f}"
+        )
+
+    print(
+        f"Mean batch size: "
+        f"{batching_encoder.batched_texts / max(batching_encoder.batches, 1):.1f}"
+    )
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import argparse
+import timeit
+
+import numpy as np
+
+import app.core.search
+from app.api.api_v1.schemas.search import FilterField, SearchRequestBody, SortField
+from app.core.encoder import SentenceEncoder
+from app.core.search import (
+    _JSON_SERIALIZER,
+    build_opensearch_request_body,
+    dumps_template_param,
+)
+
+_REQUESTS = {
+    "semantic": dict(query_string="forest fires", exact_match=False),
+    "exact": dict(query_string="forest fires", exact_match=True),
+    "semantic, filtered & sorted": dict(
+        query_string="forest fires",
+        exact_match=False,
+        keyword_filters={FilterField.COUNTRY: ["KEN", "GBR"]},
+        year_range=(2010, 2020),
+        sort_field=SortField.DATE,
+    ),
+    "browse": dict(query_string="", exact_match=False, limit=10, offset=20),
+}
+
+
+class FixedEncoder(SentenceEncoder):
+    """Returns the same embedding for every query, to exclude encoding time."""
+
+    def __init__(self, dim: int):
+        self._embedding = np.random.default_rng(0).random(dim, dtype=np.float32)
+
+    @property
+    def is_ready(self) -> bool:
+        """Override"""
+        return True
+
+    def warmup(self) -> None:
+        """Override"""
+        pass
+
+    def encode_batch(self, texts):
+        """Override"""
+        return np.tile(self._embedding, (len(texts), 1))
+
+
+def build(request: dict) -> str:
+    builder = build_opensearch_request_body(SearchRequestBody(**request))
+    return _JSON_SERIALIZER.dumps(builder.query)
+
+
+def build_from_template(request: dict) -> str:
+    builder = build_opensearch_request_body(
+        SearchRequestBody(**request), use_templates=True
+    )
+    query = builder.query
+    return query.template.render(query.params, dumps_template_param)
+
+
+def build_stored_template_request(request: dict) -> str:
+    builder = build_opensearch_request_body(
+        SearchRequestBody(**request), use_templates=True
+    )
+    query = builder.query
+    return _JSON_SERIALIZER.dumps({"id": query.template.id, "params": query.params})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--embedding-dim", type=int, default=768)
+    args = parser.parse_args()
+
+    encoder = FixedEncoder(args.embedding_dim)
+    app.core.search.get_encoder = lambda: encoder  # type: ignore
+
+    print(f"{'request':>28} | {'build us':>9} | {'template us':>11} | {'stored us':>9}")
+    for name, request in _REQUESTS.items():
+        times = [
+            timeit.timeit(lambda: f(request), number=args.number) / args.number * 1e6
+            for f in (build, build_from_template, build_stored_template_request)
+        ]
+        print(f"{name:>28} | {times[0]:>9.1f} | {times[1]:>11.1f} | {times[2]:>9.1f}")
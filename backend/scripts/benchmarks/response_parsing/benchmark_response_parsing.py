@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import timeit
+from collections import defaultdict
+
+from opensearchpy.serializer import JSONSerializer
+
+from app.api.api_v1.routers.search import encode_search_results
+from app.api.api_v1.schemas.search import SearchResultResponse, SearchResultsResponse
+from app.core.search import (
+    OpenSearchJSONSerializer,
+    OpenSearchResponse,
+    process_search_response_body,
+)
+
+_TEST_DATA = "tests/data/navigator_test_pdfs_non_translated.json"
+
+
+def build_response_body(max_docs: int, max_passages: int) -> str:
+    passages_by_doc = defaultdict(list)
+    with open(_TEST_DATA) as f:
+        for line in f:
+            source = json.loads(line)["_source"]
+            source.pop("text_embedding", None)
+            passages = passages_by_doc[source["document_name_and_slug"]]
+            if len(passages) < max_passages:
+                passages.append({"_source": source})
+
+    buckets = [
+        {
+            "key": key,
+            "top_hit": {"value": 1.0},
+            "top_passage_hits": {"hits": {"hits": passages}},
+        }
+        for key, passages in list(passages_by_doc.items())[:max_docs]
+    ]
+    return json.dumps(
+        {
+            "took": 10,
+            "aggregations": {
+                "no_unique_docs": {"value": len(buckets)},
+                "sample": {"top_docs": {"buckets": buckets}},
+            },
+        }
+    )
+
+
+def parse(body: str, serializer: JSONSerializer, limit: int, validate: bool):
+    response = OpenSearchResponse(
+        raw_response=serializer.loads(body), request_time_ms=0
+    )
+    results = process_search_response_body(response, limit=limit, validate=validate)
+    postfix_map = {doc.document_id: "" for doc in results.documents}
+    if validate:
+        return SearchResultsResponse(
+            hits=results.hits,
+            query_time_ms=results.query_time_ms,
+            documents=[
+                SearchResultResponse(
+                    **doc.dict(), document_postfix=postfix_map[doc.document_id]
+                )
+                for doc in results.documents
+            ],
+        ).json()
+    return encode_search_results(results, postfix_map)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--passages", type=int, default=10)
+    parser.add_argument("--number", type=int, default=50)
+    args = parser.parse_args()
+
+    body = build_response_body(args.docs, args.passages)
+    print(f"Response body of {len(body) / 1024:.0f} KiB")
+
+    runs = [
+        ("json, validated", JSONSerializer(), True),
+        ("orjson, validated", OpenSearchJSONSerializer(), True),
+        ("orjson, fast", OpenSearchJSONSerializer(), False),
+    ]
+    for name, serializer, validate in runs:
+        seconds = timeit.timeit(
+            lambda: parse(body, serializer, args.docs, validate), number=args.number
+        )
+        print(f"{name:>18}: {seconds / args.number * 1e3:.2f} ms per response")
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+import argparse
+import timeit
+
+from app.core.search import SensitiveQueryTermMatcher, load_sensitive_query_terms
+
+_QUERIES = [
+    "climate",
+    "spain",
+    "clean energy strategy",
+    "spanish ghg emissions",
+    "indigenous peoples rights in forest governance",
+    "national adaptation plan for coastal communities and small island states",
+    "gender equality in climate finance",
+]
+
+
+def substring_loop(terms: set[str], query_string: str) -> list[str]:
+    return [term for term in terms if term in query_string.lower()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=1000)
+    args = parser.parse_args()
+
+    terms = load_sensitive_query_terms()
+    matcher = SensitiveQueryTermMatcher(reload_interval_s=0)
+    print(f"{len(terms)} sensitive terms")
+    print(f"{'query':>72} | {'loop us':>9} | {'matcher us':>10}")
+    for query in _QUERIES:
+        loop_s = timeit.timeit(lambda: substring_loop(terms, query), number=args.number)
+        matcher_s = timeit.timeit(lambda: matcher.find(query), number=args.number)
+        print(
+            f"{query:>72} | {loop_s / args.number * 1e6:>9.2f} | "
+            f"{matcher_s / args.number * 1e6:>10.2f}"
+        )
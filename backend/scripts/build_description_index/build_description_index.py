@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+import sys
+
+from opensearchpy import OpenSearch
+from opensearchpy.helpers import scan
+
+from app.core.config import (
+    OPENSEARCH_INDEX_DESCRIPTION_EMBEDDING_KEY,
+    OPENSEARCH_INDEX_DESCRIPTION_KEY,
+    OPENSEARCH_INDEX_INDEX_KEY,
+    OPENSEARCH_INDEX_PREFIX,
+    OPENSEARCH_PASSWORD,
+    OPENSEARCH_URL,
+    OPENSEARCH_USERNAME,
+    OPENSEARCH_USE_SSL,
+    OPENSEARCH_VERIFY_CERTS,
+)
+from app.core.description_index import write_description_index
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Require an output directory")
+        sys.exit(1)
+
+    opensearch = OpenSearch(
+        hosts=OPENSEARCH_URL.split(","),
+        http_auth=(OPENSEARCH_USERNAME, OPENSEARCH_PASSWORD),
+        use_ssl=OPENSEARCH_USE_SSL,
+        verify_certs=OPENSEARCH_VERIFY_CERTS,
+    )
+    index = f"{OPENSEARCH_INDEX_PREFIX}_core"
+
+    # The generation of the index as the search API determines it, so that the
+    # snapshot is only searched until the index is rebuilt
+    (index_stats,) = opensearch.cat.indices(
+        index=index, format="json", h="index,uuid,docs.count"
+    )
+    generation = (
+        f"{index_stats['index']}:{index_stats['uuid']}:{index_stats['docs.count']}"
+    )
+
+    document_keys = []
+    documents = []
+    embeddings = []
+    print(f"Reading description embeddings from {index} ({generation})...")
+    # Description entries are the ones with a description embedding
+    query = {
+        "query": {
+            "bool": {
+                "filter": [
+                    {"exists": {"field": OPENSEARCH_INDEX_DESCRIPTION_KEY}},
+                    {"exists": {"field": OPENSEARCH_INDEX_DESCRIPTION_EMBEDDING_KEY}},
+                ]
+            }
+        }
+    }
+    for hit in scan(opensearch, index=index, query=query):
+        source = hit["_source"]
+        document_keys.append(source[OPENSEARCH_INDEX_INDEX_KEY])
+        embeddings.append(source.pop(OPENSEARCH_INDEX_DESCRIPTION_EMBEDDING_KEY))
+        documents.append(source)
+
+    write_description_index(
+        sys.argv[1], document_keys, documents, embeddings, generation
+    )
+    print(f"Wrote {len(documents)} descriptions to {sys.argv[1]}")
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+
+import sys
+
+from app.core.config import INDEX_ENCODER_CACHE_FOLDER, OPENSEARCH_INDEX_ENCODER
+from app.core.encoder import LocalSentenceEncoder, write_embedding_store
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Require a queries file and an output directory")
+        sys.exit(1)
+
+    with open(sys.argv[1]) as queries_file:
+        queries = [line.strip() for line in queries_file if line.strip()]
+
+    print(f"Encoding {len(queries)} queries...")
+    encoder = LocalSentenceEncoder(OPENSEARCH_INDEX_ENCODER, INDEX_ENCODER_CACHE_FOLDER)
+    write_embedding_store(sys.argv[2], queries, encoder)
+    print(f"Wrote query embedding store to {sys.argv[2]}")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+import fileinput
+import sys
+from typing import Iterable, Mapping
+
+from app.api.api_v1.routers.search import process_search_keyword_filters
+from app.api.api_v1.schemas.search import SearchRequestBody, SearchResults
+from app.core.search import (
+    OpenSearchConfig,
+    OpenSearchConnection,
+    OpenSearchQueryConfig,
+)
+from app.core.search_cache import (
+    logged_search_request,
+    top_search_requests,
+    write_precomputed_results,
+)
+from app.db.session import DbOpener, open_db
+
+
+def precompute_results(
+    connection: OpenSearchConnection,
+    config: OpenSearchQueryConfig,
+    open_db: DbOpener,
+    search_requests: Iterable[SearchRequestBody],
+) -> Mapping[str, SearchResults]:
+    """Search for each request, keyed as the backend looks up precomputed results.
+
+    Partial results are skipped, so that they are not served until the next run.
+    """
+
+    results = {}
+    for search_request in search_requests:
+        # Filters are logged as requested, before being resolved by the search route
+        if search_request.keyword_filters is not None:
+            search_request.keyword_filters = process_search_keyword_filters(
+                open_db, search_request.keyword_filters
+            )
+        search_results = connection.query(search_request, config, None)
+        if search_results.partial:
+            print(f"Skipping partial results for: {search_request.query_string}")
+            continue
+        results[connection.search_request_key(search_request, config)] = search_results
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Require a number of searches, an output directory and log files")
+        sys.exit(1)
+
+    n = int(sys.argv[1])
+    snapshot_path = sys.argv[2]
+    config = OpenSearchQueryConfig()
+    connection = OpenSearchConnection(OpenSearchConfig())
+
+    search_requests = (
+        logged_search_request(line) for line in fileinput.input(sys.argv[3:])
+    )
+    top_requests = top_search_requests(
+        (r for r in search_requests if r is not None), n, config
+    )
+    print(f"Precomputing results for {len(top_requests)} searches...")
+
+    generation = connection.index_generation()
+    results = precompute_results(connection, config, open_db, top_requests)
+
+    if connection.index_generation() != generation:
+        print("The indices changed while precomputing results, please retry")
+        sys.exit(1)
+
+    write_precomputed_results(snapshot_path, results, generation)
+    print(f"Wrote results for {len(results)} searches to {snapshot_path}")
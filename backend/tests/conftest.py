@@ -1,6 +1,7 @@
 import datetime
 import os
 import typing as t
+from contextlib import nullcontext
 
 import pytest
 from fastapi.testclient import TestClient
@@ -13,7 +14,7 @@ from app.core import security
 from app.core.aws import S3Client, get_s3_client
 from app.core.search import OpenSearchConnection, OpenSearchConfig
 from app.db.models import User, PasswordResetToken
-from app.db.session import Base, get_db
+from app.db.session import Base, get_db, get_db_opener
 from app.main import app
 from .routes.test_data_fixtures import (  # noqa F401
     doc_browse_data,
@@ -135,7 +136,11 @@ def client(test_db, test_s3_client):
     def get_test_s3_client():
         yield test_s3_client
 
+    def get_test_db_opener():
+        return lambda: nullcontext(test_db)
+
     app.dependency_overrides[get_db] = get_test_db
+    app.dependency_overrides[get_db_opener] = get_test_db_opener
     app.dependency_overrides[get_s3_client] = get_test_s3_client
 
     yield TestClient(app)
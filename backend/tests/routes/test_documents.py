@@ -1,3 +1,6 @@
+from contextlib import nullcontext
+from functools import partial
+
 from app.db.models import (
     Document,
     Source,
@@ -17,6 +20,7 @@ from app.api.api_v1.schemas.document import (
     RelationshipCreateRequest,
 )
 from app.db.crud.document import (
+    DocumentPostfixIndex,
     create_document,
     get_document_detail,
     get_postfix_map,
@@ -636,3 +640,42 @@ def test_postfix_map(
     assert pf_map[response2_document["import_id"]] == "postfix2"
     assert pf_map[response3_document["import_id"]] == ""
     assert pf_map[response4_document["import_id"]] == ""
+
+
+def test_postfix_index(
+    test_db,
+):
+    (
+        response1_document,
+        _,
+        response2_document,
+        *_,
+    ) = create_4_documents(test_db)
+    import_ids = [response1_document["import_id"], response2_document["import_id"]]
+    open_db = partial(nullcontext, test_db)
+    postfix_index = DocumentPostfixIndex(refresh_interval_s=300)
+    # Load the postfixes as the first request would, but not in the background
+    postfix_index._reload(open_db)
+
+    pf_map = postfix_index.get(open_db, import_ids + ["CCLW.missing.1.1"])
+    assert pf_map == {
+        response1_document["import_id"]: "postfix1",
+        response2_document["import_id"]: "postfix2",
+        "CCLW.missing.1.1": "",
+    }
+    # Missing documents are looked up again, as they may be created at any time
+    assert "CCLW.missing.1.1" not in postfix_index._postfixes
+
+    # Postfixes are served from memory until they are reloaded or updated
+    test_db.query(Document).filter(
+        Document.import_id == response1_document["import_id"]
+    ).update({"postfix": "updated"})
+    test_db.commit()
+    assert postfix_index.get(open_db, import_ids) == {
+        response1_document["import_id"]: "postfix1",
+        response2_document["import_id"]: "postfix2",
+    }
+
+    postfix_index.update({response1_document["import_id"]: "updated"})
+    pf_map = postfix_index.get(open_db, import_ids)
+    assert pf_map[response1_document["import_id"]] == "updated"
@@ -1,4 +1,5 @@
 import dataclasses
+import json
 import time
 from datetime import datetime
 
@@ -7,6 +8,7 @@ import pytest
 
 import app.core
 import app.core.jit_query_wrapper
+import app.db.crud.document
 from app.api.api_v1.routers import search
 from app.api.api_v1.schemas.search import (
     JitQuery,
@@ -14,10 +16,26 @@ from app.api.api_v1.schemas.search import (
     SortOrder,
     FilterField,
 )
-from app.core.search import _FILTER_FIELD_MAP, OpenSearchQueryConfig
+from app.core.search import (
+    _FILTER_FIELD_MAP,
+    OpenSearchConnection,
+    OpenSearchQueryConfig,
+)
+from app.core.lookups import GeographyIndex
+from app.core.search_cache import TTLCache
+from app.db.crud.document import DocumentPostfixIndex
 from app.db.models import Geography
 
 
+@pytest.fixture(autouse=True)
+def lookup_indices(monkeypatch):
+    """Load the geographies & document postfixes of each test's database afresh."""
+    monkeypatch.setattr(search, "_GEOGRAPHY_INDEX", GeographyIndex(300))
+    monkeypatch.setattr(
+        app.db.crud.document, "_DOCUMENT_POSTFIXES", DocumentPostfixIndex(300)
+    )
+
+
 @pytest.mark.search
 def test_simple_pagination(test_opensearch, monkeypatch, client):
     monkeypatch.setattr(search, "_OPENSEARCH_CONNECTION", test_opensearch)
@@ -62,6 +80,84 @@ def test_simple_pagination(test_opensearch, monkeypatch, client):
         assert d not in page2_documents
 
 
+@pytest.mark.search
+def test_cursor_pagination(test_opensearch, monkeypatch, client, mocker):
+    cursor_connection = OpenSearchConnection(
+        test_opensearch._opensearch_config,
+        cursor_store=TTLCache(max_size=10, ttl_s=60),
+    )
+    monkeypatch.setattr(search, "_OPENSEARCH_CONNECTION", cursor_connection)
+
+    page1_response = client.post(
+        "/api/v1/searches",
+        json={"query_string": "climate", "limit": 2, "offset": 0},
+    )
+    assert page1_response.status_code == 200
+    page1_response_body = page1_response.json()
+    cursor = page1_response_body["cursor"]
+    assert cursor is not None
+
+    query_spy = mocker.spy(cursor_connection, "raw_query")
+    page2_response = client.post(
+        "/api/v1/searches",
+        json={"query_string": "climate", "limit": 2, "offset": 2, "cursor": cursor},
+    )
+    assert page2_response.status_code == 200
+    page2_response_body = page2_response.json()
+    assert page2_response_body["cursor"] == cursor
+    assert page2_response_body["hits"] == page1_response_body["hits"]
+
+    # Only the documents on the requested page are queried for
+    query_body = query_spy.mock_calls[0].args[0]
+    assert query_body["aggs"]["sample"]["aggs"]["top_docs"]["terms"]["size"] == 2
+
+    uncursored_page2_response = client.post(
+        "/api/v1/searches",
+        json={"query_string": "climate", "limit": 2, "offset": 2},
+    )
+    assert [d["document_slug"] for d in page2_response_body["documents"]] == [
+        d["document_slug"] for d in uncursored_page2_response.json()["documents"]
+    ]
+
+
+@pytest.mark.search
+def test_two_phase_search(test_opensearch, monkeypatch, client, mocker):
+    monkeypatch.setattr(search, "_OPENSEARCH_CONNECTION", test_opensearch)
+    request_body = {
+        "query_string": "climate",
+        "limit": 3,
+        "offset": 1,
+        "jit_query": "disabled",
+    }
+
+    single_phase_response = client.post("/api/v1/searches", json=request_body)
+    assert single_phase_response.status_code == 200
+
+    monkeypatch.setattr(
+        search,
+        "_OPENSEARCH_INDEX_CONFIG",
+        dataclasses.replace(OpenSearchQueryConfig(), two_phase=True),
+    )
+    query_spy = mocker.spy(test_opensearch, "raw_query")
+    two_phase_response = client.post("/api/v1/searches", json=request_body)
+    assert two_phase_response.status_code == 200
+
+    # The ranking query must not fetch passages, the page query only fetches the page
+    assert query_spy.call_count == 2
+    ranking_query = query_spy.mock_calls[0].args[0]
+    page_query = query_spy.mock_calls[1].args[0]
+    ranking_top_docs = ranking_query["aggs"]["sample"]["aggs"]["top_docs"]
+    assert "top_passage_hits" not in ranking_top_docs["aggs"]
+    assert page_query["aggs"]["sample"]["aggs"]["top_docs"]["terms"]["size"] == 3
+
+    single_phase_body = single_phase_response.json()
+    two_phase_body = two_phase_response.json()
+    assert two_phase_body["hits"] == single_phase_body["hits"]
+    assert [d["document_slug"] for d in two_phase_body["documents"]] == [
+        d["document_slug"] for d in single_phase_body["documents"]
+    ]
+
+
 @pytest.mark.search
 def test_search_result_schema(caplog, test_opensearch, monkeypatch, client):
     monkeypatch.setattr(search, "_OPENSEARCH_CONNECTION", test_opensearch)
@@ -1029,3 +1125,57 @@ def test_browse_filters(test_opensearch, test_db, monkeypatch, client, mocker):
     response_body = response.json()
     documents = response_body["documents"]
     assert len(documents) == 0
+
+
+def _stream_events(response) -> list[tuple[str, dict]]:
+    events = []
+    for message in response.text.split("\n\n"):
+        if not message.strip():
+            continue
+        event_line, data_line = message.split("\n")
+        events.append(
+            (
+                event_line.removeprefix("event: "),
+                json.loads(data_line.removeprefix("data: ")),
+            )
+        )
+    return events
+
+
+@pytest.mark.search
+def test_stream_search_refines_jit_results(
+    test_opensearch, monkeypatch, client, mocker
+):
+    monkeypatch.setattr(search, "_OPENSEARCH_CONNECTION", test_opensearch)
+    query_spy = mocker.spy(search._OPENSEARCH_CONNECTION, "query")
+
+    response = client.post(
+        "/api/v1/searches/stream",
+        json={"query_string": "climate", "exact_match": False},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _stream_events(response)
+    assert [event for event, _ in events] == ["results", "refined"]
+    assert all(len(results["documents"]) > 0 for _, results in events)
+    # The JIT search is refined by the full search
+    assert [call.args[1] for call in query_spy.mock_calls] == [
+        dataclasses.replace(OpenSearchQueryConfig(), max_doc_count=20),
+        OpenSearchQueryConfig(),
+    ]
+
+
+@pytest.mark.search
+def test_stream_search_without_jit(test_opensearch, monkeypatch, client):
+    monkeypatch.setattr(search, "_OPENSEARCH_CONNECTION", test_opensearch)
+
+    response = client.post(
+        "/api/v1/searches/stream",
+        json={"query_string": "climate", "offset": 2, "limit": 2},
+    )
+
+    assert response.status_code == 200
+    events = _stream_events(response)
+    assert [event for event, _ in events] == ["results"]
+    assert len(events[0][1]["documents"]) == 2
@@ -0,0 +1,92 @@
+from contextlib import nullcontext
+
+import pytest
+
+from app.api.api_v1.routers import search
+from app.api.api_v1.schemas.search import (
+    FilterField,
+    SearchRequestBody,
+    SearchResults,
+)
+from app.core.lookups import GeographyIndex
+from app.core.search import OpenSearchQueryConfig
+from scripts.precompute_search_results.precompute_search_results import (
+    precompute_results,
+)
+
+
+class FakeQuery:
+    """Returns the given rows."""
+
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        """Override"""
+        return list(self._rows)
+
+
+class FakeSession:
+    """Queries the given geography rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def query(self, *columns):
+        """Override"""
+        return FakeQuery(self.rows)
+
+
+class FakeConnection:
+    """Records the searches made, with partial results for the given queries."""
+
+    def __init__(self, partial_queries):
+        self.partial_queries = partial_queries
+        self.search_requests = []
+
+    def query(self, search_request, config, preference):
+        """Override"""
+        self.search_requests.append(search_request)
+        return SearchResults(
+            hits=1,
+            query_time_ms=5,
+            partial=search_request.query_string in self.partial_queries,
+            documents=[],
+        )
+
+    def search_request_key(self, search_request, config):
+        """Override"""
+        return search_request.query_string
+
+
+@pytest.mark.unit
+def test_precompute_results_resolves_geography_filters(monkeypatch):
+    monkeypatch.setattr(search, "_GEOGRAPHY_INDEX", GeographyIndex(300))
+    db = FakeSession(
+        [
+            (1, "south-asia", "South Asia", None),
+            (2, "afghanistan", "AFG", 1),
+            (3, "bhutan", "BTN", 1),
+        ]
+    )
+    connection = FakeConnection(partial_queries={"floods"})
+
+    results = precompute_results(
+        connection,  # type: ignore
+        OpenSearchQueryConfig(),
+        lambda: nullcontext(db),
+        [
+            SearchRequestBody(
+                query_string="forests",
+                keyword_filters={FilterField.REGION: ["south-asia"]},
+            ),
+            SearchRequestBody(query_string="floods"),
+        ],
+    )
+
+    assert [r.keyword_filters for r in connection.search_requests] == [
+        {FilterField.COUNTRY: ["AFG", "BTN"]},
+        None,
+    ]
+    # Partial results are not precomputed
+    assert list(results) == ["forests"]
@@ -0,0 +1,191 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+import app.core.search
+from app.api.api_v1.schemas.search import SearchRequestBody
+from app.core.encoder import SentenceEncoder
+from app.core.search import (
+    AsyncOpenSearchConnection,
+    OpenSearchConfig,
+    OpenSearchQueryConfig,
+)
+
+
+class FakeEncoder(SentenceEncoder):
+    """Encoder recording the threads it encodes on."""
+
+    def __init__(self):
+        self.thread_ids = []
+
+    @property
+    def is_ready(self) -> bool:
+        """Override"""
+        return True
+
+    def warmup(self) -> None:
+        """Override"""
+        pass
+
+    def encode_batch(self, texts):
+        """Override"""
+        self.thread_ids.append(threading.get_ident())
+        return np.zeros((len(texts), 3), dtype=np.float32)
+
+
+class FakeAsyncClient:
+    """Async OpenSearch client returning a fixed search response."""
+
+    def __init__(self, response):
+        self.response = response
+        self.search_calls = []
+
+    async def search(self, **kwargs):
+        """Record the search, returning the response after yielding to the loop."""
+        self.search_calls.append(kwargs)
+        await asyncio.sleep(0)
+        return self.response
+
+
+def _source(slug: str) -> dict:
+    return {
+        "document_name": slug,
+        "document_geography": "KEN",
+        "document_description": "A description",
+        "document_sectors": [],
+        "document_source": "CCLW",
+        "document_id": f"CCLW.{slug}",
+        "document_date": "01/01/2020",
+        "document_type": "Law",
+        "document_source_url": None,
+        "document_cdn_object": None,
+        "document_category": "Law",
+        "document_content_type": None,
+        "document_slug": slug,
+        "for_search_document_description": "A description",
+    }
+
+
+def _connection(
+    response, **config
+) -> tuple[AsyncOpenSearchConnection, FakeAsyncClient]:
+    connection = AsyncOpenSearchConnection(
+        OpenSearchConfig(index_prefix="test", **config)
+    )
+    client = FakeAsyncClient(response)
+    connection._opensearch_connection = client  # type: ignore
+    return connection, client
+
+
+@pytest.mark.unit
+def test_async_browse():
+    connection, client = _connection(
+        {"hits": {"total": {"value": 1}, "hits": [{"_source": _source("a")}]}}
+    )
+    search_request = SearchRequestBody(
+        query_string="", exact_match=False, jit_query="disabled"
+    )
+
+    results = asyncio.run(
+        connection.query(search_request, OpenSearchQueryConfig(), None)
+    )
+
+    assert results.hits == 1
+    assert [d.document_slug for d in results.documents] == ["a"]
+    assert client.search_calls[0]["index"] == "test_core"
+
+
+@pytest.mark.unit
+def test_async_browse_coalesces_identical_requests():
+    connection, client = _connection(
+        {"hits": {"total": {"value": 1}, "hits": [{"_source": _source("a")}]}},
+        coalesce_searches=True,
+    )
+    search_request = SearchRequestBody(
+        query_string="", exact_match=False, jit_query="disabled"
+    )
+
+    async def browse_twice():
+        return await asyncio.gather(
+            *(
+                connection.query(search_request, OpenSearchQueryConfig(), None)
+                for _ in range(2)
+            )
+        )
+
+    first, second = asyncio.run(browse_twice())
+
+    assert first is second
+    assert len(client.search_calls) == 1
+
+
+@pytest.mark.unit
+def test_async_search_encodes_in_threadpool(monkeypatch):
+    encoder = FakeEncoder()
+    monkeypatch.setattr(app.core.search, "get_encoder", lambda: encoder)
+    connection, client = _connection(
+        {
+            "aggregations": {
+                "no_unique_docs": {"value": 1},
+                "sample": {
+                    "top_docs": {
+                        "buckets": [
+                            {
+                                "key": "a_key",
+                                "top_hit": {"value": 1.0},
+                                "top_passage_hits": {
+                                    "hits": {"hits": [{"_source": _source("a")}]}
+                                },
+                            }
+                        ]
+                    }
+                },
+            }
+        }
+    )
+    search_request = SearchRequestBody(
+        query_string="forests", exact_match=False, jit_query="disabled"
+    )
+
+    results = asyncio.run(
+        connection.query(search_request, OpenSearchQueryConfig(), None)
+    )
+
+    assert [d.document_slug for d in results.documents] == ["a"]
+    assert encoder.thread_ids and threading.get_ident() not in encoder.thread_ids
+    assert client.search_calls[0]["index"] == "test_core,test_pdfs_non_translated"
+
+
+@pytest.mark.unit
+def test_async_local_browse_runs_in_threadpool(monkeypatch):
+    async def fake_async_scan(client, **kwargs):
+        yield {"_source": _source("a")}
+
+    async def index_generation():
+        return "1"
+
+    monkeypatch.setattr(app.core.search, "async_scan", fake_async_scan)
+    connection, client = _connection({}, local_browse=True)
+    monkeypatch.setattr(connection, "index_generation", index_generation)
+    local_browse_thread_ids = []
+    local_browse = connection._local_browse
+
+    def recording_local_browse(*args):
+        local_browse_thread_ids.append(threading.get_ident())
+        return local_browse(*args)
+
+    monkeypatch.setattr(connection, "_local_browse", recording_local_browse)
+    search_request = SearchRequestBody(
+        query_string="", exact_match=False, jit_query="disabled"
+    )
+
+    results = asyncio.run(
+        connection.query(search_request, OpenSearchQueryConfig(), None)
+    )
+
+    assert [d.document_slug for d in results.documents] == ["a"]
+    assert not client.search_calls
+    assert local_browse_thread_ids
+    assert threading.get_ident() not in local_browse_thread_ids
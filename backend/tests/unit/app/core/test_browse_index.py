@@ -0,0 +1,151 @@
+import pytest
+
+import app.core.search
+from app.api.api_v1.schemas.search import FilterField, SearchRequestBody, SortField
+from app.core.browse_index import BrowseIndex
+from app.core.search import (
+    OpenSearchConfig,
+    OpenSearchConnection,
+    OpenSearchQueryConfig,
+    build_opensearch_request_body,
+)
+
+
+def _source(name: str, geography: str, date: str, sectors=()) -> dict:
+    return {
+        "document_name": name,
+        "document_geography": geography,
+        "document_description": "A description",
+        "for_search_document_description": "A description",
+        "document_sectors": list(sectors),
+        "document_sector": list(sectors),
+        "document_source": "CCLW",
+        "document_id": f"CCLW.{name}",
+        "document_date": date,
+        "document_type": "Law",
+        "document_source_url": None,
+        "document_cdn_object": None,
+        "document_category": "Law",
+        "document_content_type": None,
+        "document_slug": name.lower(),
+    }
+
+
+_SOURCES = [
+    _source("Beta", "KEN", "01/06/2015", ["Energy", "Transport"]),
+    _source("Alpha", "GBR", "01/01/2020", ["Energy"]),
+    _source("Gamma", "KEN", "31/12/2009"),
+    _source("Delta", "FRA", "", ["Transport"]),
+]
+
+
+@pytest.fixture
+def browse_index() -> BrowseIndex:
+    return BrowseIndex(
+        _SOURCES,
+        keyword_fields=["document_geography", "document_sector"],
+        date_field="document_date",
+        title_field="document_name",
+    )
+
+
+def _browse(browse_index: BrowseIndex, **kwargs):
+    request_body = build_opensearch_request_body(
+        SearchRequestBody(query_string="", **kwargs)
+    ).query
+    return browse_index.search(request_body)
+
+
+def _names(response) -> list[str]:
+    return [hit["_source"]["document_name"] for hit in response["hits"]["hits"]]
+
+
+@pytest.mark.unit
+def test_browse_by_date(browse_index):
+    response = _browse(browse_index)
+
+    # Documents without a date are last, whatever the order
+    assert _names(response) == ["Alpha", "Beta", "Gamma", "Delta"]
+    assert response["hits"]["total"]["value"] == 4
+
+
+@pytest.mark.unit
+def test_browse_by_title(browse_index):
+    response = _browse(browse_index, sort_field=SortField.TITLE, sort_order="asc")
+
+    assert _names(response) == ["Alpha", "Beta", "Delta", "Gamma"]
+
+
+@pytest.mark.unit
+def test_browse_page(browse_index):
+    response = _browse(
+        browse_index, sort_field=SortField.TITLE, sort_order="desc", limit=2, offset=1
+    )
+
+    assert _names(response) == ["Delta", "Beta"]
+    assert response["hits"]["total"]["value"] == 4
+
+
+@pytest.mark.unit
+def test_browse_filters(browse_index):
+    response = _browse(
+        browse_index,
+        keyword_filters={FilterField.COUNTRY: ["KEN", "GBR"]},
+        year_range=(2010, 2019),
+    )
+    assert _names(response) == ["Beta"]
+
+    response = _browse(browse_index, keyword_filters={FilterField.SECTOR: ["Energy"]})
+    assert _names(response) == ["Alpha", "Beta"]
+
+
+@pytest.mark.unit
+def test_browse_facets(browse_index):
+    response = _browse(
+        browse_index,
+        keyword_filters={FilterField.COUNTRY: ["KEN", "FRA"]},
+        facets=[FilterField.SECTOR],
+    )
+
+    assert response["aggregations"]["facet_sectors"] == {
+        "buckets": [
+            {"key": "Transport", "doc_count": 2},
+            {"key": "Energy", "doc_count": 1},
+        ]
+    }
+
+
+@pytest.mark.unit
+def test_browse_unsupported_request(browse_index):
+    # Fields which are not in the snapshot are left to OpenSearch
+    response = _browse(browse_index, keyword_filters={FilterField.TYPE: ["Law"]})
+
+    assert response is None
+
+
+@pytest.mark.unit
+def test_local_browse_refreshes_with_index_generation(monkeypatch):
+    scans = []
+
+    def fake_scan(client, **kwargs):
+        scans.append(kwargs["index"])
+        return [{"_source": source} for source in _SOURCES[: len(scans)]]
+
+    monkeypatch.setattr(app.core.search, "scan", fake_scan)
+    connection = OpenSearchConnection(
+        OpenSearchConfig(index_prefix="test", local_browse=True)
+    )
+    connection._opensearch_connection = object()  # type: ignore
+    generation = "1"
+    monkeypatch.setattr(connection, "index_generation", lambda: generation)
+    search_request = SearchRequestBody(query_string="", jit_query="disabled")
+
+    results = connection.query(search_request, OpenSearchQueryConfig(), None)
+    assert [d.document_name for d in results.documents] == ["Beta"]
+    connection.query(search_request, OpenSearchQueryConfig(), None)
+    assert scans == ["test_core"]
+
+    generation = "2"
+    results = connection.query(search_request, OpenSearchQueryConfig(), None)
+    assert [d.document_name for d in results.documents] == ["Alpha", "Beta"]
+    assert scans == ["test_core", "test_core"]
@@ -0,0 +1,321 @@
+import json
+
+import numpy as np
+import pytest
+
+import app.core.search
+from app.api.api_v1.schemas.search import (
+    FilterField,
+    SearchRequestBody,
+    SortField,
+    SortOrder,
+)
+from app.core.description_index import (
+    DescriptionEmbeddingIndex,
+    write_description_index,
+)
+from app.core.encoder import SentenceEncoder
+from app.core.search import (
+    OpenSearchConfig,
+    OpenSearchConnection,
+    OpenSearchQueryConfig,
+    build_opensearch_request_body,
+)
+
+
+class FakeEncoder(SentenceEncoder):
+    """Encodes every text as the same unit vector."""
+
+    @property
+    def is_ready(self) -> bool:
+        """Override"""
+        return True
+
+    def warmup(self) -> None:
+        """Override"""
+        pass
+
+    def encode_batch(self, texts):
+        """Override"""
+        return np.array([[1.0, 0.0, 0.0] for _ in texts], dtype=np.float32)
+
+
+@pytest.fixture(autouse=True)
+def fake_encoder(monkeypatch):
+    monkeypatch.setattr(app.core.search, "get_encoder", lambda: FakeEncoder())
+
+
+def _source(slug: str, geography: str = "KEN", date: str = "01/01/2020") -> dict:
+    return {
+        "document_name": slug,
+        "document_geography": geography,
+        "document_description": "A description",
+        "document_sectors": [],
+        "document_source": "CCLW",
+        "document_id": f"CCLW.{slug}",
+        "document_date": date,
+        "document_type": "Law",
+        "document_source_url": None,
+        "document_cdn_object": None,
+        "document_category": "Law",
+        "document_content_type": None,
+        "document_slug": slug,
+    }
+
+
+_CORE_INDEX_GENERATION = "test_core:core-uuid:3"
+
+
+@pytest.fixture
+def description_index() -> DescriptionEmbeddingIndex:
+    return DescriptionEmbeddingIndex(
+        document_keys=["a_key", "b_key", "c_key"],
+        documents=[
+            {**_source("a"), "for_search_document_description": "A description"},
+            {
+                **_source("b", geography="GBR", date="01/01/2010"),
+                "for_search_document_description": "A description",
+            },
+            {**_source("c"), "for_search_document_description": "A description"},
+        ],
+        embeddings=np.array(
+            [[90.0, 0.0, 0.0], [80.0, 0.0, 0.0], [10.0, 0.0, 0.0]], dtype=np.float32
+        ),
+        generation=_CORE_INDEX_GENERATION,
+    )
+
+
+@pytest.mark.unit
+def test_description_index_search(description_index):
+    results = description_index.search(
+        np.array([[1.0, 0.0, 0.0], [-1.0, 0.0, 0.0]]), limit=2, min_similarity=50
+    )
+
+    assert results == [[(0, 90.0), (1, 80.0)], []]
+
+
+@pytest.mark.unit
+def test_description_index_filter_mask(description_index):
+    assert description_index.filter_mask() is None
+    assert list(
+        description_index.filter_mask(
+            keyword_filters={"document_geography": ["KEN", "FRA"]}
+        )
+    ) == [True, False, True]
+    assert list(description_index.filter_mask(year_range=(None, 2015))) == [
+        False,
+        True,
+        False,
+    ]
+    assert list(
+        description_index.filter_mask(
+            keyword_filters={"document_geography": ["KEN"]},
+            document_keys=["c_key", "missing_key"],
+        )
+    ) == [False, False, True]
+
+
+@pytest.mark.unit
+def test_description_index_snapshot(tmp_path, description_index):
+    write_description_index(
+        str(tmp_path),
+        description_index.document_keys,
+        description_index.documents,
+        np.eye(3).tolist(),
+        _CORE_INDEX_GENERATION,
+    )
+
+    loaded = DescriptionEmbeddingIndex.load(str(tmp_path))
+
+    assert loaded.document_keys == ["a_key", "b_key", "c_key"]
+    assert loaded.generation == _CORE_INDEX_GENERATION
+    assert loaded.documents == description_index.documents
+    assert loaded.search(np.array([0.0, 1.0, 0.0]), limit=1, min_similarity=0) == [
+        [(1, 1.0)]
+    ]
+
+
+@pytest.mark.unit
+def test_request_without_description_knn():
+    body = build_opensearch_request_body(
+        SearchRequestBody(query_string="forests", exact_match=False),
+        description_knn=False,
+    ).query
+
+    description_clauses = body["query"]["bool"]["should"][1]["bool"]["should"]
+    text_clauses = body["query"]["bool"]["should"][2]["bool"]["should"]
+    assert not any("function_score" in clause for clause in description_clauses)
+    assert any("function_score" in clause for clause in text_clauses)
+
+
+class FakeCat:
+    """Lists the test indices, at the given generation of the core index."""
+
+    def __init__(self, core_index_generation):
+        self.core_index_generation = core_index_generation
+
+    def indices(self, index, format, h):
+        """Override"""
+        name, uuid, docs_count = self.core_index_generation.split(":")
+        return [
+            {"index": name, "uuid": uuid, "docs.count": docs_count},
+            {"index": "test_pdfs_non_translated", "uuid": "pdfs-uuid", "docs.count": 9},
+        ]
+
+
+class FakeClient:
+    """Finds document c by its passage, recording the request bodies."""
+
+    def __init__(self, core_index_generation=_CORE_INDEX_GENERATION):
+        self.bodies = []
+        self.cat = FakeCat(core_index_generation)
+
+    def search(self, body, index, request_timeout, preference):
+        """Override"""
+        if isinstance(body, (str, bytes)):
+            body = json.loads(body)
+        self.bodies.append(body)
+        return {
+            "took": 1,
+            "aggregations": {
+                "no_unique_docs": {"value": 1},
+                "sample": {
+                    "top_docs": {
+                        "buckets": [
+                            {
+                                "key": "c_key",
+                                "doc_count": 1,
+                                "top_hit": {"value": 10.0},
+                                "document_date": {
+                                    "count": 1,
+                                    "min": 1577836800000.0,
+                                    "max": 1577836800000.0,
+                                    "avg": 1577836800000.0,
+                                    "sum": 1577836800000.0,
+                                },
+                                "top_passage_hits": {
+                                    "hits": {
+                                        "hits": [
+                                            {
+                                                "_score": 10.0,
+                                                "_source": {
+                                                    **_source("c"),
+                                                    "text": "Some text",
+                                                    "text_block_id": "p_0_b_0",
+                                                    "text_block_page": 0,
+                                                    "text_block_coords": [],
+                                                },
+                                            }
+                                        ]
+                                    }
+                                },
+                            }
+                        ]
+                    }
+                },
+            },
+        }
+
+
+@pytest.mark.unit
+def test_search_with_description_index(description_index):
+    connection = OpenSearchConnection(
+        OpenSearchConfig(index_prefix="test"), description_index=description_index
+    )
+    client = FakeClient()
+    connection._opensearch_connection = client  # type: ignore
+
+    results = connection.query(
+        SearchRequestBody(
+            query_string="forests",
+            exact_match=False,
+            keyword_filters={FilterField.COUNTRY: ["KEN"]},
+            jit_query="disabled",
+        ),
+        OpenSearchQueryConfig(),
+        None,
+    )
+
+    # Document b is similar, but filtered out. Document c is not similar enough.
+    assert [d.document_slug for d in results.documents] == ["a", "c"]
+    assert results.documents[0].document_description_match
+    assert len(results.documents[1].document_passage_matches) == 1
+    # Descriptions are not searched by kNN in OpenSearch
+    assert not _description_knn_in_opensearch(client)
+
+
+def _description_knn_in_opensearch(client: FakeClient) -> bool:
+    description_clauses = client.bodies[0]["query"]["bool"]["should"][1]["bool"]
+    return any("function_score" in c for c in description_clauses["should"])
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "core_index_generation,request_body",
+    [
+        # The snapshot is of an earlier build of the core index
+        (
+            "test_core:core-uuid:4",
+            SearchRequestBody(query_string="forests", exact_match=False),
+        ),
+        (
+            "test_core:new-core-uuid:3",
+            SearchRequestBody(query_string="forests", exact_match=False),
+        ),
+        # Facets cannot be counted from the description index
+        (
+            _CORE_INDEX_GENERATION,
+            SearchRequestBody(
+                query_string="forests",
+                exact_match=False,
+                facets=[FilterField.COUNTRY],
+            ),
+        ),
+    ],
+)
+def test_search_without_description_index(
+    description_index, core_index_generation, request_body
+):
+    connection = OpenSearchConnection(
+        OpenSearchConfig(index_prefix="test"), description_index=description_index
+    )
+    client = FakeClient(core_index_generation)
+    connection._opensearch_connection = client  # type: ignore
+
+    results = connection.query(
+        request_body.copy(update={"jit_query": "disabled"}),
+        OpenSearchQueryConfig(),
+        None,
+    )
+
+    # Only the document OpenSearch found, as descriptions are searched there
+    assert [d.document_slug for d in results.documents] == ["c"]
+    assert _description_knn_in_opensearch(client)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("sort_order", [SortOrder.ASCENDING, SortOrder.DESCENDING])
+def test_search_with_description_index_orders_documents_without_dates_last(
+    description_index, sort_order
+):
+    description_index.documents[0]["document_date"] = ""
+    connection = OpenSearchConnection(
+        OpenSearchConfig(index_prefix="test"), description_index=description_index
+    )
+    connection._opensearch_connection = FakeClient()  # type: ignore
+
+    results = connection.query(
+        SearchRequestBody(
+            query_string="forests",
+            exact_match=False,
+            keyword_filters={FilterField.COUNTRY: ["KEN"]},
+            sort_field=SortField.DATE,
+            sort_order=sort_order,
+            jit_query="disabled",
+        ),
+        OpenSearchQueryConfig(),
+        None,
+    )
+
+    # Document a is only found in the description index, and has no date
+    assert [d.document_slug for d in results.documents] == ["c", "a"]
@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app.core.encoder import (
+    BatchingSentenceEncoder,
+    CachingSentenceEncoder,
+    LocalSentenceEncoder,
+    SentenceEncoder,
+    SocketSentenceEncoder,
+    _EncoderServer,
+    warmup_encoder,
+    write_embedding_store,
+)
+
+
+class FakeEncoder(SentenceEncoder):
+    """Encodes each text as its length, recording the texts encoded."""
+
+    def __init__(self):
+        self.calls = []
+
+    @property
+    def is_ready(self) -> bool:
+        """Always ready."""
+        return True
+
+    def warmup(self) -> None:
+        """Nothing to warm up."""
+
+    def encode_batch(self, texts):
+        """Encode each text as its length."""
+        self.calls.append(list(texts))
+        return np.array([[len(t), 1.0, 2.0] for t in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def encoder_socket(tmp_path):
+    socket_path = os.path.join(tmp_path, "encoder.sock")
+    fake_encoder = FakeEncoder()
+    server = _EncoderServer(socket_path, fake_encoder)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield socket_path, fake_encoder
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.unit
+def test_local_encoder_does_not_load_on_construction():
+    encoder = LocalSentenceEncoder("not-a-real-model", "/tmp")
+    assert not encoder.is_ready
+
+
+@pytest.mark.unit
+def test_local_encoder_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        LocalSentenceEncoder("not-a-real-model", "/tmp", backend="fp8")
+
+
+@pytest.mark.unit
+def test_socket_encoder_round_trip(encoder_socket):
+    socket_path, fake_encoder = encoder_socket
+    encoder = SocketSentenceEncoder(socket_path)
+
+    embeddings = encoder.encode_batch(["climate", "adaptation"])
+
+    assert fake_encoder.calls == [["climate", "adaptation"]]
+    assert embeddings.shape == (2, 3)
+    np.testing.assert_array_equal(embeddings[1], [10.0, 1.0, 2.0])
+    np.testing.assert_array_equal(encoder.encode("spain"), [5.0, 1.0, 2.0])
+
+
+@pytest.mark.unit
+def test_socket_encoder_readiness(encoder_socket, tmp_path):
+    socket_path, fake_encoder = encoder_socket
+
+    assert SocketSentenceEncoder(socket_path).is_ready
+    # Readiness checks must not reach the model
+    assert fake_encoder.calls == []
+
+    missing = SocketSentenceEncoder(os.path.join(tmp_path, "missing.sock"))
+    start = time.time()
+    assert not missing.is_ready
+    assert time.time() - start < 1
+
+
+@pytest.mark.unit
+def test_warmup_retries_until_encoder_is_available():
+    class UnavailableEncoder(FakeEncoder):
+        warmups = 0
+
+        @property
+        def is_ready(self) -> bool:
+            return self.warmups > 2
+
+        def warmup(self) -> None:
+            self.warmups += 1
+            if not self.is_ready:
+                raise ConnectionRefusedError()
+
+    encoder = UnavailableEncoder()
+
+    # Startup is not failed by the encoder process starting later
+    warmup_encoder(encoder, initial_delay_s=0.01)
+    assert not encoder.is_ready
+
+    deadline = time.time() + 5
+    while not encoder.is_ready and time.time() < deadline:
+        time.sleep(0.01)
+    assert encoder.warmups == 3
+
+
+@pytest.mark.unit
+def test_caching_encoder_reuses_normalised_queries():
+    fake_encoder = FakeEncoder()
+    encoder = CachingSentenceEncoder(fake_encoder, max_size=2)
+
+    first = encoder.encode("Climate  change")
+    second = encoder.encode("climate change")
+
+    np.testing.assert_array_equal(first, second)
+    assert fake_encoder.calls == [["Climate  change"]]
+    assert (encoder.hits, encoder.misses) == (1, 1)
+
+
+@pytest.mark.unit
+def test_caching_encoder_evicts_least_recently_used():
+    fake_encoder = FakeEncoder()
+    encoder = CachingSentenceEncoder(fake_encoder, max_size=2)
+
+    encoder.encode_batch(["a", "b"])
+    encoder.encode("a")
+    encoder.encode("c")  # evicts "b"
+    encoder.encode_batch(["a", "b", "b"])
+
+    assert fake_encoder.calls == [["a", "b"], ["c"], ["b"]]
+
+
+@pytest.mark.unit
+def test_caching_encoder_uses_store(tmp_path):
+    store_path = os.path.join(tmp_path, "store")
+    write_embedding_store(
+        store_path, ["Adaptation", "adaptation", "spain"], FakeEncoder()
+    )
+
+    fake_encoder = FakeEncoder()
+    encoder = CachingSentenceEncoder(fake_encoder, max_size=0, store_path=store_path)
+
+    np.testing.assert_array_equal(encoder.encode("ADAPTATION"), [10.0, 1.0, 2.0])
+    np.testing.assert_array_equal(encoder.encode("spain"), [5.0, 1.0, 2.0])
+    assert fake_encoder.calls == []
+
+
+@pytest.mark.unit
+def test_batching_encoder_coalesces_concurrent_requests():
+    fake_encoder = FakeEncoder()
+    encoder = BatchingSentenceEncoder(fake_encoder, window_ms=50, max_batch_size=4)
+    queries = ["a" * i for i in range(1, 9)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        embeddings = list(executor.map(encoder.encode, queries))
+
+    for query, embedding in zip(queries, embeddings):
+        np.testing.assert_array_equal(embedding, [len(query), 1.0, 2.0])
+    assert len(fake_encoder.calls) < len(queries)
+    assert all(len(call) <= 4 for call in fake_encoder.calls)
+    assert encoder.batched_texts == len(queries)
+
+
+@pytest.mark.unit
+def test_batching_encoder_propagates_errors():
+    class BrokenEncoder(FakeEncoder):
+        def encode_batch(self, texts):
+            raise RuntimeError("boom")
+
+    encoder = BatchingSentenceEncoder(BrokenEncoder(), window_ms=1, max_batch_size=4)
+    with pytest.raises(RuntimeError, match="boom"):
+        encoder.encode("climate")
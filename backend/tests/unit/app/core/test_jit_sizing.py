@@ -0,0 +1,193 @@
+import pytest
+from fastapi import BackgroundTasks
+from prometheus_client import REGISTRY
+
+import app.core.jit_sizing
+from app.api.api_v1.schemas.search import FilterField, SearchRequestBody
+from app.core.jit_query_wrapper import jit_query_config, jit_query_wrapper
+from app.core.jit_sizing import AdaptiveJitSizer, jit_query_shape
+from app.core.search import (
+    OpenSearchConfig,
+    OpenSearchConnection,
+    OpenSearchQueryConfig,
+)
+from app.core.search_cache import TTLCache
+
+
+def _observe(sizer: AdaptiveJitSizer, request: SearchRequestBody, latency_ms: int):
+    for _ in range(20):
+        sizer.observe(request, latency_ms)
+
+
+@pytest.mark.unit
+def test_jit_sizer_shrinks_under_load():
+    sizer = AdaptiveJitSizer(target_latency_ms=400)
+    config = OpenSearchQueryConfig(
+        max_doc_count=100, jit_max_doc_count=20, n_passages_to_sample_per_shard=5000
+    )
+    request = SearchRequestBody(query_string="forests", limit=5)
+
+    assert sizer.sizes(request, config) == {
+        "max_doc_count": 20,
+        "n_passages_to_sample_per_shard": 5000,
+    }
+
+    _observe(sizer, request, 900)
+    assert sizer.level(request) == -1
+    assert sizer.sizes(request, config) == {
+        "max_doc_count": 13,
+        "n_passages_to_sample_per_shard": 3333,
+    }
+
+    # JIT searches always rank enough documents for the requested page
+    for _ in range(5):
+        _observe(sizer, request, 900)
+    assert sizer.level(request) == -4
+    assert sizer.sizes(request, config)["max_doc_count"] == 5
+
+    # Other shapes of query are sized separately
+    other_request = SearchRequestBody(
+        query_string="forests", keyword_filters={FilterField.COUNTRY: ["KEN"]}
+    )
+    assert sizer.level(other_request) == 0
+
+
+@pytest.mark.unit
+def test_jit_sizer_grows_when_idle():
+    sizer = AdaptiveJitSizer(target_latency_ms=400)
+    config = OpenSearchQueryConfig(max_doc_count=40, jit_max_doc_count=20)
+    request = SearchRequestBody(query_string="forests")
+
+    # A latency percentile between half the target & the target keeps the size
+    exact_request = SearchRequestBody(query_string="forests", exact_match=True)
+    _observe(sizer, exact_request, 300)
+    assert sizer.level(exact_request) == 0
+
+    _observe(sizer, request, 50)
+    assert sizer.level(request) == 1
+    assert sizer.sizes(request, config)["max_doc_count"] == 30
+    _observe(sizer, request, 50)
+    # Never more than the full search ranks
+    assert sizer.sizes(request, config)["max_doc_count"] == 40
+    assert (
+        sizer.sizes(request, config)["n_passages_to_sample_per_shard"]
+        == config.n_passages_to_sample_per_shard
+    )
+
+    # Only a few slow searches are needed to shrink again
+    for latency_ms in [50] * 18 + [900] * 2:
+        sizer.observe(request, latency_ms)
+    assert sizer.level(request) == 1
+
+
+@pytest.mark.unit
+def test_jit_sizer_tracks_few_shapes(monkeypatch):
+    monkeypatch.setattr(app.core.jit_sizing, "_MAX_SHAPES", 2)
+    sizer = AdaptiveJitSizer(target_latency_ms=400)
+    request = SearchRequestBody(query_string="forests")
+
+    # Every page of every query of the same kind has the same shape
+    assert jit_query_shape(
+        SearchRequestBody(query_string="floods", limit=5, offset=20)
+    ) == jit_query_shape(request)
+
+    _observe(sizer, request, 900)
+    assert sizer.level(request) == -1
+    sizer.observe(SearchRequestBody(query_string="forests", exact_match=True), 900)
+    sizer.observe(
+        SearchRequestBody(
+            query_string="forests", keyword_filters={FilterField.COUNTRY: ["KEN"]}
+        ),
+        900,
+    )
+    # The least recently searched shape is forgotten
+    assert sizer.level(request) == 0
+
+
+@pytest.mark.unit
+def test_jit_query_config_with_sizer():
+    sizer = AdaptiveJitSizer(target_latency_ms=400)
+    config = OpenSearchQueryConfig(max_doc_count=100, jit_max_doc_count=20)
+    request = SearchRequestBody(query_string="forests")
+
+    assert jit_query_config(config).max_doc_count == 20
+    _observe(sizer, request, 900)
+    assert jit_query_config(config, request, sizer).max_doc_count == 13
+
+
+@pytest.mark.unit
+def test_jit_sizes_are_exported_as_metrics():
+    sizer = AdaptiveJitSizer(target_latency_ms=400)
+    config = OpenSearchQueryConfig(max_doc_count=100, jit_max_doc_count=20)
+    request = SearchRequestBody(query_string="forests", limit=7)
+    labels = {
+        "query": "semantic",
+        "filtered": "false",
+        "year_range": "false",
+        "sorted": "false",
+        "included_results": "false",
+    }
+    assert jit_query_shape(request).labels() == list(labels.values())
+
+    _observe(sizer, request, 900)
+    sizer.sizes(request, config)
+
+    assert REGISTRY.get_sample_value("jit_search_level", labels) == -1
+    assert REGISTRY.get_sample_value("jit_search_max_doc_count", labels) == 13
+    assert REGISTRY.get_sample_value("jit_search_latency_percentile_ms", labels) == 900
+
+
+class RecordingJitSizer(AdaptiveJitSizer):
+    """Records the latencies of the JIT searches it observes."""
+
+    def __init__(self):
+        super().__init__(target_latency_ms=400)
+        self.latencies_ms = []
+
+    def observe(self, search_request_body, latency_ms):
+        """Override"""
+        self.latencies_ms.append(latency_ms)
+        super().observe(search_request_body, latency_ms)
+
+
+class FakeClient:
+    """Finds no documents, counting the searches made."""
+
+    def __init__(self):
+        self.searches = 0
+
+    def search(self, body, index, request_timeout, preference):
+        """Override"""
+        self.searches += 1
+        return {
+            "aggregations": {
+                "no_unique_docs": {"value": 0},
+                "sample": {"top_docs": {"buckets": []}},
+            }
+        }
+
+
+@pytest.mark.unit
+def test_jit_sizer_only_observes_searches_made():
+    connection = OpenSearchConnection(
+        OpenSearchConfig(index_prefix="test"), result_cache=TTLCache(10, 60)
+    )
+    client = FakeClient()
+    connection._opensearch_connection = client  # type: ignore
+    connection._index_generation_checked_at = float("inf")
+    sizer = RecordingJitSizer()
+    request = SearchRequestBody(query_string="forests", exact_match=True)
+
+    for _ in range(2):
+        jit_query_wrapper(
+            connection,
+            request,
+            OpenSearchQueryConfig(two_phase=False),
+            None,
+            background_tasks=BackgroundTasks(),
+            jit_sizer=sizer,
+        )
+
+    # The second JIT search is served from the result cache
+    assert client.searches == 1
+    assert len(sizer.latencies_ms) == 1
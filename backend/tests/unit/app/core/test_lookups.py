@@ -0,0 +1,123 @@
+import threading
+import time
+from contextlib import nullcontext
+
+import pytest
+
+from app.core.lookups import GeographyIndex
+
+
+class FakeQuery:
+    """Returns the given rows."""
+
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        """Override"""
+        return list(self._rows)
+
+
+class FakeSession:
+    """Queries the given geography rows, counting the queries made."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+        self.available = threading.Event()
+        self.available.set()
+
+    def query(self, *columns):
+        """Override"""
+        self.available.wait()
+        self.queries += 1
+        return FakeQuery(self.rows)
+
+
+def _opener(db):
+    return lambda: nullcontext(db)
+
+
+def _wait_for_queries(db, queries):
+    deadline = time.monotonic() + 5
+    while db.queries < queries:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+_GEOGRAPHIES = [
+    (1, "south-asia", "South Asia", None),
+    (2, "afghanistan", "AFG", 1),
+    (3, "bhutan", "BTN", 1),
+    (4, "kabul", "Kabul", 2),
+]
+
+
+@pytest.mark.unit
+def test_geography_hierarchy():
+    db = FakeSession(_GEOGRAPHIES)
+    open_db = _opener(db)
+    geographies = GeographyIndex(refresh_interval_s=300).get(open_db)
+
+    assert geographies.country_values_for_region("south-asia") == ["AFG", "BTN"]
+    # Neither countries nor unknown slugs are regions
+    assert geographies.country_values_for_region("afghanistan") == []
+    assert geographies.country_values_for_region("daves-region") == []
+    assert geographies.country_value("bhutan") == "BTN"
+    assert geographies.country_value("south-asia") is None
+    assert geographies.country_value("daves-country") is None
+
+
+@pytest.mark.unit
+def test_geography_index_refresh():
+    db = FakeSession(_GEOGRAPHIES)
+    open_db = _opener(db)
+    geography_index = GeographyIndex(refresh_interval_s=300)
+
+    geographies = geography_index.get(open_db)
+    assert geography_index.get(open_db) is geographies
+    assert db.queries == 1
+
+    # Unknown slugs are not looked for in the database until the next reload
+    db.rows = _GEOGRAPHIES + [(5, "nepal", "NPL", 1)]
+    geographies = geography_index.get(open_db)
+    assert geographies.country_value("nepal") is None
+    assert db.queries == 1
+
+    # The stale hierarchy is served while it is reloaded
+    db.available.clear()
+    geography_index._loaded_at -= 300
+    assert geography_index.get(open_db) is geographies
+    db.available.set()
+    _wait_for_queries(db, 2)
+    deadline = time.monotonic() + 5
+    while geography_index.get(open_db) is geographies:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert db.queries == 2
+    assert geography_index.get(open_db).country_values_for_region("south-asia") == [
+        "AFG",
+        "BTN",
+        "NPL",
+    ]
+
+
+@pytest.mark.unit
+def test_geography_index_keeps_unchanged_hierarchy():
+    db = FakeSession(_GEOGRAPHIES)
+    open_db = _opener(db)
+    geography_index = GeographyIndex(refresh_interval_s=0)
+
+    geographies = geography_index.get(open_db)
+    assert geography_index.get(open_db) is geographies
+    _wait_for_queries(db, 2)
+    assert geography_index.get(open_db) is geographies
+
+    db.rows = [(1, "south-asia", "South Asia", None), (2, "afghanistan", "AFG", 1)]
+    deadline = time.monotonic() + 5
+    while geography_index.get(open_db) is geographies:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert geography_index.get(open_db).country_values_for_region("south-asia") == [
+        "AFG"
+    ]
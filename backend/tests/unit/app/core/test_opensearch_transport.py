@@ -0,0 +1,53 @@
+import pytest
+
+from app.core.search import OpenSearchConfig, OpenSearchConnection
+
+
+@pytest.mark.unit
+def test_connection_uses_every_configured_node():
+    connection = OpenSearchConnection(
+        OpenSearchConfig(
+            url="http://node1:9200, http://node2:9200",
+            connection_pool_maxsize=4,
+            http_compress=True,
+        )
+    )
+    connection.connect()
+
+    connections = connection._get_connection().transport.connection_pool.connections
+    assert sorted(c.host for c in connections) == [
+        "http://node1:9200",
+        "http://node2:9200",
+    ]
+    assert all(c.http_compress for c in connections)
+    assert all(c.pool.pool.maxsize == 4 for c in connections)
+    assert all(c.headers["connection"] == "keep-alive" for c in connections)
+
+
+@pytest.mark.unit
+def test_connection_is_created_once():
+    connection = OpenSearchConnection(OpenSearchConfig(url="http://node1:9200"))
+    connection.connect()
+    client = connection._get_connection()
+    connection.connect()
+
+    assert connection._get_connection() is client
+
+    connection.close()
+    assert connection._opensearch_connection is None
+
+
+@pytest.mark.unit
+def test_connection_can_skip_certificate_verification():
+    connection = OpenSearchConnection(
+        OpenSearchConfig(
+            url="https://node1:9200",
+            use_ssl=True,
+            verify_certs=False,
+            ssl_show_warnings=False,
+        )
+    )
+    connection.connect()
+
+    connections = connection._get_connection().transport.connection_pool.connections
+    assert all(c.pool.cert_reqs == "CERT_NONE" for c in connections)
@@ -0,0 +1,128 @@
+import json
+
+import numpy as np
+import pytest
+
+import app.core.search
+from app.api.api_v1.schemas.search import FilterField, SearchRequestBody, SortField
+from app.core.encoder import SentenceEncoder
+from app.core.query_templates import QueryTemplate, template_param
+from app.core.search import (
+    OpenSearchQueryConfig,
+    TemplatedQueryBuilder,
+    build_opensearch_request_body,
+    dumps_template_param,
+)
+
+
+class FakeEncoder(SentenceEncoder):
+    """Encoder returning a small embedding derived from each text."""
+
+    @property
+    def is_ready(self) -> bool:
+        """Override"""
+        return True
+
+    def warmup(self) -> None:
+        """Override"""
+        pass
+
+    def encode_batch(self, texts):
+        """Override"""
+        return np.array([[len(t), 0.5, 0.25] for t in texts], dtype=np.float32)
+
+
+@pytest.fixture(autouse=True)
+def fake_encoder(monkeypatch):
+    monkeypatch.setattr(app.core.search, "get_encoder", lambda: FakeEncoder())
+
+
+def _request(**kwargs) -> SearchRequestBody:
+    return SearchRequestBody(
+        **{"query_string": "forest fires", "exact_match": False, **kwargs}
+    )
+
+
+def _serialise(query) -> dict:
+    return json.loads(app.core.search._JSON_SERIALIZER.dumps(query))
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "search_request",
+    [
+        _request(),
+        _request(exact_match=True),
+        _request(sort_field=SortField.DATE, sort_order="asc"),
+        _request(
+            keyword_filters={FilterField.COUNTRY: ["KEN", "GBR"]},
+            year_range=(2010, None),
+        ),
+        _request(year_range=(2010, 2020)),
+        _request(query_string="", limit=5, offset=10),
+        _request(query_string="", sort_field=SortField.TITLE, limit=5, offset=0),
+        _request(facets=[FilterField.COUNTRY, FilterField.TYPE]),
+        _request(query_string="", facets=[FilterField.COUNTRY]),
+    ],
+)
+def test_template_renders_the_built_request_body(search_request):
+    built = build_opensearch_request_body(search_request.copy(deep=True))
+    templated = build_opensearch_request_body(
+        search_request.copy(deep=True), use_templates=True
+    )
+
+    query = templated.query
+    rendered = query.template.render(query.params, dumps_template_param)
+    assert json.loads(rendered) == _serialise(built.query)
+
+
+@pytest.mark.unit
+def test_template_renders_document_keys_filter_without_passages():
+    config = OpenSearchQueryConfig()
+    built = build_opensearch_request_body(_request(), config)
+    built.with_document_keys_filter(["a", "b"])
+    built.without_passages()
+    templated = build_opensearch_request_body(_request(), config, use_templates=True)
+    templated.with_document_keys_filter(["a", "b"])
+    templated.without_passages()
+
+    query = templated.query
+    rendered = query.template.render(query.params, dumps_template_param)
+    assert json.loads(rendered) == _serialise(built.query)
+
+
+@pytest.mark.unit
+def test_template_is_compiled_once_per_shape():
+    first = build_opensearch_request_body(_request(), use_templates=True)
+    second = build_opensearch_request_body(
+        _request(query_string="coastal flooding"), use_templates=True
+    )
+    exact = build_opensearch_request_body(
+        _request(exact_match=True), use_templates=True
+    )
+
+    assert isinstance(first, TemplatedQueryBuilder)
+    assert first.template() is second.template()
+    assert first.template() is not exact.template()
+    assert second.query.params["query_string"] == "coastal flooding"
+
+
+@pytest.mark.unit
+def test_query_template_mustache_source():
+    template = QueryTemplate.compile(
+        {
+            "query": {"match": {"text": template_param("query_string")}},
+            "range": {"gte": f"01/01/{template_param('year')}"},
+        }
+    )
+
+    assert template.mustache_source == (
+        '{"query":{"match":{"text":{{#toJson}}query_string{{/toJson}}}},'
+        '"range":{"gte":"01/01/{{year}}"}}'
+    )
+    assert json.loads(
+        template.render({"query_string": 'say "{{year}}"', "year": 2020})
+    ) == {
+        "query": {"match": {"text": 'say "{{year}}"'}},
+        "range": {"gte": "01/01/2020"},
+    }
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.api.api_v1.schemas.search import (
+    FilterField,
+    SearchRequestBody,
+    SearchResults,
+)
+from app.core.search import (
+    OpenSearchConfig,
+    OpenSearchConnection,
+    OpenSearchQueryConfig,
+)
+from app.core.search_cache import (
+    AsyncSingleFlight,
+    PrecomputedResults,
+    SingleFlight,
+    TTLCache,
+    canonical_search_request,
+    logged_search_request,
+    top_search_requests,
+    write_precomputed_results,
+)
+
+_INDICES = "navigator_core,navigator_pdfs_non_translated"
+
+
+@pytest.mark.unit
+def test_canonical_search_request_ignores_irrelevant_differences():
+    first = SearchRequestBody(
+        query_string="Climate  change!",
+        keyword_filters={
+            FilterField.COUNTRY: ["KEN", "AFG"],
+            FilterField.SOURCE: ["CCLW"],
+        },
+        jit_query="disabled",
+    )
+    second = SearchRequestBody(
+        query_string="climate change",
+        keyword_filters={
+            FilterField.SOURCE: ["CCLW"],
+            FilterField.COUNTRY: ["AFG", "KEN", "AFG"],
+        },
+    )
+
+    assert canonical_search_request(
+        first, _INDICES, OpenSearchQueryConfig()
+    ) == canonical_search_request(
+        second,
+        "navigator_pdfs_non_translated,navigator_core",
+        OpenSearchQueryConfig(timeout_ms=500),
+    )
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "changes",
+    [
+        {"query_string": "climate"},
+        {"offset": 10},
+        {"exact_match": True},
+        {"keyword_filters": {FilterField.COUNTRY: ["KEN"]}},
+        {"year_range": (2000, None)},
+        {"sort_field": "date"},
+    ],
+)
+def test_canonical_search_request_distinguishes_results(changes):
+    base = SearchRequestBody(query_string="climate change")
+    changed = base.copy(update=changes)
+    config = OpenSearchQueryConfig()
+
+    base_key = canonical_search_request(base, _INDICES, config)
+    assert base_key != canonical_search_request(changed, _INDICES, config)
+
+
+@pytest.mark.unit
+def test_ttl_cache_expires_entries():
+    cache: TTLCache[str] = TTLCache(max_size=10, ttl_s=0.05)
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+
+    time.sleep(0.1)
+    assert cache.get("key") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.unit
+def test_ttl_cache_invalidates_on_generation_change():
+    cache: TTLCache[str] = TTLCache(max_size=10, ttl_s=60)
+    cache.set("key", "value", generation="1")
+
+    assert cache.get("key", generation="2") is None
+    assert cache.get("key", generation="1") is None
+
+
+@pytest.mark.unit
+def test_ttl_cache_evicts_least_recently_used():
+    cache: TTLCache[int] = TTLCache(max_size=2, ttl_s=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+@pytest.mark.unit
+def test_single_flight_coalesces_concurrent_calls():
+    flights: SingleFlight[int] = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def search() -> int:
+        calls.append(1)
+        release.wait(5)
+        return len(calls)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(flights.do, "key", search) for _ in range(4)]
+        while flights.hits < 3:
+            time.sleep(0.01)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert results == [1, 1, 1, 1]
+    assert (flights.hits, flights.misses) == (3, 1)
+    # Calls made after the first completes are not coalesced with it
+    assert flights.do("key", search) == 2
+    assert len(flights) == 0
+
+
+@pytest.mark.unit
+def test_single_flight_shares_exceptions():
+    flights: SingleFlight[int] = SingleFlight()
+
+    def search() -> int:
+        raise ValueError("Search failed")
+
+    with pytest.raises(ValueError):
+        flights.do("key", search)
+    assert len(flights) == 0
+
+
+@pytest.mark.unit
+def test_async_single_flight_coalesces_concurrent_calls():
+    flights: AsyncSingleFlight[str] = AsyncSingleFlight()
+    calls = []
+
+    async def search(key: str) -> str:
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key
+
+    async def run():
+        return await asyncio.gather(
+            *[flights.do(key, lambda k=key: search(k)) for key in "aaab"]
+        )
+
+    assert asyncio.run(run()) == ["a", "a", "a", "b"]
+    assert calls == ["a", "b"]
+    assert (flights.hits, flights.misses) == (2, 2)
+    assert len(flights) == 0
+
+
+def _log_line(**search_request) -> str:
+    return json.dumps(
+        {
+            "message": "Search request (jit=JitQuery.ENABLED)",
+            "search_request": {"jit_query": "enabled", **search_request},
+        }
+    )
+
+
+@pytest.mark.unit
+def test_top_search_requests_from_logs():
+    log_lines = [
+        _log_line(query_string="Forests"),
+        _log_line(query_string="floods"),
+        "Not a JSON log line",
+        json.dumps({"message": "Another log line"}),
+        _log_line(query_string="forests!"),
+        _log_line(query_string="forests", offset=10),
+        _log_line(query_string="floods", exact_match=True),
+        _log_line(query_string="forests"),
+    ]
+    search_requests = [logged_search_request(line) for line in log_lines]
+
+    top_requests = top_search_requests(
+        [r for r in search_requests if r is not None], 2, OpenSearchQueryConfig()
+    )
+
+    assert [(r.query_string, r.exact_match) for r in top_requests] == [
+        ("Forests", False),
+        ("floods", False),
+    ]
+
+
+class UnusedClient:
+    """Fails any search, which should be served from precomputed results."""
+
+    def search(self, *args, **kwargs):
+        """Override"""
+        raise AssertionError("Precomputed results should not be searched for")
+
+
+@pytest.mark.unit
+def test_precomputed_results_are_served_for_the_current_generation(tmp_path):
+    connection = OpenSearchConnection(OpenSearchConfig(index_prefix="test"))
+    connection._opensearch_connection = UnusedClient()  # type: ignore
+    connection._index_generation = "1"
+    connection._index_generation_checked_at = float("inf")
+    search_request = SearchRequestBody(query_string="forests")
+    config = OpenSearchQueryConfig()
+    write_precomputed_results(
+        str(tmp_path),
+        {
+            connection.search_request_key(search_request, config): SearchResults(
+                hits=1, query_time_ms=5, cursor="token", documents=[]
+            )
+        },
+        generation="1",
+    )
+    connection._precomputed_results = PrecomputedResults.load(str(tmp_path))
+
+    assert connection.has_precomputed_results(search_request, config)
+    results = connection.query(
+        search_request.copy(update={"query_string": "Forests"}),
+        OpenSearchQueryConfig(timeout_ms=500),
+        None,
+    )
+    assert (results.hits, results.query_time_ms, results.cursor) == (1, 5, None)
+
+    # Results are not served once the indices are rebuilt
+    connection._index_generation = "2"
+    assert not connection.has_precomputed_results(search_request, config)
@@ -0,0 +1,185 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.api.api_v1.schemas.search import SearchRequestBody
+from app.core.search import (
+    OpenSearchConfig,
+    OpenSearchConnection,
+    OpenSearchQueryConfig,
+    OpenSearchResponse,
+    create_search_cursor,
+    process_search_response_body,
+)
+from app.core.search_cache import SearchCursor, TTLCache
+
+
+def _passage_hit(slug: str) -> dict:
+    return {
+        "_source": {
+            "document_name": slug,
+            "document_geography": "KEN",
+            "document_description": "A description",
+            "document_sectors": [],
+            "document_source": "CCLW",
+            "document_id": f"CCLW.{slug}",
+            "document_date": "01/01/2020",
+            "document_type": "Law",
+            "document_source_url": None,
+            "document_cdn_object": None,
+            "document_category": "Law",
+            "document_content_type": None,
+            "document_slug": slug,
+            "text": "Some text",
+            "text_block_id": "p_0_b_0",
+            "text_block_page": 0,
+            "text_block_coords": [],
+        }
+    }
+
+
+def _response(slugs: list[str]) -> OpenSearchResponse:
+    return OpenSearchResponse(
+        raw_response={
+            "aggregations": {
+                "no_unique_docs": {"value": 42},
+                "sample": {
+                    "top_docs": {
+                        "buckets": [
+                            {
+                                "key": f"{slug}_key",
+                                "top_hit": {"value": 10.0 - i},
+                                "top_passage_hits": {
+                                    "hits": {"hits": [_passage_hit(slug)]}
+                                },
+                            }
+                            for i, slug in enumerate(slugs)
+                        ]
+                    }
+                },
+            }
+        },
+        request_time_ms=5,
+    )
+
+
+@pytest.mark.unit
+def test_create_search_cursor():
+    cursor = create_search_cursor(_response(["a", "b", "c"]), "request", 20)
+
+    assert cursor.document_keys == ("a_key", "b_key", "c_key")
+    assert cursor.scores == (10.0, 9.0, 8.0)
+    assert cursor.hits == 42
+    assert cursor.is_complete
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "offset,limit,max_doc_count,covered",
+    [
+        (0, 2, 100, True),
+        (1, 2, 100, False),
+        (1, 2, 2, True),
+    ],
+)
+def test_search_cursor_covers(offset, limit, max_doc_count, covered):
+    cursor = SearchCursor(
+        request_key="request",
+        document_keys=("a_key", "b_key"),
+        scores=(2.0, 1.0),
+        hits=10,
+        max_doc_count=2,
+    )
+
+    assert cursor.covers(offset, limit, max_doc_count) is covered
+
+
+@pytest.mark.unit
+def test_process_search_response_body_orders_by_document_keys():
+    results = process_search_response_body(
+        _response(["a", "b", "c"]),
+        limit=3,
+        offset=0,
+        document_keys=["c_key", "missing_key", "a_key"],
+    )
+
+    assert [d.document_slug for d in results.documents] == ["c", "a"]
+
+
+class FakeClient:
+    """Responds with the given documents once released, counting the searches."""
+
+    def __init__(self, slugs: list[str], release: threading.Event):
+        self.slugs = slugs
+        self.release = release
+        self.searches = 0
+
+    def search(self, body, index, request_timeout, preference):
+        """Override"""
+        self.searches += 1
+        self.release.wait(5)
+        return _response(self.slugs).raw_response
+
+
+def _result_set_connection(
+    client: FakeClient, coalesce_searches: bool = False
+) -> OpenSearchConnection:
+    connection = OpenSearchConnection(
+        OpenSearchConfig(index_prefix="test", coalesce_searches=coalesce_searches),
+        result_set_store=TTLCache(10, 60),
+    )
+    connection._opensearch_connection = client  # type: ignore
+    connection._index_generation_checked_at = float("inf")
+    return connection
+
+
+def _page(offset: int) -> SearchRequestBody:
+    return SearchRequestBody(
+        query_string="forests",
+        exact_match=True,
+        limit=2,
+        offset=offset,
+        jit_query="disabled",
+    )
+
+
+@pytest.mark.unit
+def test_later_pages_are_served_from_the_result_set():
+    release = threading.Event()
+    release.set()
+    client = FakeClient(["a", "b", "c"], release)
+    connection = _result_set_connection(client)
+    config = OpenSearchQueryConfig(max_doc_count=10, two_phase=False)
+
+    first_page = connection.query(_page(0), config, None)
+    second_page = connection.query(_page(2), config, None)
+
+    assert [d.document_slug for d in first_page.documents] == ["a", "b"]
+    assert [d.document_slug for d in second_page.documents] == ["c"]
+    assert second_page.hits == 42
+    assert client.searches == 1
+
+
+@pytest.mark.unit
+def test_later_pages_wait_for_the_search_in_flight():
+    release = threading.Event()
+    client = FakeClient(["a", "b", "c"], release)
+    connection = _result_set_connection(client, coalesce_searches=True)
+    config = OpenSearchQueryConfig(max_doc_count=10, two_phase=False)
+    flights = connection._result_set_flights
+    assert flights is not None
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        background = executor.submit(connection.query, _page(0), config, None)
+        while client.searches == 0:
+            time.sleep(0.01)
+        second_page = executor.submit(connection.query, _page(2), config, None)
+        while flights.hits == 0:
+            time.sleep(0.01)
+        release.set()
+
+        assert len(background.result().documents) == 2
+        assert [d.document_slug for d in second_page.result().documents] == ["c"]
+    assert client.searches == 1
@@ -0,0 +1,127 @@
+import pytest
+
+from app.api.api_v1.schemas.search import FilterField, SearchRequestBody
+from app.core.search import (
+    OpenSearchQueryConfig,
+    OpenSearchResponse,
+    build_opensearch_request_body,
+    create_search_cursor,
+    merge_search_responses,
+    process_browse_response_body,
+    process_search_response_body,
+)
+
+
+def _facet(counts: dict[str, int]) -> dict:
+    return {
+        "buckets": [
+            {"key": key, "doc_count": count * 3, "documents": {"value": count}}
+            for key, count in counts.items()
+        ]
+    }
+
+
+def _search_response(facets: dict[str, dict]) -> OpenSearchResponse:
+    return OpenSearchResponse(
+        raw_response={
+            "took": 5,
+            "aggregations": {
+                "no_unique_docs": {"value": 0},
+                "sample": {"top_docs": {"buckets": []}, **facets},
+            },
+        },
+        request_time_ms=5,
+    )
+
+
+def _search_request(**kwargs) -> SearchRequestBody:
+    return SearchRequestBody(
+        query_string="forests", exact_match=True, jit_query="disabled", **kwargs
+    )
+
+
+@pytest.mark.unit
+def test_search_request_with_facets():
+    body = build_opensearch_request_body(
+        _search_request(facets=[FilterField.COUNTRY, FilterField.SOURCE]),
+        OpenSearchQueryConfig(facet_size=10),
+    ).query
+
+    sample_aggs = body["aggs"]["sample"]["aggs"]
+    assert sample_aggs["facet_countries"] == {
+        "terms": {"field": "document_geography", "size": 10},
+        "aggs": {"documents": {"cardinality": {"field": "document_slug"}}},
+    }
+    assert sample_aggs["facet_sources"]["terms"]["field"] == "document_source"
+
+
+@pytest.mark.unit
+def test_search_request_without_facets():
+    body = build_opensearch_request_body(_search_request()).query
+
+    sample_aggs = body["aggs"]["sample"]["aggs"]
+    assert not any(name.startswith("facet_") for name in sample_aggs)
+
+
+@pytest.mark.unit
+def test_browse_request_with_facets():
+    body = build_opensearch_request_body(
+        SearchRequestBody(query_string="", facets=[FilterField.TYPE])
+    ).query
+
+    assert body["aggs"]["facet_types"] == {
+        "terms": {"field": "document_type", "size": 250},
+    }
+
+
+@pytest.mark.unit
+def test_process_search_response_facets():
+    response = _search_response({"facet_countries": _facet({"KEN": 2, "GBR": 1})})
+
+    results = process_search_response_body(response, limit=10, offset=0)
+    cursor = create_search_cursor(response, "request", 100)
+
+    assert results.facets == {FilterField.COUNTRY: {"KEN": 2, "GBR": 1}}
+    assert cursor.facets == results.facets
+
+
+@pytest.mark.unit
+def test_process_search_response_without_facets():
+    results = process_search_response_body(_search_response({}), limit=10, offset=0)
+
+    assert results.facets is None
+
+
+@pytest.mark.unit
+def test_process_browse_response_facets():
+    response = OpenSearchResponse(
+        raw_response={
+            "hits": {"total": {"value": 0}, "hits": []},
+            "aggregations": {
+                "facet_types": {"buckets": [{"key": "Law", "doc_count": 4}]}
+            },
+        },
+        request_time_ms=5,
+    )
+
+    results = process_browse_response_body(response)
+
+    assert results.facets == {FilterField.TYPE: {"Law": 4}}
+
+
+@pytest.mark.unit
+def test_merge_search_response_facets():
+    request_body = build_opensearch_request_body(
+        _search_request(facets=[FilterField.COUNTRY])
+    ).query
+    responses = [
+        _search_response({"facet_countries": _facet({"KEN": 2, "GBR": 1})}),
+        _search_response({"facet_countries": _facet({"GBR": 3})}),
+    ]
+
+    merged = merge_search_responses(
+        request_body, responses, request_time_ms=5, partial=False
+    )
+    results = process_search_response_body(merged, limit=10, offset=0)
+
+    assert results.facets == {FilterField.COUNTRY: {"GBR": 4, "KEN": 2}}
@@ -0,0 +1,314 @@
+import json
+import threading
+from typing import Optional
+
+import pytest
+from opensearchpy.exceptions import ConnectionTimeout
+
+from app.api.api_v1.schemas.search import SearchRequestBody, SortField, SortOrder
+from app.core.search import (
+    OpenSearchConfig,
+    OpenSearchConnection,
+    OpenSearchQueryConfig,
+    OpenSearchResponse,
+    build_opensearch_request_body,
+    merge_search_responses,
+)
+from app.core.search_cache import TTLCache
+
+
+def _passage_hit(slug: str, score: float, page: int) -> dict:
+    return {
+        "_score": score,
+        "_source": {
+            "document_name": slug,
+            "document_geography": "KEN",
+            "document_description": "A description",
+            "document_sectors": [],
+            "document_source": "CCLW",
+            "document_id": f"CCLW.{slug}",
+            "document_date": "01/01/2020",
+            "document_type": "Law",
+            "document_source_url": None,
+            "document_cdn_object": None,
+            "document_category": "Law",
+            "document_content_type": None,
+            "document_slug": slug,
+            "text": "Some text",
+            "text_block_id": f"p_{page}_b_0",
+            "text_block_page": page,
+            "text_block_coords": [],
+        },
+    }
+
+
+def _bucket(slug: str, scores: list[float], date: Optional[float] = 1.0) -> dict:
+    return {
+        "key": f"{slug}_key",
+        "doc_count": len(scores),
+        "top_hit": {"value": max(scores)},
+        "document_date": {
+            "count": len(scores) if date is not None else 0,
+            "min": date,
+            "max": date,
+            "avg": date,
+            "sum": date * len(scores) if date is not None else 0.0,
+        },
+        "top_passage_hits": {
+            "hits": {
+                "hits": [
+                    _passage_hit(slug, score, page) for page, score in enumerate(scores)
+                ]
+            }
+        },
+    }
+
+
+def _response(buckets: list[dict], unique_docs: int) -> dict:
+    return {
+        "took": 5,
+        "aggregations": {
+            "no_unique_docs": {"value": unique_docs},
+            "sample": {"top_docs": {"buckets": buckets}},
+        },
+    }
+
+
+def _request_body(
+    max_doc_count: int = 2, max_passages_per_doc: int = 2, **request
+) -> dict:
+    search_request = SearchRequestBody(
+        query_string="forests",
+        exact_match=True,
+        max_passages_per_doc=max_passages_per_doc,
+        jit_query="disabled",
+        **request,
+    )
+    return dict(
+        build_opensearch_request_body(
+            search_request,
+            OpenSearchQueryConfig(
+                max_doc_count=max_doc_count,
+                max_passages_per_doc=max_passages_per_doc,
+            ),
+        ).query
+    )
+
+
+@pytest.mark.unit
+def test_merge_search_responses():
+    core = OpenSearchResponse(
+        raw_response=_response([_bucket("a", [1.0]), _bucket("b", [5.0])], 2),
+        request_time_ms=5,
+    )
+    pdfs = OpenSearchResponse(
+        raw_response=_response([_bucket("a", [9.0, 2.0]), _bucket("c", [3.0])], 2),
+        request_time_ms=5,
+    )
+
+    merged = merge_search_responses(
+        _request_body(), [core, pdfs], request_time_ms=7, partial=False
+    )
+
+    aggregations = merged.raw_response["aggregations"]
+    buckets = aggregations["sample"]["top_docs"]["buckets"]
+    assert [b["key"] for b in buckets] == ["a_key", "b_key"]
+    assert buckets[0]["top_hit"]["value"] == 9.0
+    assert buckets[0]["doc_count"] == 3
+    assert buckets[0]["document_date"]["count"] == 3
+    assert [h["_score"] for h in buckets[0]["top_passage_hits"]["hits"]["hits"]] == [
+        9.0,
+        2.0,
+    ]
+    assert aggregations["no_unique_docs"]["value"] == 3
+    assert merged.request_time_ms == 7
+    assert not merged.partial
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("order", [SortOrder.ASCENDING, SortOrder.DESCENDING])
+def test_merge_search_responses_orders_documents_without_dates_last(order):
+    core = OpenSearchResponse(
+        raw_response=_response(
+            [_bucket("a", [1.0], date=2.0), _bucket("b", [5.0], date=None)], 2
+        ),
+        request_time_ms=5,
+    )
+    pdfs = OpenSearchResponse(
+        raw_response=_response([_bucket("c", [3.0], date=1.0)], 1),
+        request_time_ms=5,
+    )
+    request_body = _request_body(
+        max_doc_count=3, sort_field=SortField.DATE, sort_order=order
+    )
+
+    merged = merge_search_responses(
+        request_body, [core, pdfs], request_time_ms=7, partial=False
+    )
+
+    buckets = merged.raw_response["aggregations"]["sample"]["top_docs"]["buckets"]
+    dated_keys = ["c_key", "a_key"]
+    if order == SortOrder.DESCENDING:
+        dated_keys.reverse()
+    assert [b["key"] for b in buckets] == dated_keys + ["b_key"]
+
+
+class FakeClient:
+    """OpenSearch client returning a fixed search response for each index."""
+
+    def __init__(self, responses_by_index):
+        self.responses_by_index = responses_by_index
+        self.search_calls = []
+        self.search_params = []
+        self.search_bodies = []
+
+    def search(self, body, index, request_timeout, preference, **params):
+        """Record the search, returning or raising the response for its index."""
+        self.search_calls.append((index, request_timeout))
+        self.search_params.append(params)
+        self.search_bodies.append(json.loads(body) if isinstance(body, str) else body)
+        response = self.responses_by_index[index]
+        if isinstance(response, threading.Event):
+            response.wait()
+            raise ConnectionTimeout("TIMEOUT", "timed out", Exception())
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.mark.unit
+def test_fan_out_search_returns_partial_results():
+    connection = OpenSearchConnection(
+        OpenSearchConfig(
+            index_prefix="test",
+            fan_out_search=True,
+            fan_out_index_timeout_s=2,
+        ),
+        result_cache=TTLCache(10, 60),
+        cursor_store=TTLCache(10, 60),
+    )
+    client = FakeClient(
+        {
+            "test_core": _response([_bucket("a", [1.0])], 1),
+            "test_pdfs_non_translated": ConnectionTimeout(
+                "TIMEOUT", "timed out", Exception()
+            ),
+        }
+    )
+    connection._opensearch_connection = client  # type: ignore
+    connection._index_generation_checked_at = float("inf")
+    search_request = SearchRequestBody(
+        query_string="forests", exact_match=True, jit_query="disabled"
+    )
+
+    config = OpenSearchQueryConfig(max_doc_count=100)
+
+    results = connection.query(search_request, config, None)
+
+    assert results.partial
+    assert results.cursor is None
+    assert [d.document_slug for d in results.documents] == ["a"]
+    assert sorted(client.search_calls) == [
+        ("test_core", 2),
+        ("test_pdfs_non_translated", 2),
+    ]
+    # OpenSearch stops searching each index once its time is spent
+    assert all(params["timeout"] == "2000ms" for params in client.search_params)
+    # Each index returns its share of the documents, from as many from each shard
+    for body in client.search_bodies:
+        terms = body["aggs"]["sample"]["aggs"]["top_docs"]["terms"]
+        assert (terms["size"], terms["shard_size"]) == (85, 160)
+    # Partial results are not cached
+    connection.query(search_request, config, None)
+    assert len(client.search_calls) == 4
+
+
+@pytest.mark.unit
+def test_fan_out_search_does_not_wait_for_unresponsive_index():
+    connection = OpenSearchConnection(
+        OpenSearchConfig(
+            index_prefix="test",
+            fan_out_search=True,
+            fan_out_index_timeout_s=0.1,
+        ),
+    )
+    unresponsive = threading.Event()
+    client = FakeClient(
+        {
+            "test_core": _response([_bucket("a", [1.0])], 1),
+            "test_pdfs_non_translated": unresponsive,
+        }
+    )
+    connection._opensearch_connection = client  # type: ignore
+    search_request = SearchRequestBody(
+        query_string="forests", exact_match=True, jit_query="disabled"
+    )
+
+    try:
+        results = connection.query(search_request, OpenSearchQueryConfig(), None)
+    finally:
+        unresponsive.set()
+
+    assert results.partial
+    assert [d.document_slug for d in results.documents] == ["a"]
+
+
+@pytest.mark.unit
+def test_latency_budget_returns_partial_results():
+    connection = OpenSearchConnection(
+        OpenSearchConfig(index_prefix="test", request_timeout=30),
+        result_cache=TTLCache(10, 60),
+    )
+    client = FakeClient(
+        {
+            "test_core,test_pdfs_non_translated": {
+                **_response([_bucket("a", [1.0])], 1),
+                "timed_out": True,
+            }
+        }
+    )
+    connection._opensearch_connection = client  # type: ignore
+    connection._index_generation_checked_at = float("inf")
+    search_request = SearchRequestBody(
+        query_string="forests", exact_match=True, jit_query="disabled"
+    )
+    config = OpenSearchQueryConfig(timeout_ms=500, terminate_after=1000)
+
+    results = connection.query(search_request, config, None)
+
+    assert results.partial
+    assert [d.document_slug for d in results.documents] == ["a"]
+    assert client.search_calls == [("test_core,test_pdfs_non_translated", 1.5)]
+    assert client.search_params == [{"timeout": "500ms", "terminate_after": 1000}]
+    # Partial results are not cached
+    connection.query(search_request, config, None)
+    assert len(client.search_calls) == 2
+
+
+@pytest.mark.unit
+def test_fan_out_search_limits_each_index_to_the_latency_budget():
+    connection = OpenSearchConnection(
+        OpenSearchConfig(
+            index_prefix="test",
+            fan_out_search=True,
+            fan_out_index_timeout_s=2,
+        ),
+    )
+    client = FakeClient(
+        {
+            "test_core": _response([_bucket("a", [1.0])], 1),
+            "test_pdfs_non_translated": _response([_bucket("b", [2.0])], 1),
+        }
+    )
+    connection._opensearch_connection = client  # type: ignore
+    search_request = SearchRequestBody(
+        query_string="forests", exact_match=True, jit_query="disabled"
+    )
+
+    connection.query(search_request, OpenSearchQueryConfig(timeout_ms=500), None)
+
+    assert sorted(client.search_calls) == [
+        ("test_core", 1.5),
+        ("test_pdfs_non_translated", 1.5),
+    ]
+    assert all(params["timeout"] == "500ms" for params in client.search_params)
@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+from app.core.search_flow import ComputeStep, run, run_async
+
+
+def _flow():
+    total = yield ComputeStep(sum, ([1, 2],))
+    try:
+        yield ComputeStep(int, ("not a number",))
+    except ValueError:
+        total += 10
+    return total
+
+
+def _run_step(step):
+    return step.function(*step.args)
+
+
+async def _run_step_async(step):
+    return step.function(*step.args)
+
+
+@pytest.mark.unit
+def test_run_sends_results_and_throws_errors_into_the_flow():
+    assert run(_flow(), _run_step) == 13
+
+
+@pytest.mark.unit
+def test_run_async_sends_results_and_throws_errors_into_the_flow():
+    assert asyncio.run(run_async(_flow(), _run_step_async)) == 13
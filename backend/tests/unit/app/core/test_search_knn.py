@@ -0,0 +1,209 @@
+import dataclasses
+import json
+
+import numpy as np
+import pytest
+
+import app.core.search
+from app.api.api_v1.schemas.search import FilterField, SearchRequestBody
+from app.core.encoder import SentenceEncoder
+from app.core.search import (
+    OpenSearchConfig,
+    OpenSearchConnection,
+    OpenSearchQueryConfig,
+    build_opensearch_request_body,
+    knn_k_schedule,
+)
+from app.core.search_cache import TTLCache
+
+
+class FakeEncoder(SentenceEncoder):
+    """Encoder returning a small embedding derived from each text."""
+
+    @property
+    def is_ready(self) -> bool:
+        """Override"""
+        return True
+
+    def warmup(self) -> None:
+        """Override"""
+        pass
+
+    def encode_batch(self, texts):
+        """Override"""
+        return np.array([[len(t), 0.5, 0.25] for t in texts], dtype=np.float32)
+
+
+@pytest.fixture(autouse=True)
+def fake_encoder(monkeypatch):
+    monkeypatch.setattr(app.core.search, "get_encoder", lambda: FakeEncoder())
+
+
+def _request(**kwargs) -> SearchRequestBody:
+    return SearchRequestBody(
+        **{"query_string": "forest fires", "exact_match": False, **kwargs}
+    )
+
+
+def _knn_queries(body) -> list[dict]:
+    should = body["query"]["bool"]["should"]
+    return [
+        clause["function_score"]["query"]["knn"][field]
+        for group, field in [
+            (should[1], "document_description_embedding"),
+            (should[2], "text_embedding"),
+        ]
+        for clause in group["bool"]["should"]
+        if "function_score" in clause
+    ]
+
+
+_ADAPTIVE_CONFIG = OpenSearchQueryConfig(
+    k=10000, adaptive_knn=True, knn_min_k=100, knn_k_per_doc=20, max_doc_count=100
+)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "config,offset,limit,schedule",
+    [
+        (OpenSearchQueryConfig(k=10000), 0, 10, [10000]),
+        (_ADAPTIVE_CONFIG, 0, 10, [200, 10000]),
+        (_ADAPTIVE_CONFIG, 0, 2, [100, 10000]),
+        (_ADAPTIVE_CONFIG, 490, 10, [2000, 10000]),
+        (dataclasses.replace(_ADAPTIVE_CONFIG, k=1000), 0, 100, [1000]),
+    ],
+)
+def test_knn_k_schedule(config, offset, limit, schedule):
+    search_request = _request(offset=offset, limit=limit)
+
+    assert knn_k_schedule(search_request, config) == schedule
+
+
+@pytest.mark.unit
+def test_knn_filter():
+    search_request = _request(
+        keyword_filters={FilterField.COUNTRY: ["KEN"]}, year_range=(2010, None)
+    )
+
+    body = build_opensearch_request_body(
+        search_request, OpenSearchQueryConfig(knn_filter=True)
+    ).query
+
+    knn_queries = _knn_queries(body)
+    assert len(knn_queries) == 2
+    for knn_query in knn_queries:
+        assert knn_query["filter"]["bool"]["filter"] == body["query"]["bool"]["filter"]
+
+
+@pytest.mark.unit
+def test_knn_filter_disabled():
+    search_request = _request(keyword_filters={FilterField.COUNTRY: ["KEN"]})
+
+    body = build_opensearch_request_body(
+        search_request, OpenSearchQueryConfig(knn_filter=False)
+    ).query
+
+    assert all("filter" not in knn_query for knn_query in _knn_queries(body))
+
+
+@pytest.mark.unit
+def test_templated_knn_filter():
+    search_request = _request(keyword_filters={FilterField.COUNTRY: ["KEN"]})
+    config = OpenSearchQueryConfig(knn_filter=True)
+
+    query = build_opensearch_request_body(
+        search_request.copy(), config, use_templates=True
+    ).query
+    rendered = json.loads(
+        query.template.render(query.params, app.core.search.dumps_template_param)
+    )
+    built = build_opensearch_request_body(search_request, config).query
+
+    assert rendered == json.loads(app.core.search._JSON_SERIALIZER.dumps(built))
+
+
+def _bucket(slug: str) -> dict:
+    passage_hit = {
+        "_source": {
+            "document_name": slug,
+            "document_geography": "KEN",
+            "document_description": "A description",
+            "document_sectors": [],
+            "document_source": "CCLW",
+            "document_id": f"CCLW.{slug}",
+            "document_date": "01/01/2020",
+            "document_type": "Law",
+            "document_source_url": None,
+            "document_cdn_object": None,
+            "document_category": "Law",
+            "document_content_type": None,
+            "document_slug": slug,
+            "text": "Some text",
+            "text_block_id": "p_0_b_0",
+            "text_block_page": 0,
+            "text_block_coords": [],
+        }
+    }
+    return {
+        "key": f"{slug}_key",
+        "doc_count": 1,
+        "top_hit": {"value": 1.0},
+        "top_passage_hits": {"hits": {"hits": [passage_hit]}},
+    }
+
+
+class FakeClient:
+    """OpenSearch client finding a fixed number of documents for each kNN k."""
+
+    def __init__(self, doc_counts_by_k):
+        self.doc_counts_by_k = doc_counts_by_k
+        self.ks = []
+
+    def search(self, body, index, request_timeout, preference):
+        """Record the search's k, returning as many documents as it finds."""
+        if isinstance(body, (str, bytes)):
+            body = json.loads(body)
+        k = _knn_queries(body)[0]["k"]
+        self.ks.append(k)
+        buckets = [_bucket(str(i)) for i in range(self.doc_counts_by_k[k])]
+        return {
+            "took": 1,
+            "aggregations": {
+                "no_unique_docs": {"value": len(buckets)},
+                "sample": {"top_docs": {"buckets": buckets}},
+            },
+        }
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "doc_counts_by_k,ks,covers_next_page",
+    [
+        # Only the documents up to the end of the page are ranked with the reduced k
+        ({200: 12}, [200], False),
+        ({200: 3, 10000: 100}, [200, 10000], True),
+    ],
+)
+def test_adaptive_knn_expands_k_if_too_few_documents_are_found(
+    doc_counts_by_k, ks, covers_next_page
+):
+    connection = OpenSearchConnection(
+        OpenSearchConfig(index_prefix="test"),
+        cursor_store=TTLCache(10, 60),
+    )
+    client = FakeClient(doc_counts_by_k)
+    connection._opensearch_connection = client  # type: ignore
+    connection._index_generation_checked_at = float("inf")
+    cursor_store = connection._cursors.cursor_store
+    assert cursor_store is not None
+
+    results = connection.query(
+        _request(limit=10, offset=0, jit_query="disabled"), _ADAPTIVE_CONFIG, None
+    )
+
+    assert client.ks == ks
+    assert results.cursor is not None
+    cursor = cursor_store.get(results.cursor)
+    assert cursor is not None
+    assert cursor.covers(10, 10, _ADAPTIVE_CONFIG.max_doc_count) == covers_next_page
@@ -0,0 +1,171 @@
+import json
+
+import pytest
+
+from app.api.api_v1.routers import search
+from app.core.search import (
+    OpenSearchResponse,
+    process_browse_response_body,
+    process_search_response_body,
+)
+
+
+def _source(slug: str, **match_fields) -> dict:
+    return {
+        "document_name": slug,
+        "document_geography": "KEN",
+        "document_description": "A description",
+        "document_sectors": ["Energy"],
+        "document_source": "CCLW",
+        "document_id": f"CCLW.{slug}",
+        "document_date": "01/01/2020",
+        "document_type": "Law",
+        "document_source_url": None,
+        "document_cdn_object": f"KEN/2020/{slug}.pdf",
+        "document_category": "Law",
+        "document_content_type": "application/pdf",
+        "document_slug": slug,
+        **match_fields,
+    }
+
+
+def _passage(slug: str, page: int) -> dict:
+    return _source(
+        slug,
+        text=f"Text on page {page}",
+        text_block_id=f"p_{page}_b_0",
+        text_block_page=page,
+        text_block_coords=[[1.0, 2.0], [3.0, 4.0]],
+    )
+
+
+_SEARCH_RESPONSE = OpenSearchResponse(
+    raw_response={
+        "aggregations": {
+            "no_unique_docs": {"value": 3},
+            "sample": {
+                "top_docs": {
+                    "buckets": [
+                        {
+                            "key": "a_key",
+                            "top_passage_hits": {
+                                "hits": {
+                                    "hits": [
+                                        {
+                                            "_source": _source(
+                                                "a", for_search_document_name="a"
+                                            )
+                                        },
+                                        {"_source": _passage("a", 0)},
+                                        {"_source": _passage("a", 3)},
+                                    ]
+                                }
+                            },
+                        },
+                        {
+                            "key": "b_key",
+                            "top_passage_hits": {
+                                "hits": {
+                                    "hits": [
+                                        {
+                                            "_source": _source(
+                                                "b",
+                                                for_search_document_description="b",
+                                            )
+                                        },
+                                    ]
+                                }
+                            },
+                        },
+                        {
+                            "key": "c_key",
+                            "top_passage_hits": {
+                                "hits": {"hits": [{"_source": _passage("c", 1)}]}
+                            },
+                        },
+                    ]
+                }
+            },
+        }
+    },
+    request_time_ms=5,
+)
+
+
+@pytest.mark.unit
+def test_fast_search_response_parsing_matches_validated():
+    validated = process_search_response_body(_SEARCH_RESPONSE, limit=10)
+    fast = process_search_response_body(_SEARCH_RESPONSE, limit=10, validate=False)
+
+    assert fast.json() == validated.json()
+    assert [d.document_slug for d in fast.documents] == ["a", "b", "c"]
+    assert fast.documents[0].document_title_match
+    assert fast.documents[0].document_passage_matches[1].text_block_page == 4
+    assert fast.documents[1].document_description_match
+
+
+@pytest.mark.unit
+def test_fast_browse_response_parsing_matches_validated():
+    response = OpenSearchResponse(
+        raw_response={
+            "hits": {
+                "total": {"value": 2},
+                "hits": [
+                    {"_source": _source(slug, for_search_document_description=slug)}
+                    for slug in ["a", "b"]
+                ],
+            }
+        },
+        request_time_ms=5,
+    )
+
+    validated = process_browse_response_body(response)
+    fast = process_browse_response_body(response, validate=False)
+
+    assert fast.json() == validated.json()
+
+
+@pytest.mark.unit
+def test_fast_search_response_encoding_matches_validated(monkeypatch):
+    monkeypatch.setattr(
+        search,
+        "get_cached_postfix_map",
+        lambda open_db, doc_ids: {doc_id: f"{doc_id}.postfix" for doc_id in doc_ids},
+    )
+    results = process_search_response_body(_SEARCH_RESPONSE, limit=10, validate=False)
+
+    validated = search.create_search_results_response(None, results)  # type: ignore
+    monkeypatch.setattr(search._OPENSEARCH_CONFIG, "fast_response_parsing", True)
+    fast = search.search_results_json(None, results)  # type: ignore
+
+    assert json.loads(fast) == json.loads(validated.json())
+    assert json.loads(fast)["documents"][0]["document_postfix"] == "CCLW.a.postfix"
+
+
+@pytest.mark.unit
+def test_fast_search_response_parsing_rejects_missing_fields():
+    source = _passage("a", 0)
+    del source["document_slug"]
+    response = OpenSearchResponse(
+        raw_response={
+            "aggregations": {
+                "no_unique_docs": {"value": 1},
+                "sample": {
+                    "top_docs": {
+                        "buckets": [
+                            {
+                                "key": "a_key",
+                                "top_passage_hits": {
+                                    "hits": {"hits": [{"_source": source}]}
+                                },
+                            }
+                        ]
+                    }
+                },
+            }
+        },
+        request_time_ms=5,
+    )
+
+    with pytest.raises(ValueError, match="document_slug"):
+        process_search_response_body(response, limit=10, validate=False)
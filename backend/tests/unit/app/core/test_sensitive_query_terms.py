@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from app.core.search import (
+    SensitiveQueryTermMatcher,
+    build_opensearch_request_body,
+)
+from app.api.api_v1.schemas.search import SearchRequestBody
+
+
+@pytest.fixture
+def terms_tsv(tmp_path):
+    tsv_path = os.path.join(tmp_path, "terms.tsv")
+    with open(tsv_path, "w") as f:
+        f.write("country\tSpain\r\n")
+        f.write("country\tKingdom of Spain\r\n")
+        f.write("sex/gender\tnon-binary\r\n")
+    return tsv_path
+
+
+@pytest.mark.unit
+def test_matcher_matches_whole_words(terms_tsv):
+    matcher = SensitiveQueryTermMatcher(terms_tsv, reload_interval_s=0)
+
+    assert matcher.find("spain") == ["spain"]
+    assert matcher.find("Climate policy in SPAIN") == ["spain"]
+    assert matcher.find("the kingdom of spain") == ["kingdom of spain", "spain"]
+    assert matcher.find("spanish emissions") == []
+    assert matcher.find("spainish") == []
+    assert matcher.find("nonbinary people") == ["nonbinary"]
+
+
+@pytest.mark.unit
+def test_matcher_reloads_changed_file(terms_tsv):
+    matcher = SensitiveQueryTermMatcher(terms_tsv, reload_interval_s=0.01)
+    assert matcher.find("kenya") == []
+
+    with open(terms_tsv, "a") as f:
+        f.write("country\tKenya\r\n")
+    stat = os.stat(terms_tsv)
+    os.utime(terms_tsv, (stat.st_atime, stat.st_mtime + 1))
+    matcher._next_reload_check = 0
+
+    assert matcher.find("kenya") == ["kenya"]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "query_string,use_knn",
+    [("spain", False), ("spain policy", False), ("spanish ghg emissions", True)],
+)
+def test_sensitive_terms_disable_knn(terms_tsv, mocker, query_string, use_knn):
+    mocker.patch("app.core.search.get_encoder")
+    matcher = SensitiveQueryTermMatcher(terms_tsv, reload_interval_s=0)
+
+    builder = build_opensearch_request_body(
+        SearchRequestBody(query_string=query_string),
+        sensitive_query_terms=matcher,
+    )
+
+    assert ("knn" in str(builder.query)) is use_knn
@@ -0,0 +1,184 @@
+import json
+import socket
+import threading
+import time
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pytest
+
+import app.db.crud.document
+from app.db.crud.document import DocumentPostfixIndex
+
+
+class FakeQuery:
+    """Returns the given rows, once the session is available if loading them all."""
+
+    def __init__(self, session, rows):
+        self._session = session
+        self._rows = rows
+
+    def filter(self, criterion):
+        """Override, for an `in_` criterion on the import id"""
+        doc_ids = set(criterion.right.value)
+        return FakeQuery(
+            self._session, [row for row in self._rows if row[0] in doc_ids]
+        )
+
+    def __iter__(self):
+        """Iterate over the rows."""
+        return iter(self._rows)
+
+    def all(self):
+        """Override"""
+        self._session.available.wait()
+        return list(self._rows)
+
+
+class FakeSession:
+    """Queries the given postfix rows, counting the queries made."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+        self.available = threading.Event()
+        self.available.set()
+
+    def query(self, *columns):
+        """Override"""
+        self.queries += 1
+        return FakeQuery(self, self.rows)
+
+
+class FakeCursor:
+    """Executes statements on a fake connection."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __enter__(self):
+        """Override"""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Override"""
+
+    def execute(self, statement):
+        """Override"""
+        self._connection.statements.append(statement)
+        if statement == "SELECT 1" and not self._connection.payloads:
+            raise ConnectionError("The connection was closed")
+
+
+class FakeConnection:
+    """Receives the given notification payloads, then closes."""
+
+    def __init__(self, payloads):
+        self.payloads = list(payloads)
+        self.statements = []
+        self.notifies = []
+        self._socket, self._sender = socket.socketpair()
+        self._sender.send(b"!")
+
+    def fileno(self):
+        """Override"""
+        return self._socket.fileno()
+
+    def set_isolation_level(self, level):
+        """Override"""
+
+    def cursor(self):
+        """Override"""
+        return FakeCursor(self)
+
+    def poll(self):
+        """Override"""
+        self._socket.recv(1)
+        if self.payloads:
+            self.notifies.append(SimpleNamespace(payload=self.payloads.pop(0)))
+            self._sender.send(b"!")
+
+
+def _opener(db):
+    return lambda: nullcontext(db)
+
+
+def _wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.mark.unit
+def test_postfix_index_reloads_in_background():
+    db = FakeSession([("CCLW.a", "a"), ("CCLW.b", None), ("CCLW.c", "c")])
+    open_db = _opener(db)
+    postfix_index = DocumentPostfixIndex(refresh_interval_s=300)
+
+    # Documents are looked up while the postfixes are first loaded
+    db.available.clear()
+    assert postfix_index.get(open_db, ["CCLW.a", "CCLW.b"]) == {
+        "CCLW.a": "a",
+        "CCLW.b": "",
+    }
+    assert postfix_index._loaded_at is None
+    db.available.set()
+    _wait_until(lambda: postfix_index._loaded_at is not None)
+    assert postfix_index.get(open_db, ["CCLW.c"]) == {"CCLW.c": "c"}
+    assert db.queries == 2
+
+    # Stale postfixes are served while they are reloaded
+    db.rows = [("CCLW.a", "reloaded"), ("CCLW.b", None)]
+    db.available.clear()
+    postfix_index.invalidate()
+    assert postfix_index.get(open_db, ["CCLW.a"]) == {"CCLW.a": "a"}
+    # Changes made while reloading are kept
+    postfix_index.update({"CCLW.b": "updated"})
+
+    db.available.set()
+    _wait_until(
+        lambda: postfix_index.get(open_db, ["CCLW.a"]) == {"CCLW.a": "reloaded"}
+    )
+    assert db.queries == 3
+    assert postfix_index.get(open_db, ["CCLW.b"]) == {"CCLW.b": "updated"}
+
+
+@pytest.mark.unit
+def test_postfix_index_applies_notified_changes(monkeypatch):
+    monkeypatch.setattr(app.db.crud.document, "_POSTFIX_LISTEN_CHECK_S", 0.01)
+    db = FakeSession([("CCLW.a", "a"), ("CCLW.b", None)])
+    open_db = _opener(db)
+    postfix_index = DocumentPostfixIndex(refresh_interval_s=300)
+    postfix_index._reload(open_db)
+    connection = FakeConnection([json.dumps({"CCLW.a": "notified", "CCLW.c": None})])
+
+    with pytest.raises(ConnectionError):
+        postfix_index._listen(connection)
+
+    assert connection.statements[0] == "LISTEN document_postfixes"
+    assert postfix_index._postfixes == {
+        "CCLW.a": "notified",
+        "CCLW.b": "",
+        "CCLW.c": "",
+    }
+    # Changes may have been missed before listening, so the postfixes are reloaded
+    assert not postfix_index._is_current()
+
+
+@pytest.mark.unit
+def test_postfix_index_reloads_when_changes_are_too_large_to_notify(monkeypatch):
+    monkeypatch.setattr(app.db.crud.document, "_POSTFIX_LISTEN_CHECK_S", 0.01)
+    postfix_index = DocumentPostfixIndex(refresh_interval_s=300)
+    postfix_index._reload(_opener(FakeSession([("CCLW.a", "a")])))
+    connection = FakeConnection([])
+    # Listening only reloads the postfixes once they have been loaded
+    with pytest.raises(ConnectionError):
+        postfix_index._listen(connection)
+    postfix_index._loaded_at = time.monotonic()
+    assert postfix_index._is_current()
+
+    with pytest.raises(ConnectionError):
+        postfix_index._listen(FakeConnection([""]))
+
+    assert not postfix_index._is_current()